@@ -0,0 +1,658 @@
+#!/usr/bin/env python3
+"""
+图标工具性能基准
+
+功能：
+1. rewrite: 对比逐对 count/replace 与单次扫描 rewrite_icon_references 的引用替换耗时
+2. fetch:   在本地替身服务器上对比逐文件模式、全局队列模式（连接池 + URL 合并）与批量接口的图标获取吞吐
+3. hash:    在合成图标目录上测量 analyze_icons / 感知哈希在不同 --jobs 下的扩展性
+4. links:   在多个本地站点替身服务器（每个端口模拟一个主机）上测量 check_links.py 的冷启动和
+            条件请求（304）复查吞吐，并检查每主机并发是否超过限制
+5. recovery: 故障恢复检查（断言）：替身服务器全部返回 500 的一次运行之后恢复正常，
+            下一次运行必须重新获取所有目标（后台错误不进入负缓存，也不计入上游主机熔断）
+6. suite:   生成可配置规模的合成仓库（nav-groups + 图标目录），分阶段计时
+            dedupe_icons_final.main() 的 [1]-[11] 步（完整 + 增量各一次）和 fetch_icons_via_api
+            对替身服务器的获取，结果写入 JSON，可用 --compare 与之前的结果对比
+
+使用方法：
+    python bench_icon_tools.py rewrite [--replacements N] [--files N] [--resources N]
+    python bench_icon_tools.py fetch [--workers N] [--latency 秒] [--item-latency 秒] [--sizes 203,1,2,...] [--shared 比例]
+                                     [--max-workers N] [--error-rate 比例] [--capacity N] [--fail-hosts a,b]
+    python bench_icon_tools.py hash [--icons N] [--jobs 1,2,4,8] [--perceptual]
+    python bench_icon_tools.py links [--urls N] [--hosts N] [--workers N] [--per-host N] [--host-interval 秒]
+                                     [--latency 秒] [--dead-ratio 比例]
+    python bench_icon_tools.py recovery [--resources N]
+    python bench_icon_tools.py suite [--groups N] [--resources N] [--icons N] [--dup-ratio 比例]
+                                     [--min-size 字节] [--max-size 字节] [--missing-ratio 比例]
+                                     [--latency 秒] [--jitter 秒] [--error-rate 比例] [--fail-hosts a,b]
+                                     [--output 文件] [--compare 文件]
+
+参数（rewrite）：
+    --replacements N  替换表大小（默认 10000）
+    --files N         模拟的 nav-groups 文件数（默认 50）
+    --resources N     每个文件的资源数（默认 200）
+
+参数（fetch）：
+    --workers N       工作线程数（默认 5）
+    --latency 秒      替身服务器每个 HTTP 请求的固定开销（默认 0.05，批量请求只付一次）
+    --item-latency 秒 替身服务器每个 URL 的解析耗时（默认 0）
+    --sizes LIST      各分组文件的缺失图标资源数（默认 203 + 4 组 1,2,3,6,7）
+    --shared 比例     指向少量公共 URL（不同写法）的资源比例，模拟跨文件重复（默认 0.2）
+    --max-workers N   全局队列模式的自适应并发上限（默认 16）
+    --breaker-threshold N  熔断阈值（默认 5）
+    --error-rate 比例 / --capacity N / --fail-hosts a,b  替身服务器故障注入（随机 500、过载 503、固定失败主机）
+
+参数（hash）：
+    --icons N         合成图标数（默认 20000）
+    --jobs LIST       要测量的并行数（默认 1,2,4,8）
+    --perceptual      同时测量感知哈希解码（生成真实 WebP 图像，需要 Pillow）
+
+参数（links）：
+    --urls N          合成链接数（默认 3000）
+    --hosts N         替身主机数（默认 40）
+    --workers N       全局并发（默认 32）
+    --per-host N      每主机并发上限（默认 2）
+    --host-interval 秒  同一主机相邻请求的最小间隔（默认 0.02）
+    --latency 秒      替身服务器每个请求的延迟（默认 0.05）
+    --dead-ratio 比例 404 / 500 / 不支持 HEAD / 403 / 跳转等非普通链接的比例（默认 0.1）
+
+参数（recovery）：
+    --resources N     缺失图标的资源数（默认 40）
+
+参数（suite）：
+    --groups N        分组文件数（默认 50）
+    --resources N     每个分组文件的资源数（默认 200）
+    --icons N         图标数（默认 10000）
+    --dup-ratio 比例  与已有图标内容相同的图标比例（默认 0.05）
+    --min-size / --max-size  图标文件大小范围（字节，默认 800-24576）
+    --missing-ratio 比例     没有本地图标、需要获取的资源比例（默认 0.05）
+    --jobs N          去重脚本的 --jobs（默认 1）
+    --latency / --jitter 秒  替身服务器基础延迟和均匀分布的额外延迟（默认 0.02 / 0.03）
+    --error-rate 比例 / --fail-hosts a,b  替身服务器故障注入
+    --workers N       获取并发（默认 8）
+    --output 文件     结果 JSON（默认 bench_results.json）
+    --compare 文件    与之前的结果 JSON 逐阶段对比
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import dedupe_icons_final as dedupe
+from dedupe_icons_final import rewrite_icon_references
+
+# ==================== 合成数据 ====================
+
+def make_group_content(resources: int, icon_names: list, rng: random.Random) -> str:
+    """生成一个 nav-groups JSON 文本，图标随机取自 icon_names"""
+    items = []
+    for i in range(resources):
+        icon = rng.choice(icon_names)
+        suffix = f'?t={rng.randint(10**12, 10**13)}' if rng.random() < 0.2 else ''
+        items.append({
+            'name': f'资源 {i}',
+            'url': f'https://example-{i}.com/',
+            'desc': '合成测试数据',
+            'icon': f'/images/logos/{icon}{suffix}',
+            'hide_badges': [],
+            'status': 'ok',
+        })
+    data = {'pageName': 'bench', 'categories': [{'name': '分类', 'resources': items, 'tabs': []}]}
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+# ==================== 基准 ====================
+
+def legacy_rewrite(content: str, replacements: dict) -> tuple:
+    """旧实现：每个替换对做两次 count + replace"""
+    count = 0
+    for old_file, new_file in replacements.items():
+        if old_file == new_file:
+            continue
+        patterns = [
+            (f'"/images/logos/{old_file}"', f'"/images/logos/{new_file}"'),
+            (f'"/images/logos/{old_file}?t=', f'"/images/logos/{new_file}?t='),
+        ]
+        for old_pattern, new_pattern in patterns:
+            found = content.count(old_pattern)
+            if found > 0:
+                content = content.replace(old_pattern, new_pattern)
+                count += found
+    return content, count
+
+def bench_rewrite(args):
+    rng = random.Random(42)
+    old_names = [f'dup-{i:05d}.webp' for i in range(args.replacements)]
+    kept_names = [f'keep-{i:05d}.webp' for i in range(args.replacements // 10 or 1)]
+    replacements = {name: rng.choice(kept_names) for name in old_names}
+    contents = [make_group_content(args.resources, old_names + kept_names, rng) for _ in range(args.files)]
+
+    print(f"替换表: {len(replacements)}, 文件数: {len(contents)}, 每文件资源数: {args.resources}")
+
+    results = {}
+    for label, func in (('逐对替换', legacy_rewrite), ('单次扫描', rewrite_icon_references)):
+        start = time.perf_counter()
+        outputs = [func(content, replacements) for content in contents]
+        elapsed = time.perf_counter() - start
+        results[label] = (elapsed, outputs)
+        print(f"  {label}: {elapsed:.3f}s, 替换 {sum(n for _, n in outputs)} 处")
+
+    legacy_time, legacy_outputs = results['逐对替换']
+    fast_time, fast_outputs = results['单次扫描']
+    assert legacy_outputs == fast_outputs, '两种实现结果不一致'
+    print(f"  加速比: {legacy_time / fast_time:.1f}x")
+
+def write_missing_icon_groups(directory: Path, sizes: list, shared_ratio: float = 0.0) -> list:
+    """生成缺少本地图标的分组文件，返回文件路径列表
+
+    shared_ratio 比例的资源指向少量公共 URL（附带结尾斜杠、utm 参数等不同写法），模拟跨文件重复。
+    """
+    rng = random.Random(7)
+    variants = ['', '/', '/?utm_source=nav', '#readme']
+    files = []
+    for n, size in enumerate(sizes):
+        resources = []
+        for i in range(size):
+            if rng.random() < shared_ratio:
+                url = f'https://github.com/shared/repo-{rng.randrange(10)}{rng.choice(variants)}'
+            else:
+                url = f'https://site-{n}-{i}.example.com/'
+            resources.append({'name': f'资源 {n}-{i}', 'url': url, 'icon': '', 'status': 'ok'})
+        data = {'pageName': 'bench', 'categories': [{'name': '分类', 'resources': resources, 'tabs': []}]}
+        path = directory / f'bench-{n:03d}.json'
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        files.append(path)
+    return files
+
+def write_link_groups(directory: Path, base_urls: list, count: int, dead_ratio: float) -> list:
+    """生成指向替身主机的分组文件（每个文件 200 个资源），返回文件路径列表"""
+    rng = random.Random(11)
+    kinds = ['gone', 'error', 'nohead', 'blocked', 'redirect']
+    resources = []
+    for i in range(count):
+        kind = rng.choice(kinds) if rng.random() < dead_ratio else 'ok'
+        resources.append({'name': f'站点 {i}', 'url': f'{base_urls[i % len(base_urls)]}/{kind}/{i}',
+                          'icon': '', 'status': 'ok'})
+    files = []
+    for n in range(0, count, 200):
+        data = {'pageName': 'bench', 'categories': [{'name': '分类', 'resources': resources[n:n + 200], 'tabs': []}]}
+        path = directory / f'links-{n // 200:03d}.json'
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        files.append(path)
+    return files
+
+def bench_links(args):
+    import check_links
+    from collections import Counter
+    from fetch_icons_via_api import create_session
+    from link_check_stub import start_link_stub
+
+    servers = [start_link_stub(latency=args.latency) for _ in range(args.hosts)]
+    print(f"替身主机: {args.hosts}, 延迟 {args.latency}s, 链接: {args.urls}")
+    print(f"全局并发 {args.workers}, 每主机 {args.per_host}, 主机间隔 {args.host_interval}s")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            files = write_link_groups(Path(tmp), [server.base_url for server in servers], args.urls, args.dead_ratio)
+            _, _, targets, _ = check_links.collect_links(files)
+            urls = list(targets.values())
+            state = check_links.LinkState(Path(tmp) / 'link_state.sqlite3')
+            session = create_session(args.workers)
+            for label in ('冷启动', '复查（条件请求）'):
+                for server in servers:
+                    server.reset_stats()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results = check_links.sweep(urls, session, state, workers=args.workers,
+                                                per_host=args.per_host, interval=args.host_interval)
+                elapsed = time.perf_counter() - start
+                outcomes = Counter(result['outcome'] for result in results.values())
+                peak = max(server.peak_active for server in servers)
+                print(f"  {label}: {elapsed:.2f}s, {len(urls) / elapsed:.1f} 链接/秒, "
+                      f"HTTP 请求 {sum(server.requests for server in servers)}, "
+                      f"304 {sum(server.not_modified for server in servers)}, 每主机峰值并发 {peak}"
+                      f"{'' if peak <= args.per_host else '（超过限制）'}")
+                print("    结果: " + ', '.join(f"{outcome} {count}" for outcome, count in outcomes.most_common()))
+            state.close()
+    finally:
+        for server in servers:
+            server.shutdown()
+
+def bench_fetch(args):
+    import fetch_icons_via_api as fetcher
+    from smart_parse_stub import start_stub_server
+
+    sizes = [int(x) for x in args.sizes.split(',')] if args.sizes else [203] + [1, 2, 3, 6, 7] * 4
+    server = start_stub_server(latency=args.latency, error_rate=args.error_rate, capacity=args.capacity,
+                               fail_hosts=[h for h in args.fail_hosts.split(',') if h],
+                               item_latency=args.item_latency)
+    shared = args.shared
+    print(f"替身服务器: {server.base_url}, 延迟 {args.latency}s, 工作线程 {args.workers}")
+    print(f"分组文件: {len(sizes)}, 资源总数: {sum(sizes)}")
+
+    def run_per_file(files, session):
+        for path in files:
+            fetcher.process_file(path, server.base_url, workers=args.workers, session=session)
+
+    def run_global(files, session):
+        stats = fetcher.process_all_files(
+            files, server.base_url, workers=args.workers, session=session,
+            limiter=fetcher.AdaptiveLimiter(args.workers, maximum=args.max_workers, target_latency=args.latency * 20),
+            breaker=fetcher.CircuitBreaker(args.breaker_threshold, cooldown=60),
+        )
+        print(f"    结束时并发 {stats['final_concurrency']}, 熔断主机 {stats['circuit_trips']}, "
+              f"熔断跳过 {stats['circuit_open']}", file=sys.stderr)
+
+    def run_batch(files, session):
+        stats = fetcher.process_all_files(
+            files, server.base_url, workers=args.workers, session=session,
+            limiter=fetcher.AdaptiveLimiter(args.workers, maximum=args.max_workers, target_latency=args.latency * 20),
+            breaker=fetcher.CircuitBreaker(args.breaker_threshold, cooldown=60),
+            batch=fetcher.AdaptiveBatchSize(maximum=server.max_batch),
+        )
+        print(f"    批量请求 {stats['batches']}, 回退逐个请求 {stats['batch_fallback']}, "
+              f"结束时批量大小 {stats['final_batch_size']}", file=sys.stderr)
+
+    try:
+        timings = {}
+        for label, runner, pooled in (
+            ('逐文件（无连接池）', run_per_file, False),
+            ('全局队列 + 连接池', run_global, True),
+            ('批量接口（NDJSON 流）', run_batch, True),
+        ):
+            requests_before, rejected_before = server.requests, server.rejected
+            with tempfile.TemporaryDirectory() as tmp:
+                files = write_missing_icon_groups(Path(tmp), sizes, shared)
+                session = fetcher.create_session(args.workers) if pooled else None
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    runner(files, session)
+                elapsed = time.perf_counter() - start
+            timings[label] = elapsed
+            print(f"  {label}: {elapsed:.2f}s, {sum(sizes) / elapsed:.1f} 资源/秒, "
+                  f"API 调用 {server.requests - requests_before}, 过载拒绝 {server.rejected - rejected_before}")
+
+        values = list(timings.values())
+        print(f"  加速比: 全局队列 {values[0] / values[1]:.1f}x, 批量接口 {values[0] / values[2]:.1f}x")
+    finally:
+        server.shutdown()
+
+def bench_recovery(args):
+    import fetch_icons_via_api as fetcher
+    from smart_parse_stub import start_stub_server
+
+    server = start_stub_server(error_rate=1.0)
+    retry_delay = fetcher.CONFIG['retry_delay']
+    fetcher.CONFIG['retry_delay'] = 0
+    print(f"替身服务器: {server.base_url}, 资源: {args.resources}")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            files = write_missing_icon_groups(Path(tmp), [args.resources])
+            cache = fetcher.FetchCache(Path(tmp) / 'fetch_cache.sqlite3', success_ttl=3600, failure_ttl=3600)
+            session = fetcher.create_session(4)
+            breaker = fetcher.CircuitBreaker(threshold=5, cooldown=60)
+
+            def run():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    return fetcher.process_all_files(files, server.base_url, workers=4, session=session, cache=cache,
+                                                     breaker=breaker)
+
+            failed = run()
+            cached = cache.conn.execute("SELECT COUNT(*) FROM fetch_results WHERE status != 'ok'").fetchone()[0]
+            penalized = len(breaker.failures)
+            print(f"  后台故障（全部 500）: 成功 {failed['success']}, 失败 {failed['failed']}, 写入负缓存 {cached}, "
+                  f"未请求 {failed['backend_down']}, 计入熔断的上游主机 {penalized}")
+            server.error_rate = 0.0
+            healthy = run()
+            print(f"  后台恢复: 成功 {healthy['success']}, 近期失败跳过 {healthy['cache_negative']}")
+            cache.close()
+    finally:
+        fetcher.CONFIG['retry_delay'] = retry_delay
+        server.shutdown()
+
+    assert failed['success'] == 0, '故障运行不应获取到图标'
+    assert cached == 0, '后台 5xx 不应写入负缓存'
+    assert failed['backend_down'] > 0, '后台持续失败时应停止分发剩余目标'
+    assert penalized == 0, '后台故障不应计入上游主机熔断'
+    assert healthy['cache_negative'] == 0 and healthy['success'] == args.resources, '后台恢复后应重新获取所有目标'
+    print("  ✓ 后台恢复后重新获取了所有目标")
+
+def write_synthetic_icons(directory: Path, count: int, perceptual: bool = False, dup_ratio: float = 0.1) -> None:
+    """生成合成图标目录
+
+    默认写随机字节：大小只取少数几个值，使大多数文件进入部分哈希 / 完整哈希阶段；
+    dup_ratio 比例的文件复制前面的内容，形成真正的重复组。
+    perceptual=True 时写真实 WebP 图像，用于测量解码开销。
+    """
+    rng = random.Random(11)
+    sizes = [6 * 1024, 12 * 1024, 24 * 1024, 48 * 1024]
+    written = []
+    if perceptual:
+        from PIL import Image
+
+    for i in range(count):
+        path = directory / f'icon-{i:06d}.webp'
+        if written and rng.random() < dup_ratio:
+            path.write_bytes(rng.choice(written).read_bytes())
+            continue
+        if perceptual:
+            color = tuple(rng.randrange(256) for _ in range(3))
+            image = Image.new('RGB', (64, 64), color)
+            image.paste(tuple(255 - c for c in color), (rng.randrange(48), rng.randrange(48), 60, 60))
+            image.save(path, 'WEBP', quality=80)
+        else:
+            path.write_bytes(rng.randbytes(rng.choice(sizes)))
+        written.append(path)
+
+def bench_hash(args):
+    job_counts = [int(x) for x in args.jobs.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        icons_dir = Path(tmp) / 'logos'
+        icons_dir.mkdir()
+        print(f"生成 {args.icons} 个合成图标...")
+        write_synthetic_icons(icons_dir, args.icons, args.perceptual)
+
+        # 把去重脚本的目录和索引指向临时目录
+        dedupe.ICONS_DIR = icons_dir
+        dedupe.CACHE_DIR = Path(tmp) / 'cache'
+        dedupe.HASH_INDEX_PATH = dedupe.CACHE_DIR / 'hash_index.json'
+
+        reference = None
+        baseline = None
+        for jobs in job_counts:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                hash_to_files, file_to_hash, _ = dedupe.analyze_icons(rebuild_index=True, jobs=jobs)
+            hash_time = time.perf_counter() - start
+
+            line = f"  jobs={jobs}: 哈希 {hash_time:.2f}s"
+            result = (dict(hash_to_files), file_to_hash)
+            if args.perceptual:
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result += (dedupe.find_perceptual_groups(hash_to_files, jobs=jobs),)
+                decode_time = time.perf_counter() - start
+                hash_time += decode_time
+                line += f", 感知哈希 {decode_time:.2f}s"
+                # 下一轮重新解码
+                dedupe.save_hash_index({})
+
+            baseline = baseline or hash_time
+            print(f"{line}, 加速比 {baseline / hash_time:.2f}x")
+
+            reference = reference or result
+            assert result == reference, f'jobs={jobs} 的结果与 jobs={job_counts[0]} 不一致'
+        print("  各并行度结果一致")
+
+def write_corpus(root: Path, args) -> dict:
+    """在 root 下生成与仓库相同布局的合成数据：public/images/logos 和 src/content/nav-groups
+
+    图标大小在 [min_size, max_size] 内均匀分布，dup_ratio 比例的图标复制已有图标内容；
+    资源随机引用图标，missing_ratio 比例的资源没有图标（供获取阶段处理）。
+    """
+    rng = random.Random(23)
+    icons_dir = root / 'public' / 'images' / 'logos'
+    groups_dir = root / 'src' / 'content' / 'nav-groups'
+    icons_dir.mkdir(parents=True)
+    groups_dir.mkdir(parents=True)
+
+    names = []
+    written = []
+    duplicates = 0
+    for i in range(args.icons):
+        name = f'icon-{i:06d}.webp'
+        if written and rng.random() < args.dup_ratio:
+            data = rng.choice(written)
+            duplicates += 1
+        else:
+            data = rng.randbytes(rng.randint(args.min_size, args.max_size))
+            written.append(data)
+        (icons_dir / name).write_bytes(data)
+        names.append(name)
+
+    pages = ['home', 'sub1', 'sub2', 'sub3', 'sub4']
+    missing = 0
+    for n in range(args.groups):
+        resources = []
+        for i in range(args.resources):
+            url = f'https://site-{n}-{i}.example.com/'
+            if rng.random() < args.missing_ratio:
+                icon = ''
+                missing += 1
+            else:
+                icon = f'/images/logos/{rng.choice(names)}'
+            resources.append({'name': f'资源 {n}-{i}', 'url': url, 'icon': icon, 'status': 'ok'})
+        data = {'pageName': pages[n % len(pages)], 'name': f'分组 {n}',
+                'categories': [{'name': '分类', 'resources': resources, 'tabs': []}]}
+        with open(groups_dir / f'{pages[n % len(pages)]}-{n:03d}-bench.json', 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    return {
+        'icons': args.icons,
+        'duplicate_icons': duplicates,
+        'unique_icon_bytes': sum(len(data) for data in written),
+        'groups': args.groups,
+        'resources': args.groups * args.resources,
+        'missing_icon_resources': missing,
+    }
+
+class PhaseClock(io.TextIOBase):
+    """替换 stdout，按脚本输出的步骤标记（[1] ... [9]、总结、报告已保存）记录各阶段耗时"""
+
+    STEP_PATTERN = re.compile(r'^\[(\d+)\]')
+    EXTRA_STEPS = {'总结': '10', '报告已保存': '11'}
+
+    def __init__(self):
+        self.marks = []
+        self.start = time.perf_counter()
+        self._buffer = ''
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        now = time.perf_counter()
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            match = self.STEP_PATTERN.match(line)
+            step = match.group(1) if match else self.EXTRA_STEPS.get(line.split(':')[0].strip())
+            if step and not any(mark == step for mark, _ in self.marks):
+                self.marks.append((step, now))
+        return len(text)
+
+    def phases(self) -> dict:
+        """步骤编号 -> 耗时（秒）；步骤之前的初始化计入 setup"""
+        end = time.perf_counter()
+        result = {}
+        previous_name, previous_time = 'setup', self.start
+        for step, when in self.marks:
+            result[previous_name] = round(when - previous_time, 6)
+            previous_name, previous_time = f'[{step}]', when
+        result[previous_name] = round(end - previous_time, 6)
+        return result
+
+def run_dedupe_phases(argv: list) -> dict:
+    """在当前目录运行 dedupe_icons_final.main()，返回分阶段耗时"""
+    clock = PhaseClock()
+    saved_argv = sys.argv
+    sys.argv = ['dedupe_icons_final.py'] + argv
+    try:
+        with contextlib.redirect_stdout(clock):
+            dedupe.main()
+    finally:
+        sys.argv = saved_argv
+    phases = clock.phases()
+    return {'phases': phases, 'total': round(sum(phases.values()), 6)}
+
+def run_fetch_phases(args) -> dict:
+    """在当前目录对替身服务器运行全局队列获取，返回分阶段耗时和统计"""
+    import fetch_icons_via_api as fetcher
+    from nav_index import load_nav_index
+    from smart_parse_stub import start_stub_server, split_hosts
+
+    server = start_stub_server(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                               fail_hosts=split_hosts(args.fail_hosts))
+    try:
+        phases = {}
+        start = time.perf_counter()
+        nav_index = load_nav_index()
+        json_files = sorted(nav_index.missing_icon_resources())
+        phases['index'] = round(time.perf_counter() - start, 6)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = fetcher.process_all_files(
+                json_files, server.base_url, workers=args.workers,
+                session=fetcher.create_session(args.workers),
+                limiter=fetcher.AdaptiveLimiter(args.workers, maximum=args.workers * 2),
+                breaker=fetcher.CircuitBreaker(5, cooldown=60),
+            )
+        phases['fetch'] = round(time.perf_counter() - start, 6)
+    finally:
+        server.shutdown()
+
+    return {
+        'phases': phases,
+        'total': round(sum(phases.values()), 6),
+        'stats': stats,
+        'api_requests': server.requests,
+        'resources_per_second': round(stats['total'] / phases['fetch'], 2) if phases['fetch'] else None,
+    }
+
+def print_phases(label: str, result: dict, previous: dict = None):
+    print(f"  {label}: 共 {result['total']:.3f}s")
+    for phase, seconds in result['phases'].items():
+        line = f"    {phase:<8} {seconds:8.3f}s"
+        old = (previous or {}).get('phases', {}).get(phase)
+        if old:
+            line += f"  (之前 {old:.3f}s, {seconds / old:.2f}x)"
+        print(line)
+
+def bench_suite(args):
+    previous = {}
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f).get('results', {})
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        print(f"生成合成仓库: {args.groups} 个分组 x {args.resources} 资源, {args.icons} 个图标...")
+        corpus = write_corpus(root, args)
+        print(f"  重复图标 {corpus['duplicate_icons']}, 缺失图标资源 {corpus['missing_icon_resources']}")
+
+        # 各脚本使用相对路径，切换到合成仓库根目录运行
+        os.chdir(root)
+        try:
+            results = {}
+            print("\n运行去重（完整扫描）...")
+            results['dedupe'] = run_dedupe_phases(['--jobs', str(args.jobs)])
+            print_phases('dedupe', results['dedupe'], previous.get('dedupe'))
+
+            print("\n运行去重（增量，无变化）...")
+            results['dedupe_incremental'] = run_dedupe_phases(['--incremental', '--jobs', str(args.jobs)])
+            print_phases('dedupe_incremental', results['dedupe_incremental'], previous.get('dedupe_incremental'))
+
+            print("\n运行图标获取（替身服务器）...")
+            results['fetch'] = run_fetch_phases(args)
+            print_phases('fetch', results['fetch'], previous.get('fetch'))
+            stats = results['fetch']['stats']
+            print(f"    成功 {stats['success']}, 失败 {stats['failed']}, API 调用 {results['fetch']['api_requests']}, "
+                  f"{results['fetch']['resources_per_second']} 资源/秒")
+        finally:
+            os.chdir(cwd)
+
+    output = {
+        'timestamp': datetime.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('func', 'compare', 'output')},
+        'corpus': corpus,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {args.output}")
+
+# ==================== 主逻辑 ====================
+
+def main():
+    parser = argparse.ArgumentParser(description='图标工具性能基准')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rewrite = subparsers.add_parser('rewrite', help='引用替换基准')
+    rewrite.add_argument('--replacements', type=int, default=10000, help='替换表大小（默认 10000）')
+    rewrite.add_argument('--files', type=int, default=50, help='文件数（默认 50）')
+    rewrite.add_argument('--resources', type=int, default=200, help='每个文件的资源数（默认 200）')
+    rewrite.set_defaults(func=bench_rewrite)
+
+    fetch = subparsers.add_parser('fetch', help='图标获取吞吐基准（本地替身服务器）')
+    fetch.add_argument('--workers', type=int, default=5, help='工作线程数（默认 5）')
+    fetch.add_argument('--latency', type=float, default=0.05, help='替身服务器每个 HTTP 请求的固定开销（秒，默认 0.05）')
+    fetch.add_argument('--item-latency', type=float, default=0.0, help='替身服务器每个 URL 的解析耗时（秒，默认 0）')
+    fetch.add_argument('--sizes', type=str, default='', help='各分组文件的资源数，逗号分隔')
+    fetch.add_argument('--shared', type=float, default=0.2, help='指向公共 URL 的资源比例（默认 0.2）')
+    fetch.add_argument('--max-workers', type=int, default=16, help='全局队列模式的自适应并发上限（默认 16）')
+    fetch.add_argument('--breaker-threshold', type=int, default=5, help='熔断阈值（默认 5，0 为关闭）')
+    fetch.add_argument('--error-rate', type=float, default=0.0, help='替身服务器随机 500 比例')
+    fetch.add_argument('--capacity', type=int, default=0, help='替身服务器并发容量，超出返回 503（0 为不限）')
+    fetch.add_argument('--fail-hosts', type=str, default='', help='替身服务器固定失败的上游主机，逗号分隔')
+    fetch.set_defaults(func=bench_fetch)
+
+    hashing = subparsers.add_parser('hash', help='图标哈希 / 感知哈希并行扩展性基准')
+    hashing.add_argument('--icons', type=int, default=20000, help='合成图标数（默认 20000）')
+    hashing.add_argument('--jobs', type=str, default='1,2,4,8', help='要测量的并行数，逗号分隔（默认 1,2,4,8）')
+    hashing.add_argument('--perceptual', action='store_true', help='同时测量感知哈希解码（需要 Pillow）')
+    hashing.set_defaults(func=bench_hash)
+
+    links = subparsers.add_parser('links', help='链接健康检查吞吐基准（本地站点替身服务器）')
+    links.add_argument('--urls', type=int, default=3000, help='合成链接数（默认 3000）')
+    links.add_argument('--hosts', type=int, default=40, help='替身主机数（默认 40）')
+    links.add_argument('--workers', type=int, default=32, help='全局并发（默认 32）')
+    links.add_argument('--per-host', type=int, default=2, help='每主机并发上限（默认 2）')
+    links.add_argument('--host-interval', type=float, default=0.02, help='同一主机相邻请求的最小间隔（秒，默认 0.02）')
+    links.add_argument('--latency', type=float, default=0.05, help='替身服务器每个请求的延迟（秒，默认 0.05）')
+    links.add_argument('--dead-ratio', type=float, default=0.1, help='非普通链接的比例（默认 0.1）')
+    links.set_defaults(func=bench_links)
+
+    recovery = subparsers.add_parser('recovery', help='故障恢复检查：后台错误不进入负缓存')
+    recovery.add_argument('--resources', type=int, default=40, help='缺失图标的资源数（默认 40）')
+    recovery.set_defaults(func=bench_recovery)
+
+    suite = subparsers.add_parser('suite', help='合成仓库上的分阶段基准，结果写入 JSON')
+    suite.add_argument('--groups', type=int, default=50, help='分组文件数（默认 50）')
+    suite.add_argument('--resources', type=int, default=200, help='每个分组文件的资源数（默认 200）')
+    suite.add_argument('--icons', type=int, default=10000, help='图标数（默认 10000）')
+    suite.add_argument('--dup-ratio', type=float, default=0.05, help='重复图标比例（默认 0.05）')
+    suite.add_argument('--min-size', type=int, default=800, help='图标最小字节数（默认 800）')
+    suite.add_argument('--max-size', type=int, default=24 * 1024, help='图标最大字节数（默认 24576）')
+    suite.add_argument('--missing-ratio', type=float, default=0.05, help='缺失图标的资源比例（默认 0.05）')
+    suite.add_argument('--jobs', type=int, default=1, help='去重脚本的 --jobs（默认 1）')
+    suite.add_argument('--latency', type=float, default=0.02, help='替身服务器基础延迟（秒，默认 0.02）')
+    suite.add_argument('--jitter', type=float, default=0.03, help='替身服务器额外随机延迟上限（秒，默认 0.03）')
+    suite.add_argument('--error-rate', type=float, default=0.0, help='替身服务器随机 500 比例')
+    suite.add_argument('--fail-hosts', type=str, default='', help='替身服务器固定失败的上游主机，逗号分隔')
+    suite.add_argument('--workers', type=int, default=8, help='获取并发（默认 8）')
+    suite.add_argument('--output', type=str, default='bench_results.json', help='结果 JSON（默认 bench_results.json）')
+    suite.add_argument('--compare', type=str, default=None, help='与之前的结果 JSON 对比')
+    suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
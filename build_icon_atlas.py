@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+导航页图标图集（雪碧图）生成程序
+===========================
+
+功能：
+1. 通过 nav-groups 内容索引按页面（home、sub1-sub4 等 pageName）汇总引用的本地图标
+2. 把每个页面的图标缩放到统一格子尺寸（默认 64px，卡片显示 32px 的 2 倍屏），
+   用货架（shelf）装箱算法打包进一张图集，页面加载图标只需一次图片请求
+3. 每个页面输出一组资源到 public/atlas/：
+   - <page>.<hash>.webp   图集图片（文件名带内容哈希，便于长期缓存）
+   - <page>.json          每个图标的偏移和尺寸
+   - <page>.css           [data-atlas-icon="文件名"] 选择器，按百分比定位，任意显示尺寸可用
+   另外 index.json 列出所有页面的资源文件
+   前端：Layout 按页面引入 <page>.css，SiteCard 对图集中的图标渲染 data-atlas-icon 元素
+   （src/components/SiteCard/atlas.js 在构建时读取清单），不在图集中的图标仍用 <img> 加载
+4. 结果确定且增量：页面的图标集合、图标内容哈希和打包参数都未变化时跳过该页面，
+   状态保存在 .icon_cache/atlas_state.json
+
+矢量 SVG、缺失和无法解码的图标不进入图集，记录在页面清单的 excluded 中，前端继续按单独图片加载。
+
+使用方法：
+    python build_icon_atlas.py [--page home] [--cell-size PX] [--padding PX] [--lossy [--quality Q]]
+                               [--force] [--dry-run]
+
+参数：
+    --page ID         只处理指定页面（可重复）
+    --cell-size PX    图集中每个图标的最长边（默认 64）
+    --padding PX      图标之间的间距，避免缩放时相邻图标串色（默认 2）
+    --lossy           同时尝试有损编码，取体积更小者（默认无损，与 optimize_icons.py 一致）
+    --quality Q       有损候选的编码质量（默认 90，只在 --lossy 时使用）
+    --force           忽略增量状态，重新生成所有页面
+    --dry-run         只列出需要重新生成的页面，不写文件
+
+依赖：
+    pip install Pillow
+"""
+
+import os
+import io
+import sys
+import json
+import math
+import hashlib
+import argparse
+from pathlib import Path
+
+from dedupe_icons_final import ICONS_DIR, CACHE_DIR, calculate_file_hash
+from file_utils import file_signature, format_bytes, write_atomic
+from nav_index import load_nav_index
+
+try:
+    from PIL import Image
+except ImportError:
+    print("请先安装依赖: pip install Pillow")
+    sys.exit(1)
+
+from optimize_icons import encode_image, extract_svg_raster, SVG_EXTENSION
+
+# ==================== 配置 ====================
+ATLAS_DIR = Path('./public/atlas')
+ATLAS_STATE_PATH = CACHE_DIR / 'atlas_state.json'
+ATLAS_STATE_VERSION = 1
+
+CELL_SIZE = 64
+PADDING = 2
+DEFAULT_QUALITY = 90
+
+# ==================== 工具函数 ====================
+
+def load_state(force: bool = False) -> dict:
+    empty = {'version': ATLAS_STATE_VERSION, 'icons': {}, 'pages': {}}
+    if force or not ATLAS_STATE_PATH.exists():
+        return empty
+    try:
+        with open(ATLAS_STATE_PATH, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return empty
+    if state.get('version') != ATLAS_STATE_VERSION:
+        return empty
+    return state
+
+def save_state(state: dict):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = ATLAS_STATE_PATH.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, ATLAS_STATE_PATH)
+
+def icon_hashes(names: list, cached: dict) -> dict:
+    """图标内容哈希，大小和修改时间未变的直接用缓存；缺失的图标不出现在结果中"""
+    hashes = {}
+    for name in names:
+        path = ICONS_DIR / name
+        try:
+            signature = file_signature(path.stat())
+        except OSError:
+            continue
+        entry = cached.get(name)
+        if not entry or entry.get('sig') != signature:
+            entry = {'sig': signature, 'hash': calculate_file_hash(path)}
+        hashes[name] = entry
+    return hashes
+
+def page_key(names: list, hashes: dict, settings: dict) -> str:
+    """页面图集的内容键：图标集合、各图标哈希和打包参数"""
+    payload = json.dumps({
+        'settings': settings,
+        'icons': [[name, hashes[name]['hash'] if name in hashes else None] for name in names],
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def load_icon(path: Path, cell_size: int):
+    """解码图标并等比缩放到格子内（不放大）；矢量 SVG 返回 None"""
+    raw = path.read_bytes()
+    if path.suffix.lower() == SVG_EXTENSION:
+        raw = extract_svg_raster(raw)
+        if raw is None:
+            return None
+    with Image.open(io.BytesIO(raw)) as img:
+        img.seek(0)
+        img = img.convert('RGBA')
+    img.thumbnail((cell_size, cell_size), Image.LANCZOS)
+    return img
+
+def pack_shelves(sizes: dict, padding: int) -> tuple:
+    """货架装箱：按高度降序（同高按文件名）逐行摆放
+
+    sizes: 文件名 -> (宽, 高)。返回 (图集宽, 图集高, {文件名: (x, y)})。
+    图集宽度取总面积的平方根（不小于最宽的图标），使图集接近正方形。
+    """
+    if not sizes:
+        return 0, 0, {}
+    order = sorted(sizes, key=lambda name: (-sizes[name][1], -sizes[name][0], name))
+    area = sum((w + padding) * (h + padding) for w, h in sizes.values())
+    width = max(math.ceil(math.sqrt(area)), max(w for w, _ in sizes.values()) + padding)
+
+    positions = {}
+    x = y = shelf_height = 0
+    for name in order:
+        w, h = sizes[name]
+        if x and x + w + padding > width:
+            y += shelf_height
+            x = shelf_height = 0
+        positions[name] = (x, y)
+        x += w + padding
+        shelf_height = max(shelf_height, h + padding)
+    used_width = max(positions[name][0] + sizes[name][0] for name in positions)
+    return used_width, y + shelf_height - padding, positions
+
+def _percent(offset: int, total: int, size: int) -> str:
+    if total == size:
+        return '0%'
+    return f'{offset / (total - size) * 100:.4f}%'.replace('.0000%', '%')
+
+def render_css(page: str, image_name: str, atlas_size: tuple, icons: dict) -> str:
+    """生成页面样式：百分比定位，元素按任意尺寸显示都能对齐"""
+    atlas_w, atlas_h = atlas_size
+    lines = [
+        f'/* 由 build_icon_atlas.py 生成，请勿手动修改（页面: {page}） */',
+        f'[data-atlas-page="{page}"] [data-atlas-icon] {{',
+        f'  background-image: url("{image_name}");',
+        '  background-repeat: no-repeat;',
+        '}',
+    ]
+    for name, box in icons.items():
+        x, y, w, h = box['x'], box['y'], box['w'], box['h']
+        lines.append(
+            f'[data-atlas-page="{page}"] [data-atlas-icon="{name}"] {{ '
+            f'aspect-ratio: {w} / {h}; '
+            f'background-size: {atlas_w / w * 100:.4f}% {atlas_h / h * 100:.4f}%; '
+            f'background-position: {_percent(x, atlas_w, w)} {_percent(y, atlas_h, h)}; }}'
+        )
+    return '\n'.join(lines) + '\n'
+
+def build_page_atlas(page: str, names: list, key: str, args) -> dict:
+    """生成单个页面的图集、清单和样式，返回写入 index.json 的条目"""
+    images = {}
+    excluded = {}
+    for name in names:
+        path = ICONS_DIR / name
+        if not path.exists():
+            excluded[name] = '文件不存在'
+            continue
+        try:
+            img = load_icon(path, args.cell_size)
+        except Exception as e:
+            excluded[name] = f'解码失败: {e}'
+            continue
+        if img is None:
+            excluded[name] = '矢量 SVG'
+            continue
+        images[name] = img
+
+    atlas_w, atlas_h, positions = pack_shelves({name: img.size for name, img in images.items()}, args.padding)
+    atlas = Image.new('RGBA', (max(atlas_w, 1), max(atlas_h, 1)), (0, 0, 0, 0))
+    icons = {}
+    for name in sorted(positions):
+        x, y = positions[name]
+        img = images[name]
+        atlas.paste(img, (x, y))
+        icons[name] = {'x': x, 'y': y, 'w': img.width, 'h': img.height}
+    data = encode_image(atlas, 'webp', args.quality, args.lossy)
+
+    image_name = f'{page}.{key[:10]}.webp'
+    manifest = {
+        'page': page,
+        'image': image_name,
+        'width': atlas_w,
+        'height': atlas_h,
+        'cell_size': args.cell_size,
+        'icons': icons,
+        'excluded': excluded,
+    }
+    ATLAS_DIR.mkdir(parents=True, exist_ok=True)
+    write_atomic(ATLAS_DIR / image_name, data)
+    write_atomic(ATLAS_DIR / f'{page}.json',
+                 (json.dumps(manifest, ensure_ascii=False, indent=2) + '\n').encode('utf-8'))
+    write_atomic(ATLAS_DIR / f'{page}.css',
+                 render_css(page, image_name, (atlas_w, atlas_h), icons).encode('utf-8'))
+
+    # 删除该页面旧哈希的图集图片
+    for old in ATLAS_DIR.glob(f'{page}.*.webp'):
+        if old.name != image_name:
+            old.unlink()
+
+    return {
+        'image': image_name,
+        'manifest': f'{page}.json',
+        'css': f'{page}.css',
+        'icons': len(icons),
+        'excluded': len(excluded),
+        'bytes': len(data),
+    }
+
+def bundle_exists(entry: dict) -> bool:
+    return all((ATLAS_DIR / entry[key]).exists() for key in ('image', 'manifest', 'css'))
+
+def remove_bundle(entry: dict):
+    for key in ('image', 'manifest', 'css'):
+        path = ATLAS_DIR / entry[key]
+        if path.exists():
+            path.unlink()
+
+# ==================== 主逻辑 ====================
+
+def main():
+    parser = argparse.ArgumentParser(description='导航页图标图集生成程序')
+    parser.add_argument('--page', action='append', default=None, help='只处理指定页面（可重复）')
+    parser.add_argument('--cell-size', type=int, default=CELL_SIZE, help=f'图标最长边（默认 {CELL_SIZE}）')
+    parser.add_argument('--padding', type=int, default=PADDING, help=f'图标间距（默认 {PADDING}）')
+    parser.add_argument('--lossy', action='store_true', help='同时尝试有损编码，取体积更小者（默认只用无损编码）')
+    parser.add_argument('--quality', type=int, default=DEFAULT_QUALITY, help=f'有损候选的编码质量（默认 {DEFAULT_QUALITY}）')
+    parser.add_argument('--force', action='store_true', help='忽略增量状态，重新生成所有页面')
+    parser.add_argument('--dry-run', action='store_true', help='只列出需要重新生成的页面')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("导航页图标图集生成程序")
+    print("=" * 70)
+    print(f"模式: {'预览模式' if args.dry_run else '执行模式'}")
+    print(f"格子: {args.cell_size}px, 间距: {args.padding}px, 输出目录: {ATLAS_DIR}")
+    print()
+
+    # 1. 按页面汇总图标
+    print("[1] 读取内容索引...")
+    page_icons = load_nav_index().page_icons()
+    if args.page:
+        page_icons = {page: names for page, names in page_icons.items() if page in args.page}
+    for page, names in page_icons.items():
+        print(f"  {page}: {len(names)} 个图标")
+
+    # 2. 计算内容键，找出变化的页面
+    print("\n[2] 检查变化...")
+    state = load_state(args.force)
+    all_names = sorted({name for names in page_icons.values() for name in names})
+    hashes = icon_hashes(all_names, state['icons'])
+    settings = {'cell_size': args.cell_size, 'padding': args.padding, 'quality': args.quality, 'lossy': args.lossy}
+
+    pending = {}
+    for page, names in page_icons.items():
+        key = page_key(names, hashes, settings)
+        previous = state['pages'].get(page)
+        if previous and previous.get('key') == key and bundle_exists(previous['bundle']):
+            print(f"  [未变化] {page}")
+        else:
+            pending[page] = key
+            print(f"  [{'将生成' if args.dry_run else '生成'}] {page}")
+
+    stale_pages = [] if args.page else [page for page in state['pages'] if page not in page_icons]
+    for page in stale_pages:
+        print(f"  [{'将删除' if args.dry_run else '删除'}] {page}（页面已无图标）")
+
+    if args.dry_run:
+        print(f"\n需要重新生成 {len(pending)} 个页面")
+        return
+
+    # 3. 生成图集
+    print("\n[3] 生成图集...")
+    for page, key in pending.items():
+        bundle = build_page_atlas(page, page_icons[page], key, args)
+        state['pages'][page] = {'key': key, 'bundle': bundle}
+        print(f"  {page}: {bundle['icons']} 个图标 -> {bundle['image']} ({format_bytes(bundle['bytes'])})"
+              + (f", 排除 {bundle['excluded']} 个" if bundle['excluded'] else ''))
+    for page in stale_pages:
+        remove_bundle(state['pages'].pop(page)['bundle'])
+
+    if args.page:
+        state['icons'].update(hashes)
+    else:
+        state['icons'] = hashes
+    save_state(state)
+
+    index = {page: entry['bundle'] for page, entry in sorted(state['pages'].items())}
+    ATLAS_DIR.mkdir(parents=True, exist_ok=True)
+    write_atomic(ATLAS_DIR / 'index.json', (json.dumps(index, ensure_ascii=False, indent=2) + '\n').encode('utf-8'))
+
+    # 4. 总结
+    print("\n" + "=" * 70)
+    print("总结")
+    print("=" * 70)
+    print(f"  页面: {len(page_icons)}, 重新生成: {len(pending)}, 未变化: {len(page_icons) - len(pending)}")
+    print(f"  图集总大小: {format_bytes(sum(entry['bytes'] for entry in index.values()))}")
+    print(f"  图标请求: {sum(entry['icons'] for entry in index.values())} -> {len(index)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+站内搜索索引预构建程序
+===========================
+
+功能：
+1. 遍历 src/content/nav-groups/*.json，按页面（pageName）切分，每个页面输出一个分片到 public/search/：
+   - <page>.<hash>.json   {'page', 'docs', 'index'}，文件名带内容哈希，便于长期缓存
+     - docs:  搜索结果展示用的精简资源（name、url、sectionName、category、tabName，空字段省略）
+     - index: Fuse.js 序列化索引（与 Fuse.createIndex(keys, docs).toJSON() 相同格式），
+              键与 SearchModal.jsx 一致：name / desc / category / tabName
+   另外 index.json 列出所有页面的分片文件（不带哈希，前端每次重新获取）
+2. 分组文件按文件名排序，只收录同时有 name 和 url 的资源，
+   没有 pageName 的分组归入 home 页面
+3. 增量：页面的分组文件（大小、修改时间和 inode）和构建参数都未变化时跳过该页面，
+   状态保存在 .icon_cache/search_state.json
+
+前端加载方式：SearchModal.jsx 第一次打开搜索时获取 index.json 和各分片，索引记录的下标对应分片内的 docs，
+因此每个分片单独建 Fuse（Fuse.parseIndex(shard.index)），合并结果按 score 排序。
+浏览器不再需要打包全部 nav-groups JSON，也不用在每次打开页面时现场建索引；
+修改 nav-groups 后需要重新执行本程序并提交 public/search/。
+
+使用方法：
+    python build_search_index.py [--page home] [--force] [--dry-run]
+
+参数：
+    --page ID     只处理指定页面（可重复）
+    --force       忽略增量状态，重新生成所有页面
+    --dry-run     只列出需要重新生成的页面，不写文件
+"""
+
+import os
+import sys
+import json
+import math
+import zlib
+import hashlib
+import argparse
+from pathlib import Path
+from collections import defaultdict
+
+from file_utils import file_signature, format_bytes, write_atomic
+from nav_index import CONTENT_DIR, CACHE_DIR, iter_resources, load_nav_index
+
+# ==================== 配置 ====================
+SEARCH_DIR = Path('./public/search')
+SEARCH_STATE_PATH = CACHE_DIR / 'search_state.json'
+SEARCH_STATE_VERSION = 1
+
+# 与 SearchModal.jsx 的 Fuse 配置一致
+SEARCH_KEYS = ['name', 'desc', 'category', 'tabName']
+# 结果展示需要的字段（desc、category、tabName 等搜索键的文本保存在 index 中）
+DOC_FIELDS = ['name', 'url', 'sectionName', 'category', 'tabName']
+
+# Fuse.js 字段长度归一化：norm = 1 / sqrt(词数)，保留 3 位小数
+NORM_MANTISSA = 3
+
+# ==================== 工具函数 ====================
+
+def load_state(force: bool = False) -> dict:
+    empty = {'version': SEARCH_STATE_VERSION, 'pages': {}}
+    if force or not SEARCH_STATE_PATH.exists():
+        return empty
+    try:
+        with open(SEARCH_STATE_PATH, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return empty
+    if state.get('version') != SEARCH_STATE_VERSION:
+        return empty
+    return state
+
+def save_state(state: dict):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = SEARCH_STATE_PATH.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, SEARCH_STATE_PATH)
+
+def field_norm(value: str) -> float:
+    """与 Fuse.js 的 norm().get() 相同：只按半角空格分词（/[^ ]+/g），1 / sqrt(词数)，四舍五入到 3 位小数"""
+    tokens = sum(1 for token in value.split(' ') if token)
+    scale = 10 ** NORM_MANTISSA
+    return math.floor(1 / math.sqrt(tokens) * scale + 0.5) / scale
+
+# ==================== 索引构建 ====================
+
+def collect_docs(group_files: list) -> list:
+    """按 SearchModal.jsx 的扁平化规则收集页面的资源（含搜索键和展示字段）"""
+    docs = []
+    for json_file in group_files:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        section = data.get('name') or '未命名分组'
+        for path, resource in iter_resources(data):
+            if not (resource.get('name') and resource.get('url')):
+                continue
+            category = tab = ''
+            if path[0] == 'categories':
+                category_data = data['categories'][path[1]]
+                category = category_data.get('name') or ''
+                if path[2] == 'tabs':
+                    tab = category_data['tabs'][path[3]].get('tabName') or ''
+            docs.append({
+                'name': resource['name'],
+                'url': resource['url'],
+                'desc': resource.get('desc') or '',
+                'sectionName': section,
+                'category': category,
+                'tabName': tab,
+            })
+    return docs
+
+def build_fuse_index(docs: list) -> dict:
+    """生成 Fuse.js 序列化索引：{'keys': [...], 'records': [{'i': 下标, '$': {键下标: {'v', 'n'}}}]}"""
+    keys = [{'path': [key], 'id': key, 'weight': 1, 'src': key, 'getFn': None} for key in SEARCH_KEYS]
+    records = []
+    for i, doc in enumerate(docs):
+        fields = {}
+        for key_index, key in enumerate(SEARCH_KEYS):
+            value = doc.get(key)
+            if isinstance(value, str) and value.strip():
+                fields[str(key_index)] = {'v': value, 'n': field_norm(value)}
+        records.append({'i': i, '$': fields})
+    return {'keys': keys, 'records': records}
+
+def build_shard(page: str, docs: list) -> bytes:
+    compact = [{field: doc[field] for field in DOC_FIELDS if doc.get(field)} for doc in docs]
+    shard = {'page': page, 'docs': compact, 'index': build_fuse_index(docs)}
+    return json.dumps(shard, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def build_page(page: str, group_files: list) -> dict:
+    """生成单个页面的分片，返回写入 index.json 的条目"""
+    docs = collect_docs(group_files)
+    data = build_shard(page, docs)
+    digest = hashlib.sha256(data).hexdigest()
+    filename = f'{page}.{digest[:10]}.json'
+
+    SEARCH_DIR.mkdir(parents=True, exist_ok=True)
+    write_atomic(SEARCH_DIR / filename, data)
+    # 删除该页面旧哈希的分片
+    for old in SEARCH_DIR.glob(f'{page}.*.json'):
+        if old.name != filename:
+            old.unlink()
+
+    return {
+        'file': filename,
+        'docs': len(docs),
+        'bytes': len(data),
+        'gzip_bytes': len(zlib.compress(data, 9)),
+    }
+
+# ==================== 主逻辑 ====================
+
+def main():
+    parser = argparse.ArgumentParser(description='站内搜索索引预构建程序')
+    parser.add_argument('--page', action='append', default=None, help='只处理指定页面（可重复）')
+    parser.add_argument('--force', action='store_true', help='忽略增量状态，重新生成所有页面')
+    parser.add_argument('--dry-run', action='store_true', help='只列出需要重新生成的页面')
+    args = parser.parse_args()
+
+    if not CONTENT_DIR.exists():
+        print(f"错误: 未找到目录 {CONTENT_DIR}")
+        sys.exit(1)
+
+    print("=" * 70)
+    print("站内搜索索引预构建程序")
+    print("=" * 70)
+    print(f"模式: {'预览模式' if args.dry_run else '执行模式'}")
+    print(f"输出目录: {SEARCH_DIR}")
+    print()
+
+    # 1. 按页面汇总分组文件
+    print("[1] 读取内容索引...")
+    nav_index = load_nav_index()
+    page_files = defaultdict(list)
+    for group_name in nav_index.groups:
+        page_files[nav_index.pages.get(group_name, 'home')].append(CONTENT_DIR / group_name)
+    page_files = dict(sorted(page_files.items()))
+    if args.page:
+        page_files = {page: files for page, files in page_files.items() if page in args.page}
+    for page, files in page_files.items():
+        print(f"  {page}: {len(files)} 个分组文件")
+
+    # 2. 按分组文件签名找出变化的页面
+    print("\n[2] 检查变化...")
+    state = load_state(args.force)
+    settings = {'keys': SEARCH_KEYS, 'fields': DOC_FIELDS}
+    pending = {}
+    for page, files in page_files.items():
+        signatures = {path.name: file_signature(path.stat()) for path in files}
+        previous = state['pages'].get(page)
+        if previous and previous.get('files') == signatures and previous.get('settings') == settings \
+                and (SEARCH_DIR / previous['bundle']['file']).exists():
+            print(f"  [未变化] {page}")
+        else:
+            pending[page] = signatures
+            print(f"  [{'将生成' if args.dry_run else '生成'}] {page}")
+
+    stale_pages = [] if args.page else [page for page in state['pages'] if page not in page_files]
+    for page in stale_pages:
+        print(f"  [{'将删除' if args.dry_run else '删除'}] {page}（页面已无分组）")
+
+    if args.dry_run:
+        print(f"\n需要重新生成 {len(pending)} 个页面")
+        return
+
+    # 3. 生成分片
+    print("\n[3] 生成索引分片...")
+    for page, signatures in pending.items():
+        bundle = build_page(page, page_files[page])
+        state['pages'][page] = {'files': signatures, 'settings': settings, 'bundle': bundle}
+        print(f"  {page}: {bundle['docs']} 条 -> {bundle['file']} "
+              f"({format_bytes(bundle['bytes'])}, gzip {format_bytes(bundle['gzip_bytes'])})")
+    for page in stale_pages:
+        path = SEARCH_DIR / state['pages'].pop(page)['bundle']['file']
+        if path.exists():
+            path.unlink()
+    save_state(state)
+
+    index = {page: entry['bundle'] for page, entry in sorted(state['pages'].items())}
+    SEARCH_DIR.mkdir(parents=True, exist_ok=True)
+    write_atomic(SEARCH_DIR / 'index.json', (json.dumps(index, ensure_ascii=False, indent=2) + '\n').encode('utf-8'))
+
+    # 4. 总结
+    raw_bytes = sum(path.stat().st_size for path in CONTENT_DIR.glob('*.json'))
+    print("\n" + "=" * 70)
+    print("总结")
+    print("=" * 70)
+    print(f"  页面: {len(page_files)}, 重新生成: {len(pending)}, 未变化: {len(page_files) - len(pending)}")
+    print(f"  收录资源: {sum(entry['docs'] for entry in index.values())}")
+    print(f"  索引总大小: {format_bytes(sum(entry['bytes'] for entry in index.values()))} "
+          f"(gzip {format_bytes(sum(entry['gzip_bytes'] for entry in index.values()))})，"
+          f"nav-groups 原始 JSON: {format_bytes(raw_bytes)}")
+
+if __name__ == '__main__':
+    main()
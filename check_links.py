@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+资源链接健康检查程序（维护 nav-groups 中资源的 status 字段）
+===========================
+
+功能：
+1. 与 fetch_icons_via_api.process_file 相同的遍历（iter_resources）收集资源的 url，规范化后合并，同一链接只检查一次；
+   与 Keystatic 工具箱的网站链接检测一致，默认排除 github.com、应用商店等域名（GitHub 仓库由 GitHub 检测维护，
+   商店页面对爬虫返回的状态码不可靠）
+2. 连接池 + 全局并发上限，按主机（host:port）限制同时请求数和相邻请求间隔，避免对同一站点造成压力
+3. 先发 HEAD，返回 4xx/5xx 时改用 GET（只读响应头）确认；带上次记录的 ETag / Last-Modified 发条件请求，
+   未变化的站点只需一个 304
+4. 结果写入 .icon_cache/link_state.sqlite3，连续失败达到 --confirm 次才把 status 改为失效，一次恢复即改回 ok
+5. 分组 JSON 通过临时文件 + os.replace 原子写回
+
+status 取值：
+- 可访问（2xx/3xx、304，以及 401/403/429 等拒绝爬虫但站点在线的响应）-> ok
+- 超时 -> 网站超时
+- 404/410、其他 4xx、5xx、DNS / 连接失败、SSL 错误 -> 网站失效
+只改写 ok / 网站失效 / 网站超时 三种状态；stale、github已归档、github仓库已失效（GitHub 检查工具维护）
+和人工标记的 官网失效 保持不变，只在报告中列出。没有 status 字段的资源在仍然可访问时不写入该字段。
+
+使用方法：
+    python check_links.py [--workers N] [--per-host N] [--host-interval S] [--timeout S] [--confirm N]
+                          [--page ID] [--exclude a.com,b.com] [--dry-run] [--verbose]
+                          [--metrics-json PATH] [--metrics-prom PATH] [--metrics-openmetrics PATH] [--profile [N]]
+
+参数：
+    --workers N         全局并发数（默认 32）
+    --per-host N        同一主机同时进行的请求数上限（默认 2）
+    --host-interval S   同一主机相邻两次请求开始的最小间隔（秒，默认 1）
+    --timeout S         读取超时（秒，默认 10；连接超时固定 5 秒）
+    --confirm N         连续失败 N 次才标记失效（默认 2，1 为立即标记）
+    --page ID           只检查指定页面的分组文件（可重复）
+    --exclude LIST      额外排除的域名，逗号分隔（子域名一并排除）
+    --dry-run           只检查并报告，不修改 JSON 文件和链接状态库
+    --verbose           输出每个链接的结果
+    --metrics-* / --profile  见 tool_metrics.py
+
+离线测试：
+    python link_check_stub.py --port 4398 &
+    python bench_icon_tools.py links --urls 3000 --hosts 40
+"""
+
+import json
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from heapq import heappop, heappush
+from urllib.parse import urlparse
+
+import requests
+
+from fetch_icons_via_api import create_session, save_group_file
+from nav_index import CONTENT_DIR, iter_resources, load_nav_index, normalize_url
+from tool_metrics import METRICS, add_metrics_arguments, instrumented
+
+# ==================== 配置 ====================
+CONFIG = {
+    'state_path': '.icon_cache/link_state.sqlite3',  # 每个链接上次的验证器和连续失败次数
+    'connect_timeout': 5,
+    'user_agent': 'Mozilla/5.0 (compatible; nav-link-checker/1.0)',
+    'progress_every': 200,  # 每完成多少个链接输出一次进度
+}
+
+# 检查程序维护的状态；其他状态（GitHub 检查工具、人工标记）不改写
+MANAGED_STATUSES = {'ok', '网站失效', '网站超时'}
+
+# 默认排除的域名（与 Keystatic LinkChecker 的 DEFAULT_EXCLUDED_DOMAINS 一致）
+DEFAULT_EXCLUDED_DOMAINS = [
+    'github.com',
+    'play.google.com',
+    'marketplace.visualstudio.com',
+    'apps.apple.com',
+    'chrome.google.com',
+    'addons.mozilla.org',
+]
+
+# 视为站点在线的结果
+HEALTHY_OUTCOMES = {'ok', 'not_modified', 'blocked'}
+
+# 拒绝爬虫或需要登录，但站点本身在线
+BLOCKED_CODES = {401, 403, 429}
+
+# ==================== 链接状态 ====================
+
+class LinkState:
+    """规范化 URL -> 上次的 ETag / Last-Modified、结果和连续失败次数（SQLite），只在主线程中读写"""
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS links ('
+            'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, outcome TEXT, status_code INTEGER, '
+            'failures INTEGER NOT NULL DEFAULT 0, checked_at REAL NOT NULL)'
+        )
+
+    def get(self, url):
+        row = self.conn.execute(
+            'SELECT etag, last_modified, outcome, status_code, failures FROM links WHERE url = ?', (url,)
+        ).fetchone()
+        if not row:
+            return None
+        return dict(zip(('etag', 'last_modified', 'outcome', 'status_code', 'failures'), row))
+
+    @staticmethod
+    def next_failures(result, previous) -> int:
+        """本次检查后的连续失败次数"""
+        return 0 if result['outcome'] in HEALTHY_OUTCOMES else (previous or {}).get('failures', 0) + 1
+
+    def record(self, url, result, previous) -> int:
+        """保存检查结果，返回更新后的连续失败次数"""
+        failures = self.next_failures(result, previous)
+        etag, last_modified = result['etag'], result['last_modified']
+        if result['outcome'] == 'not_modified' and previous:
+            etag = etag or previous['etag']
+            last_modified = last_modified or previous['last_modified']
+        self.conn.execute(
+            'INSERT OR REPLACE INTO links (url, etag, last_modified, outcome, status_code, failures, checked_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (url, etag, last_modified, result['outcome'], result['status_code'], failures, time.time()),
+        )
+        return failures
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+# ==================== 检查 ====================
+
+def classify_status(status_code: int) -> str:
+    """HTTP 状态码 -> ok / not_modified / blocked / gone / client_error / server_error"""
+    if status_code == 304:
+        return 'not_modified'
+    if status_code < 400:
+        return 'ok'
+    if status_code in BLOCKED_CODES:
+        return 'blocked'
+    if status_code in (404, 410):
+        return 'gone'
+    return 'server_error' if status_code >= 500 else 'client_error'
+
+def check_link(url, session, previous=None, timeout=10):
+    """检查单个链接，返回 {'outcome', 'status_code', 'etag', 'last_modified', 'method', 'latency'}
+
+    outcome 除 classify_status 的取值外还有 timeout / unreachable（DNS、连接失败）/ error（SSL、重定向过多等）。
+    """
+    headers = {'User-Agent': CONFIG['user_agent']}
+    if previous:
+        if previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        if previous.get('last_modified'):
+            headers['If-Modified-Since'] = previous['last_modified']
+    result = {'outcome': 'error', 'status_code': None, 'etag': None, 'last_modified': None,
+              'method': 'HEAD', 'latency': 0.0}
+    timeouts = (CONFIG['connect_timeout'], timeout)
+
+    start = time.monotonic()
+    try:
+        response = session.head(url, headers=headers, timeout=timeouts, allow_redirects=True)
+        response.close()
+        if response.status_code >= 400:
+            # 不少站点不支持 HEAD 或对 HEAD 返回错误，用 GET 确认（只读响应头，不下载正文）
+            result['method'] = 'GET'
+            response = session.get(url, headers=headers, timeout=timeouts, allow_redirects=True, stream=True)
+            response.close()
+        result['status_code'] = response.status_code
+        result['outcome'] = classify_status(response.status_code)
+        result['etag'] = response.headers.get('ETag')
+        result['last_modified'] = response.headers.get('Last-Modified')
+    except requests.exceptions.Timeout:
+        result['outcome'] = 'timeout'
+    except requests.exceptions.ConnectionError:
+        result['outcome'] = 'unreachable'
+    except requests.exceptions.RequestException:
+        result['outcome'] = 'error'
+    result['latency'] = time.monotonic() - start
+    return result
+
+def link_host(url) -> str:
+    try:
+        return urlparse(url).netloc.lower()
+    except ValueError:
+        return ''
+
+class HostScheduler:
+    """按主机分队列的调度：同一主机最多 per_host 个进行中的请求，相邻请求开始间隔不小于 interval 秒
+
+    不同主机轮流出队，慢主机不会挡住其他主机。只在主线程中调用。
+    """
+
+    def __init__(self, urls, per_host=2, interval=1.0):
+        self.per_host = max(1, per_host)
+        self.interval = interval
+        self.queues = defaultdict(deque)
+        for url in urls:
+            self.queues[link_host(url)].append(url)
+        self.active = defaultdict(int)
+        self.last_start = {}
+        self.ready = deque(self.queues)
+        self.waiting = []  # (可出队时间, 主机)
+        self.scheduled = set(self.queues)
+        self.pending = len(urls)
+
+    def take(self, now):
+        """返回 (url, 主机)；当前没有可发出的请求时返回 None"""
+        while self.waiting and self.waiting[0][0] <= now:
+            self.ready.append(heappop(self.waiting)[1])
+        if not self.ready:
+            return None
+        host = self.ready.popleft()
+        url = self.queues[host].popleft()
+        self.pending -= 1
+        self.active[host] += 1
+        self.last_start[host] = now
+        if not self.queues[host]:
+            self.scheduled.discard(host)
+        elif self.active[host] < self.per_host:
+            heappush(self.waiting, (now + self.interval, host))
+        else:
+            # 并发已满，等 release 时重新排队
+            self.scheduled.discard(host)
+        return url, host
+
+    def release(self, host, now):
+        self.active[host] -= 1
+        if self.queues[host] and host not in self.scheduled:
+            self.scheduled.add(host)
+            heappush(self.waiting, (max(now, self.last_start[host] + self.interval), host))
+
+    def next_wait(self, now):
+        """距离下一个主机可以出队的秒数；没有排队中的主机时返回 None"""
+        if self.ready:
+            return 0.0
+        if self.waiting:
+            return max(0.0, self.waiting[0][0] - now)
+        return None
+
+def sweep(urls, session, state, workers=32, per_host=2, interval=1.0, timeout=10, verbose=False, dry_run=False):
+    """并发检查所有链接，返回 url -> 结果（含连续失败次数 failures）
+
+    dry_run=True 时只读取状态库（条件请求头、之前的失败次数），不写入本次结果。
+    """
+    scheduler = HostScheduler(urls, per_host, interval)
+    results = {}
+    running = {}
+    started = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while scheduler.pending or running:
+            now = time.monotonic()
+            while len(running) < workers:
+                item = scheduler.take(now)
+                if item is None:
+                    break
+                url, host = item
+                previous = state.get(url)
+                running[executor.submit(check_link, url, session, previous, timeout)] = (url, host, previous)
+
+            delay = scheduler.next_wait(now) if len(running) < workers else None
+            if not running:
+                time.sleep(delay or 0.01)
+                continue
+            done, _ = wait(running, timeout=delay, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, host, previous = running.pop(future)
+                scheduler.release(host, time.monotonic())
+                result = future.result()
+                if dry_run:
+                    result['failures'] = LinkState.next_failures(result, previous)
+                else:
+                    result['failures'] = state.record(url, result, previous)
+                results[url] = result
+                METRICS.observe('link_check_seconds', result['latency'], outcome=result['outcome'])
+                METRICS.inc('link_checks_total', outcome=result['outcome'], method=result['method'])
+                if verbose:
+                    print(f"    {result['outcome']:<12} {result['status_code'] or '-':<4} {url}")
+                if len(results) % CONFIG['progress_every'] == 0:
+                    state.commit()
+                    elapsed = time.monotonic() - started
+                    print(f"  已检查 {len(results)}/{len(urls)}（{len(results) / elapsed:.1f} 个/秒）")
+    state.commit()
+    return results
+
+# ==================== 状态更新 ====================
+
+def decide_status(current: str, result: dict, confirm: int) -> str:
+    """根据检查结果决定资源的新 status；非本程序维护的状态原样返回"""
+    if current not in MANAGED_STATUSES:
+        return current
+    if result['outcome'] in HEALTHY_OUTCOMES:
+        return 'ok'
+    if result['failures'] < confirm:
+        return current
+    return '网站超时' if result['outcome'] == 'timeout' else '网站失效'
+
+def is_excluded(url, excluded_domains) -> bool:
+    host = link_host(url).split(':')[0]
+    return any(host == domain or host.endswith('.' + domain) for domain in excluded_domains)
+
+def collect_links(json_files, excluded_domains=()) -> tuple:
+    """读取分组文件，返回 ({文件: 数据}, [(文件, 资源, 规范化 URL)], {规范化 URL: 请求用的 URL}, 排除数)"""
+    documents = {}
+    entries = []
+    targets = {}
+    excluded = 0
+    for file_path in json_files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            documents[file_path] = json.load(f)
+        for _, resource in iter_resources(documents[file_path]):
+            key = normalize_url(resource.get('url'))
+            if not key or not key.startswith(('http://', 'https://')):
+                continue
+            if is_excluded(key, excluded_domains):
+                excluded += 1
+                continue
+            entries.append((file_path, resource, key))
+            targets.setdefault(key, resource['url'].strip())
+    return documents, entries, targets, excluded
+
+# ==================== 主逻辑 ====================
+
+def run(args):
+    """执行检查流程（main 解析参数后调用）"""
+    print("=" * 70)
+    print("资源链接健康检查程序")
+    print("=" * 70)
+    print(f"模式: {'预览模式' if args.dry_run else '执行模式'}")
+    print(f"并发: {args.workers}, 每主机: {args.per_host}, 主机间隔: {args.host_interval}s, "
+          f"超时: {args.timeout}s, 连续失败 {args.confirm} 次标记失效")
+    print()
+
+    # 1. 收集链接
+    METRICS.phase('collect')
+    print("[1] 收集资源链接...")
+    nav_index = load_nav_index()
+    json_files = [CONTENT_DIR / name for name in nav_index.groups
+                  if not args.page or nav_index.pages.get(name) in args.page]
+    excluded_domains = DEFAULT_EXCLUDED_DOMAINS + [d.strip().lower() for d in args.exclude.split(',') if d.strip()]
+    documents, entries, targets, excluded = collect_links(json_files, excluded_domains)
+    hosts = {link_host(url) for url in targets.values()}
+    print(f"  分组文件: {len(json_files)}, 资源: {len(entries)}（排除域名 {excluded}）, "
+          f"去重后链接: {len(targets)}, 主机: {len(hosts)}")
+
+    # 2. 并发检查
+    METRICS.phase('sweep')
+    print("\n[2] 检查链接...")
+    state = LinkState(CONFIG['state_path'])
+    session = create_session(args.workers)
+    start = time.monotonic()
+    try:
+        raw_results = sweep(list(targets.values()), session, state, workers=args.workers,
+                            per_host=args.per_host, interval=args.host_interval,
+                            timeout=args.timeout, verbose=args.verbose, dry_run=args.dry_run)
+    finally:
+        state.close()
+    elapsed = time.monotonic() - start
+    results = {key: raw_results[url] for key, url in targets.items()}
+    outcomes = Counter(result['outcome'] for result in results.values())
+    print(f"  完成: {len(results)} 个链接，耗时 {elapsed:.1f}s（{len(results) / max(elapsed, 1e-9):.1f} 个/秒）")
+
+    # 3. 更新 status
+    METRICS.phase('apply')
+    print(f"\n[3] {'预览' if args.dry_run else '更新'} status...")
+    changes = []
+    pending_confirm = []
+    unmanaged = []
+    dirty = set()
+    for file_path, resource, key in entries:
+        result = results[key]
+        current = resource.get('status', 'ok')
+        new = decide_status(current, result, args.confirm)
+        healthy = result['outcome'] in HEALTHY_OUTCOMES
+        if current not in MANAGED_STATUSES:
+            if healthy == (current == 'ok'):
+                continue
+            unmanaged.append((resource.get('name'), current, result['outcome']))
+        elif new != current:
+            changes.append((file_path.name, resource.get('name'), current, new, result))
+            resource['status'] = new
+            dirty.add(file_path)
+        elif not healthy and new == 'ok':
+            pending_confirm.append((resource.get('name'), result['outcome'], result['failures']))
+
+    for file_name, name, old, new, result in changes:
+        code = f" {result['status_code']}" if result['status_code'] else ''
+        print(f"  {file_name}: {name}: {old} -> {new}（{result['outcome']}{code}）")
+    if not args.dry_run:
+        for file_path in sorted(dirty):
+            save_group_file(file_path, documents[file_path])
+
+    # 4. 总结
+    METRICS.phase('report')
+    print("\n" + "=" * 70)
+    print("总结")
+    print("=" * 70)
+    print(f"  链接: {len(results)}, 耗时 {elapsed:.1f}s")
+    print("  结果: " + ', '.join(f"{outcome} {count}" for outcome, count in outcomes.most_common()))
+    print(f"  304 未变化: {outcomes.get('not_modified', 0)}")
+    print(f"  {'将修改' if args.dry_run else '已修改'} status: {len(changes)} 个资源（{len(dirty)} 个文件）")
+    if pending_confirm:
+        print(f"  失败但未达到确认次数（暂不修改）: {len(pending_confirm)}")
+        for name, outcome, failures in pending_confirm[:10]:
+            print(f"    - {name}: {outcome}（连续 {failures} 次）")
+    if unmanaged:
+        print(f"  非本程序维护的状态与检查结果不一致（请人工确认）: {len(unmanaged)}")
+        for name, current, outcome in unmanaged[:10]:
+            print(f"    - {name}: {current} / {outcome}")
+
+def main():
+    parser = argparse.ArgumentParser(description='资源链接健康检查程序')
+    parser.add_argument('--workers', '-w', type=int, default=32, help='全局并发数（默认 32）')
+    parser.add_argument('--per-host', type=int, default=2, help='同一主机同时进行的请求数上限（默认 2）')
+    parser.add_argument('--host-interval', type=float, default=1.0, help='同一主机相邻请求的最小间隔（秒，默认 1）')
+    parser.add_argument('--timeout', type=float, default=10, help='读取超时（秒，默认 10）')
+    parser.add_argument('--confirm', type=int, default=2, help='连续失败多少次才标记失效（默认 2）')
+    parser.add_argument('--page', action='append', default=None, help='只检查指定页面（可重复）')
+    parser.add_argument('--exclude', type=str, default='', help='额外排除的域名，逗号分隔')
+    parser.add_argument('--dry-run', action='store_true', help='只检查并报告，不修改文件和链接状态库')
+    parser.add_argument('--verbose', '-v', action='store_true', help='输出每个链接的结果')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumented(args, 'links'):
+        run(args)
+
+if __name__ == '__main__':
+    main()
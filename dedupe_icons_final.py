@@ -4,10 +4,40 @@
 ===========================
 
 功能：
-1. 找出所有重复图标（相同哈希）
+1. 找出所有重复图标（相同哈希，先按大小和头尾部分哈希预筛选）
 2. 更新 JSON 文件中的引用
 3. 删除多余图标文件
-4. 处理未引用文件
+4. 列出未引用文件（回收见 gc_icons.py）
+
+获取、去重、压缩和回收一次执行（共享内存中的内容模型，每个 JSON 只写一次）见 icon_pipeline.py。
+
+使用方法：
+    python dedupe_icons_final.py [--dry-run] [--rebuild-index] [--incremental] [--jobs N]
+                                 [--perceptual [--perceptual-threshold N] [--perceptual-apply]]
+                                 [--watch [--debounce S] [--poll]]
+                                 [--metrics-json PATH] [--metrics-prom PATH] [--metrics-openmetrics PATH] [--profile [N]]
+
+参数：
+    --dry-run                   只预览，不改写 JSON、不删除文件（也可把 DRY_RUN 设为 True）
+    --rebuild-index             忽略 .icon_cache/hash_index.json，重新计算所有图标哈希
+    --incremental               与上次执行的清单（.icon_cache/dedupe_manifest.json）比较，
+                                按文件签名（大小、修改时间、inode）找出新增 / 修改 / 删除的图标，
+                                只重新评估它们所在的大小桶；没有清单，或上次执行没有实际合并重复
+                                （预览模式）时重新评估全部大小桶。
+                                只作用于图标扫描；引用改写本来就只读取引用了被替换图标的分组文件
+    --jobs N                    并行任务数：哈希计算用线程池，感知哈希解码用进程池；结果按文件名顺序合并（默认 1）
+    --perceptual                同时按 dHash 感知哈希查找近似重复（重新编码、缩放过的同一图标），需要 Pillow。
+                                默认只报告近似组（写入报告的 perceptual_duplicates），不改写引用、不删除文件：
+                                不同站点的相似图标也可能落在阈值内，需要人工确认
+    --perceptual-threshold N    感知哈希汉明距离阈值（默认 4）
+    --perceptual-apply          确认后合并感知近似组（改写引用并删除文件），隐含 --perceptual
+    --watch                     常驻监听模式（见 icon_watch.py）：哈希索引常驻内存，图标目录变化时
+                                只对涉及的大小桶计算哈希并去重，不重新扫描整个目录
+    --debounce S                监听模式的去抖时间（默认 1 秒）
+    --poll                      监听模式不使用 inotify，定时比较目录签名
+    --metrics-json PATH         把各阶段耗时、读写 / 删除字节数等指标写入 JSON（见 tool_metrics.py）
+    --metrics-prom PATH         同上，Prometheus textfile 格式；--metrics-openmetrics 为 OpenMetrics 格式
+    --profile [N]               用 cProfile 包裹运行，输出最耗时的 N 个函数（默认 25）
 
 缓存策略说明：
 - domainIconCache: 仅用于普通网站（不用于 GitHub/Google Play）
@@ -21,18 +51,41 @@
 """
 
 import os
+import sys
+import argparse
 import hashlib
 import json
 import re
 import shutil
 from pathlib import Path
+from array import array
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
+from file_utils import file_signature
+from nav_index import ICON_PREFIX, NavIndex, icon_filename, load_nav_index
+from tool_metrics import METRICS, add_metrics_arguments, instrumented
+
 # ==================== 配置 ====================
 ICONS_DIR = Path('./public/images/logos')
 CONTENT_DIR = Path('./src/content/nav-groups')
 BACKUP_DIR = Path('./icon_cleanup_backup')
+CACHE_DIR = Path('./.icon_cache')
+HASH_INDEX_PATH = CACHE_DIR / 'hash_index.json'
+HASH_INDEX_VERSION = 2
+DEDUPE_MANIFEST_PATH = CACHE_DIR / 'dedupe_manifest.json'
+DEDUPE_MANIFEST_VERSION = 2
+INGEST_REDIRECTS_PATH = CACHE_DIR / 'ingest_redirects.json'
+
+# 哈希配置：blake2b-128（与原 MD5 同为 32 位十六进制），头尾各读 4KB 做部分哈希
+HASH_DIGEST_SIZE = 16
+HASH_CHUNK_SIZE = 64 * 1024
+PARTIAL_HASH_SIZE = 4 * 1024
+
+# 感知哈希配置：dHash 缩略图边长（8 -> 64 位哈希）、默认汉明距离阈值
+DHASH_SIZE = 8
+PERCEPTUAL_THRESHOLD = 4
 
 # 通用图标配置（当无法获取特定图标时使用）
 GENERIC_ICONS = {
@@ -53,59 +106,422 @@ DRY_RUN = False
 
 # ==================== 工具函数 ====================
 
+def _new_hasher():
+    return hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+
 def calculate_file_hash(filepath: Path) -> str:
-    """计算文件 MD5 哈希"""
+    """流式分块计算文件完整哈希（blake2b）"""
     with open(filepath, 'rb') as f:
-        return hashlib.md5(f.read()).hexdigest()
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, _new_hasher).hexdigest()
+        hasher = _new_hasher()
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+        return hasher.hexdigest()
 
-def backup_files():
-    """备份文件"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_path = BACKUP_DIR / timestamp
-    
-    shutil.copytree(ICONS_DIR, backup_path / 'logos')
-    shutil.copytree(CONTENT_DIR, backup_path / 'nav-groups')
-    
-    print(f"备份完成: {backup_path}")
-    return backup_path
+def calculate_partial_hash(filepath: Path, size: int) -> str:
+    """只读取文件头尾计算部分哈希；小文件直接计算完整哈希"""
+    if size <= 2 * PARTIAL_HASH_SIZE:
+        return calculate_file_hash(filepath)
+    hasher = _new_hasher()
+    with open(filepath, 'rb') as f:
+        hasher.update(f.read(PARTIAL_HASH_SIZE))
+        f.seek(-PARTIAL_HASH_SIZE, os.SEEK_END)
+        hasher.update(f.read(PARTIAL_HASH_SIZE))
+    return hasher.hexdigest()
+
+def load_hash_index(rebuild: bool = False) -> dict:
+    """读取持久化哈希索引（文件名 -> 签名 + 部分哈希/完整哈希）"""
+    if rebuild or not HASH_INDEX_PATH.exists():
+        return {}
+    try:
+        with open(HASH_INDEX_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"  警告: 哈希索引损坏，将重建: {e}")
+        return {}
+    if data.get('version') != HASH_INDEX_VERSION:
+        return {}
+    return data.get('files', {})
+
+def save_hash_index(entries: dict):
+    """原子写入哈希索引（先写临时文件再替换）"""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = HASH_INDEX_PATH.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        # json.dumps 一次性编码走 C 加速，json.dump 流式写入是纯 Python 实现，万级条目慢一个数量级
+        f.write(json.dumps({'version': HASH_INDEX_VERSION, 'files': entries}, ensure_ascii=False))
+    os.replace(tmp_path, HASH_INDEX_PATH)
+
+def load_ingest_redirects() -> dict:
+    """获取时去重删除的文件名 -> 规范图标（跨运行保留，后台内存缓存可能再次返回已删除的文件名）"""
+    if not INGEST_REDIRECTS_PATH.exists():
+        return {}
+    try:
+        with open(INGEST_REDIRECTS_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_ingest_redirects(redirects: dict):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = INGEST_REDIRECTS_PATH.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(redirects, ensure_ascii=False))
+    os.replace(tmp_path, INGEST_REDIRECTS_PATH)
+
+def load_dedupe_manifest():
+    """读取上次执行完成时的目录状态清单；不存在或版本不符时返回 None"""
+    if not DEDUPE_MANIFEST_PATH.exists():
+        return None
+    try:
+        with open(DEDUPE_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != DEDUPE_MANIFEST_VERSION:
+        return None
+    return data
+
+def save_dedupe_manifest(icons: dict, previous: dict = None, merges_applied: bool = True,
+                         perceptual_applied: bool = False):
+    """记录本次执行完成后的图标目录状态（未变化时不重写）
+
+    merges_applied 为 False（预览模式）时重复仍留在目录中，下次增量执行不能把未变化的大小桶
+    视为无重复；perceptual_applied 记录感知近似组是否也已合并（只报告时近似图标仍然保留）。
+    """
+    data = {
+        'version': DEDUPE_MANIFEST_VERSION,
+        'merges_applied': merges_applied,
+        'perceptual_applied': perceptual_applied,
+        'icons': icons,
+    }
+    if data == previous:
+        return
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = DEDUPE_MANIFEST_PATH.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(data, ensure_ascii=False))
+    os.replace(tmp_path, DEDUPE_MANIFEST_PATH)
+
+def backup_files(label: str = 'dedupe_icons_final.py 执行前'):
+    """备份文件（内容寻址快照，只存储变化的文件，见 icon_backup.py）"""
+    from file_utils import format_bytes
+    from icon_backup import create_snapshot
+    timestamp, written = create_snapshot(label)
+    
+    print(f"  备份完成: 快照 {timestamp}（新写入 {format_bytes(written)}，"
+          f"恢复: python icon_backup.py restore {timestamp}）")
+    return timestamp
+
+def _call_chunk(func, chunk: list) -> list:
+    return [func(*args) for args in chunk]
+
+def map_ordered(func, args_list: list, jobs: int = 1, use_processes: bool = False) -> list:
+    """并行执行 func(*args)，结果按输入顺序返回（保证报告和选择结果可复现）
+
+    jobs <= 1 时串行执行；哈希计算用线程池（hashlib 读写时释放 GIL），图像解码用进程池。
+    任务按块提交，避免每个小文件一个 future 的调度开销。
+    """
+    if jobs <= 1 or len(args_list) < 2:
+        return [func(*args) for args in args_list]
+    executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    chunksize = max(1, len(args_list) // (jobs * 8))
+    chunks = [args_list[i:i + chunksize] for i in range(0, len(args_list), chunksize)]
+    with executor_cls(max_workers=jobs) as executor:
+        return [result for chunk in executor.map(_call_chunk, [func] * len(chunks), chunks) for result in chunk]
+
+def hash_size_buckets(entries: dict, buckets: dict, jobs: int = 1) -> tuple:
+    """对同大小的候选文件计算哈希并按内容分组（analyze_icons 与 --watch 模式共用）
+
+    entries 为哈希索引条目（文件名 -> {'sig', 'partial', 'hash'}），缺少的哈希就地补上；
+    buckets 为 大小 -> 文件名列表。先算头尾部分哈希，部分哈希仍相同的文件才算完整哈希。
+    返回 (大小 -> 按内容分组的文件名列表, 新计算部分哈希数, 新计算完整哈希数)。
+    """
+    need_partial = [
+        (ICONS_DIR / name, size) for size, names in buckets.items()
+        for name in names if 'partial' not in entries[name]
+    ]
+    METRICS.inc('files_hashed_total', len(need_partial), stage='partial')
+    METRICS.inc('bytes_read_total', sum(min(size, 2 * PARTIAL_HASH_SIZE) for _, size in need_partial), stage='partial')
+    for (file, size), partial in zip(need_partial, map_ordered(calculate_partial_hash, need_partial, jobs)):
+        entry = entries[file.name]
+        entry['partial'] = partial
+        if size <= 2 * PARTIAL_HASH_SIZE:
+            entry['hash'] = partial
+    
+    by_bucket = {}
+    for size, names in buckets.items():
+        by_partial = defaultdict(list)
+        for name in names:
+            by_partial[entries[name]['partial']].append(name)
+        by_bucket[size] = list(by_partial.values())
+    
+    need_full = [
+        (ICONS_DIR / name,) for groups in by_bucket.values() for candidates in groups if len(candidates) > 1
+        for name in candidates if 'hash' not in entries[name]
+    ]
+    METRICS.inc('files_hashed_total', len(need_full), stage='full')
+    METRICS.inc('bytes_read_total', sum(entries[file.name]['sig'][0] for file, in need_full), stage='full')
+    for (file,), file_hash in zip(need_full, map_ordered(calculate_file_hash, need_full, jobs)):
+        entries[file.name]['hash'] = file_hash
+    
+    hashed = {}
+    for size, groups in by_bucket.items():
+        hashed[size] = []
+        for candidates in groups:
+            if len(candidates) == 1:
+                hashed[size].append(candidates)
+                continue
+            by_hash = defaultdict(list)
+            for name in candidates:
+                by_hash[entries[name]['hash']].append(name)
+            hashed[size].extend(by_hash.values())
+    return hashed, len(need_partial), len(need_full)
 
-def analyze_icons():
-    """分析所有图标"""
+def analyze_icons(rebuild_index: bool = False, jobs: int = 1, manifest: dict = None):
+    """分析所有图标，返回 (哈希 -> 文件列表, 文件 -> 哈希, 文件 -> 签名)
+
+    分三级筛选，只读取可能重复的文件：
+    1. 按文件大小分组，大小唯一的文件不可能重复，不计算哈希
+    2. 同大小的文件计算头尾部分哈希
+    3. 部分哈希仍相同的文件才计算完整哈希
+    jobs > 1 时第 2、3 级在线程池中并行计算。
+
+    传入上次执行的清单（增量模式）时，逐个比较文件签名，只有新增、修改、删除的图标所在的
+    大小桶参与第 2、3 级，其余大小桶在上次执行后已无重复，直接视为唯一。
+    上次执行没有实际合并重复（清单 merges_applied 为 False）时，全部大小桶重新评估。
+    """
     hash_to_files = defaultdict(list)
     file_to_hash = {}
     
-    for file in ICONS_DIR.glob('*.webp'):
-        file_hash = calculate_file_hash(file)
-        hash_to_files[file_hash].append(file.name)
-        file_to_hash[file.name] = file_hash
-    
-    return hash_to_files, file_to_hash
+    cached = load_hash_index(rebuild_index)
+    entries = {}
+    
+    # 1. 按大小分组（只需 stat，不读文件）
+    # 用 os.scandir 按文件名字符串排序；桶里只存文件名，需要读取时才构造 Path，
+    # 万级目录下 Path 对象的创建和比较比 stat 本身还慢
+    by_size = defaultdict(list)
+    with os.scandir(ICONS_DIR) as it:
+        dir_entries = sorted((e for e in it if e.name.endswith('.webp') and e.is_file()), key=lambda e: e.name)
+    for dir_entry in dir_entries:
+        signature = file_signature(dir_entry.stat())
+        entry = cached.get(dir_entry.name)
+        if not entry or entry.get('sig') != signature:
+            entry = {'sig': signature}
+        entries[dir_entry.name] = entry
+        by_size[signature[0]].append(dir_entry.name)
+    
+    # 增量模式：与清单比较，确定需要重新评估的大小桶
+    affected_sizes = None
+    if manifest is not None and not manifest.get('merges_applied'):
+        print("  增量: 上次执行没有合并重复（预览模式），重新评估全部大小桶")
+    elif manifest is not None:
+        previous = manifest.get('icons', {})
+        current = {name: entry['sig'] for name, entry in entries.items()}
+        added = [name for name in current if name not in previous]
+        removed = [name for name in previous if name not in current]
+        modified = [name for name in current if name in previous and current[name] != previous[name]]
+        affected_sizes = {current[name][0] for name in added + modified}
+        affected_sizes.update(previous[name][0] for name in removed + modified)
+        print(f"  增量: 新增 {len(added)}, 修改 {len(modified)}, 删除 {len(removed)}, "
+              f"需重新评估的大小桶 {len(affected_sizes & set(by_size))}")
+    
+    def is_candidate_bucket(size, files):
+        return len(files) > 1 and (affected_sizes is None or size in affected_sizes)
+    
+    # 2-3. 候选大小桶计算部分哈希 / 完整哈希，其余文件直接视为唯一
+    candidates = {size: names for size, names in by_size.items() if is_candidate_bucket(size, names)}
+    hashed, partial_count, full_count = hash_size_buckets(entries, candidates, jobs)
+    groups = []
+    for size, names in by_size.items():
+        groups.extend(hashed[size] if size in hashed else ([name] for name in names))
+    
+    for candidates in groups:
+        for name in candidates:
+            entry = entries[name]
+            if len(candidates) > 1:
+                key = entry['hash']
+            else:
+                # 不参与比较的文件：有缓存的完整哈希就用它，否则用大小 + 文件名作为唯一键
+                # （增量模式下未受影响的大小桶可能有多个文件，不能只用大小 + 部分哈希）
+                key = entry.get('hash') or f"size:{entry['sig'][0]}:{name}"
+            hash_to_files[key].append(name)
+            file_to_hash[name] = key
+    
+    # 索引只保留目录中仍存在的文件，已删除文件自动清理
+    pruned = len(set(cached) - set(entries))
+    if entries != cached:
+        save_hash_index(entries)
+    singletons = sum(1 for files in by_size.values() if len(files) == 1)
+    print(f"  大小唯一（跳过哈希）: {singletons}")
+    print(f"  哈希索引: 新计算部分哈希 {partial_count}, 完整哈希 {full_count}, 清理 {pruned}")
+    
+    return hash_to_files, file_to_hash, {name: entry['sig'] for name, entry in entries.items()}
 
-def find_all_references():
-    """查找所有图标引用"""
-    references = defaultdict(list)
-    
-    for json_file in CONTENT_DIR.glob('*.json'):
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            pattern = r'"icon":\s*"(/images/logos/([^"?]+)[^"]*)"'
-            for match in re.finditer(pattern, content):
-                full_path = match.group(1)
-                filename = match.group(2)
-                references[filename].append({
-                    'file': json_file,
-                    'full_path': full_path,
-                })
-        except Exception as e:
-            print(f"  警告: 读取 {json_file.name} 失败: {e}")
-    
-    return references
+def compute_dhash(filepath: Path) -> int:
+    """计算 64 位差值感知哈希（dHash）：缩放为 9x8 灰度图后比较相邻像素"""
+    from PIL import Image
+    
+    with Image.open(filepath) as img:
+        # 透明背景统一合成到白底，避免透明像素被当成黑色
+        rgba = img.convert('RGBA')
+    background = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+    thumb = Image.alpha_composite(background, rgba).convert('L').resize(
+        (DHASH_SIZE + 1, DHASH_SIZE), Image.LANCZOS)
+    
+    pixels = thumb.tobytes()
+    value = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """按汉明距离组织的 BK 树，近邻查询无需两两比较"""
+    
+    def __init__(self):
+        self.root = None
+    
+    def add(self, value: int, item):
+        node = [value, item, {}]
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming_distance(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+    
+    def search(self, value: int, radius: int) -> list:
+        """返回距离不超过 radius 的所有条目"""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= radius:
+                found.append(item)
+            # 三角不等式：只有距离落在 [d - r, d + r] 的子树可能命中
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
 
-def select_best_file(files: list, references: dict) -> str:
-    """选择最佳保留文件（优先选择被引用最多的）"""
-    ref_counts = [(f, len(references.get(f, []))) for f in files]
+def _safe_dhash(filepath: Path) -> tuple:
+    """进程池任务：返回 (dHash, 错误信息)，单个文件解码失败不影响其他文件"""
+    try:
+        return compute_dhash(filepath), None
+    except Exception as e:
+        return None, str(e)
+
+def find_perceptual_groups(hash_to_files: dict, threshold: int = PERCEPTUAL_THRESHOLD, jobs: int = 1) -> dict:
+    """在字节哈希分组之上查找感知近似组
+
+    每个字节哈希组只解码一个代表文件（jobs > 1 时在进程池中并行解码）。聚类围绕固定的代表：
+    近邻最多的组优先成为代表，其阈值内的组都不能再成为代表；每个其他组归入距离最近的代表，
+    且必须与组内已接纳的所有成员距离都不超过阈值（否则不归入任何组），
+    近似关系不会经由中间图标链式传递。
+    返回 {'phash:<代表的 dHash>': [代表的文件, ..., 其他成员的文件, ...]}，只包含跨字节哈希组的结果。
+    """
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("感知去重需要安装依赖: pip install Pillow")
+        sys.exit(1)
+    
+    entries = load_hash_index()
+    keys = sorted(hash_to_files)
+    
+    need_decode = [
+        (ICONS_DIR / hash_to_files[key][0],) for key in keys
+        if 'dhash' not in entries.get(hash_to_files[key][0], {})
+    ]
+    decoded_values = dict(zip(
+        (path.name for (path,) in need_decode),
+        map_ordered(_safe_dhash, need_decode, jobs, use_processes=True),
+    ))
+    
+    units = []
+    dhashes = array('Q')
+    decoded = 0
+    for key in keys:
+        representative = hash_to_files[key][0]
+        entry = entries.get(representative)
+        if representative in decoded_values:
+            value, error = decoded_values[representative]
+            if error is not None:
+                print(f"  警告: 解码 {representative} 失败: {error}")
+                continue
+            decoded += 1
+            if entry is not None:
+                entry['dhash'] = value
+        else:
+            value = entry['dhash']
+        units.append(key)
+        dhashes.append(value)
+    
+    if decoded:
+        save_hash_index(entries)
+    print(f"  感知哈希: 新解码 {decoded}, 复用 {len(units) - decoded}")
+    
+    tree = BKTree()
+    for idx, value in enumerate(dhashes):
+        tree.add(value, idx)
+    
+    neighbors = [set(tree.search(value, threshold)) for value in dhashes]
+    
+    # 1. 选择代表：近邻多的优先，已被代表覆盖的不能再成为代表（代表之间的距离都超过阈值）
+    centers = []
+    covered = set()
+    for idx in sorted(range(len(units)), key=lambda i: (-len(neighbors[i]), i)):
+        if idx in covered or len(neighbors[idx]) < 2:
+            continue
+        centers.append(idx)
+        covered.update(neighbors[idx])
+    
+    # 2. 其他组归入距离最近的代表（同距离取先选出的代表）
+    members = {center: [] for center in centers}
+    center_set = set(centers)
+    for idx in sorted(covered - center_set):
+        _, center = min(
+            (hamming_distance(dhashes[idx], dhashes[center]), rank)
+            for rank, center in enumerate(centers) if idx in neighbors[center]
+        )
+        members[centers[center]].append(idx)
+    
+    groups = {}
+    for center in sorted(centers):
+        # 离代表近的先接纳；与已接纳成员距离超过阈值的不归组（两两距离都不超过阈值）
+        accepted = [center]
+        for idx in sorted(members[center], key=lambda i: (hamming_distance(dhashes[i], dhashes[center]), i)):
+            if all(hamming_distance(dhashes[idx], dhashes[j]) <= threshold for j in accepted):
+                accepted.append(idx)
+        if len(accepted) < 2:
+            continue
+        files = [f for idx in accepted for f in hash_to_files[units[idx]]]
+        groups[f'phash:{dhashes[center]:016x}'] = files
+    
+    return groups
+
+def find_all_references(index: NavIndex = None):
+    """查找所有图标引用（图标文件名 -> 引用条目列表，来自共享内容索引）"""
+    if index is None:
+        index = load_nav_index(CONTENT_DIR)
+    return index.references
+
+def select_best_file(files: list, references: dict, pending: dict = None) -> str:
+    """选择最佳保留文件（优先选择被引用最多的；pending 为尚未写入内容的引用数）"""
+    pending = pending or {}
+    ref_counts = [(f, len(references.get(f, [])) + pending.get(f, 0)) for f in files]
     
     # 优先选择通用图标文件名
     for f, count in ref_counts:
@@ -116,38 +532,208 @@ def select_best_file(files: list, references: dict) -> str:
     ref_counts.sort(key=lambda x: (-x[1], x[0]))
     return ref_counts[0][0]
 
-def update_json_references(replacements: dict, dry_run: bool = True):
-    """更新 JSON 文件中的引用"""
+def merge_duplicate_groups(duplicates: dict, perceptual: dict, file_to_hash: dict) -> dict:
+    """需要合并的组：字节重复组加上确认合并的感知近似组（被感知组包含的字节重复组不再单独处理）"""
+    merged = {file_to_hash[f] for files in perceptual.values() for f in files}
+    groups = {h: f for h, f in duplicates.items() if h not in merged}
+    groups.update(perceptual)
+    return groups
+
+def plan_replacements(groups: dict, references: dict) -> tuple:
+    """每个重复组保留最佳文件，返回 (旧文件名 -> 保留文件名, 需要删除的文件列表)"""
+    replacements = {}
+    files_to_delete = []
+    
+    for files in groups.values():
+        best_file = select_best_file(files, references)
+        
+        for file in files:
+            if file != best_file:
+                replacements[file] = best_file
+                files_to_delete.append(file)
+    
+    return replacements, files_to_delete
+
+class IngestDeduper:
+    """获取时去重：新写入的图标与已有图标比较，重复时改用已有的规范图标并立即删除新文件
+
+    fetch_icons_via_api.py 在每个 API 结果到达时调用 canonicalize()（只在主线程中调用）：
+    1. 字节比较：只与同大小的已有图标比较（头尾部分哈希，仍相同时完整哈希，结果写回持久化哈希索引）
+    2. perceptual=True 时字节不同再按 dHash 汉明距离比较（需要 Pillow；首次使用时为已有图标解码并缓存）；
+       只有 apply_perceptual=True 时才按近似结果删除新文件，否则只计入 stats['perceptual_candidates']
+    3. 有多个匹配时按 select_best_file 选择规范图标（优先 *-default.webp，其次引用最多的）
+    只处理本次运行中新出现（或内容变化）的文件；启动时已存在且未变化、或已被内容引用的文件不会被删除。
+    删除记录（旧文件名 -> 规范图标）持久化到 .icon_cache/ingest_redirects.json：后台在内存中缓存图标，
+    之后的运行中仍可能返回已删除的文件名，此时改用规范图标；没有记录的不存在文件视为获取失败。
+    """
+
+    def __init__(self, references: dict, perceptual: bool = False, threshold: int = PERCEPTUAL_THRESHOLD,
+                 dry_run: bool = False, apply_perceptual: bool = False):
+        self.references = references
+        self.pending = defaultdict(int)  # 本次运行中即将被资源引用的文件 -> 次数（结果尚未写回 JSON）
+        self.perceptual = perceptual
+        self.apply_perceptual = apply_perceptual
+        self.threshold = threshold
+        self.dry_run = dry_run
+        self.redirects = load_ingest_redirects()  # 已删除的新文件 -> 规范图标，后台再次返回同一文件名时直接改写
+        self.stats = defaultdict(int)
+        self.tree = None
+        self.changed = False
+        self.redirects_changed = False
+
+        cached = load_hash_index()
+        self.entries = {}
+        self.by_size = defaultdict(set)
+        with os.scandir(ICONS_DIR) as it:
+            for dir_entry in it:
+                if not (dir_entry.name.endswith('.webp') and dir_entry.is_file()):
+                    continue
+                signature = file_signature(dir_entry.stat())
+                entry = cached.get(dir_entry.name)
+                self.entries[dir_entry.name] = entry if entry and entry.get('sig') == signature else {'sig': signature}
+                self.by_size[signature[0]].add(dir_entry.name)
+
+    def _build_tree(self):
+        need_decode = [(ICONS_DIR / name,) for name, entry in sorted(self.entries.items()) if 'dhash' not in entry]
+        for (path,), (value, error) in zip(need_decode, map_ordered(_safe_dhash, need_decode)):
+            if error is None:
+                self.entries[path.name]['dhash'] = value
+        self.changed = self.changed or bool(need_decode)
+        self.tree = BKTree()
+        for name, entry in sorted(self.entries.items()):
+            if entry.get('dhash') is not None:
+                self.tree.add(entry['dhash'], name)
+
+    def _matches(self, filename: str, signature: list) -> tuple:
+        """返回 (与新文件重复的已有图标列表, 匹配方式)"""
+        size = signature[0]
+        bucket = sorted(self.by_size[size] | {filename})
+        if len(bucket) > 1:
+            hashed, _, _ = hash_size_buckets(self.entries, {size: bucket})
+            self.changed = True
+            for files in hashed[size]:
+                if filename in files and len(files) > 1:
+                    return [name for name in files if name != filename], 'bytes'
+        if self.perceptual:
+            if self.tree is None:
+                self._build_tree()
+            value, error = _safe_dhash(ICONS_DIR / filename)
+            if error is None:
+                self.entries[filename]['dhash'] = value
+                found = sorted(name for name in self.tree.search(value, self.threshold) if name != filename)
+                if found:
+                    return found, 'perceptual'
+        return [], None
+
+    def canonicalize(self, icon):
+        """返回资源应使用的图标路径：新文件与已有图标重复时返回规范图标路径并删除新文件
+
+        后台返回的文件不存在（没有删除记录，或记录的规范图标也已不存在）时返回 None，调用方按获取失败处理。
+        """
+        filename = icon_filename(icon)
+        if not filename or not filename.endswith('.webp'):
+            return icon
+        path = ICONS_DIR / filename
+        try:
+            signature = file_signature(path.stat())
+        except FileNotFoundError:
+            canonical = self.redirects.get(filename)
+            if canonical and (ICONS_DIR / canonical).exists():
+                return f'{ICON_PREFIX}{canonical}'
+            return None
+        old = self.entries.get(filename)
+        if old and old['sig'] == signature:
+            return icon
+        if self.references.get(filename) or self.pending[filename]:
+            # 已被内容引用的文件（后台覆盖写入了同名文件）不能直接删除，留给 dedupe_icons_final.py
+            return icon
+
+        self.stats['checked'] += 1
+        if old:
+            self.by_size[old['sig'][0]].discard(filename)
+        self.entries[filename] = {'sig': signature}
+        matches, method = self._matches(filename, signature)
+        if method == 'perceptual' and not self.apply_perceptual:
+            # 感知近似只报告，不删除
+            self.stats['perceptual_candidates'] += 1
+            METRICS.inc('ingest_perceptual_candidates_total')
+            matches = []
+        if not matches:
+            self.by_size[signature[0]].add(filename)
+            if self.tree is not None and self.entries[filename].get('dhash') is not None:
+                self.tree.add(self.entries[filename]['dhash'], filename)
+            # 资源即将引用该文件：之后后台为其他 URL 覆盖写入同名文件时不能再删除它
+            self.pending[filename] += 1
+            self.changed = True
+            return icon
+
+        canonical = select_best_file(matches, self.references, self.pending)
+        self.stats[f'deduped_{method}'] += 1
+        self.stats['bytes_saved'] += signature[0]
+        METRICS.inc('ingest_deduped_total', match=method)
+        METRICS.inc('bytes_deleted_total', signature[0])
+        del self.entries[filename]
+        if not self.dry_run:
+            path.unlink()
+        self.redirects[filename] = canonical
+        self.redirects_changed = True
+        self.pending[canonical] += 1  # 计入引用数，之后的选择与本次一致
+        self.changed = True
+        return f'{ICON_PREFIX}{canonical}'
+
+    def save(self):
+        if self.dry_run:
+            return
+        if self.changed:
+            save_hash_index(self.entries)
+            self.changed = False
+        if self.redirects_changed:
+            save_ingest_redirects(self.redirects)
+            self.redirects_changed = False
+
+# 匹配 "/images/logos/<文件名>" 或 "/images/logos/<文件名>?t=...，文件名为第 1 组
+ICON_REF_PATTERN = re.compile(r'"/images/logos/([^"?]+)(?="|\?t=)')
+
+def rewrite_icon_references(content: str, replacements: dict) -> tuple:
+    """单次扫描替换文本中的图标引用，返回 (新内容, 替换次数)"""
+    count = 0
+    
+    def substitute(match):
+        nonlocal count
+        new_file = replacements.get(match.group(1))
+        if new_file is None or new_file == match.group(1):
+            return match.group(0)
+        count += 1
+        return f'"/images/logos/{new_file}'
+    
+    return ICON_REF_PATTERN.sub(substitute, content), count
+
+def update_json_references(replacements: dict, dry_run: bool = True, index: NavIndex = None):
+    """更新 JSON 文件中的引用（每个文件只扫描一次）
+
+    传入内容索引时只打开引用了待替换图标的分组文件。
+    """
     updated_files = 0
     total_replacements = 0
     
-    for json_file in CONTENT_DIR.glob('*.json'):
+    if index is not None:
+        json_files = index.files_referencing(old for old, new in replacements.items() if old != new)
+    else:
+        json_files = sorted(CONTENT_DIR.glob('*.json'))
+    
+    for json_file in json_files:
         try:
             with open(json_file, 'r', encoding='utf-8') as f:
                 content = f.read()
             
-            original_content = content
-            file_replacements = 0
+            METRICS.inc('bytes_read_total', len(content.encode('utf-8')), stage='references')
+            content, file_replacements = rewrite_icon_references(content, replacements)
             
-            for old_file, new_file in replacements.items():
-                if old_file == new_file:
-                    continue
-                
-                patterns = [
-                    (f'"/images/logos/{old_file}"', f'"/images/logos/{new_file}"'),
-                    (f'"/images/logos/{old_file}?t=', f'"/images/logos/{new_file}?t='),
-                ]
-                
-                for old_pattern, new_pattern in patterns:
-                    count = content.count(old_pattern)
-                    if count > 0:
-                        content = content.replace(old_pattern, new_pattern)
-                        file_replacements += count
-            
-            if content != original_content:
+            if file_replacements:
                 if not dry_run:
                     with open(json_file, 'w', encoding='utf-8') as f:
                         f.write(content)
+                    METRICS.inc('bytes_written_total', len(content.encode('utf-8')), stage='references')
                 updated_files += 1
                 total_replacements += file_replacements
                 print(f"  {'[将更新]' if dry_run else '[已更新]'} {json_file.name} ({file_replacements} 处)")
@@ -164,6 +750,7 @@ def delete_files(files: list, dry_run: bool = True):
         filepath = ICONS_DIR / filename
         if filepath.exists():
             if not dry_run:
+                METRICS.inc('bytes_deleted_total', filepath.stat().st_size)
                 filepath.unlink()
             deleted += 1
     return deleted
@@ -189,27 +776,44 @@ def create_generic_icon(source_file: str, target_file: str, dry_run: bool = True
 
 # ==================== 主逻辑 ====================
 
-def main():
+def run(args):
+    """执行去重流程（main 解析参数后调用）"""
     print("=" * 70)
     print("图标去重和引用更新程序 v3")
     print("=" * 70)
     print(f"模式: {'预览模式' if DRY_RUN else '执行模式'}")
     print()
     
+    manifest = None
+    if args.incremental:
+        manifest = load_dedupe_manifest()
+        if manifest is None:
+            print("没有上次执行的清单，执行完整扫描")
+            print()
+    
     # 1. 分析图标
+    METRICS.phase('analyze')
     print("[1] 分析图标文件...")
-    hash_to_files, file_to_hash = analyze_icons()
+    hash_to_files, file_to_hash, signatures = analyze_icons(args.rebuild_index, args.jobs, manifest)
     print(f"  总图标数: {len(file_to_hash)}")
     print(f"  唯一哈希数: {len(hash_to_files)}")
     
     # 2. 找出重复
+    METRICS.phase('find_duplicates')
     print("\n[2] 查找重复图标...")
     duplicates = {h: f for h, f in hash_to_files.items() if len(f) > 1}
     print(f"  重复组数: {len(duplicates)}")
     
-    if duplicates:
+    perceptual = {}
+    if args.perceptual:
+        perceptual = find_perceptual_groups(hash_to_files, args.perceptual_threshold, args.jobs)
+        print(f"  感知近似组数: {len(perceptual)} (阈值 {args.perceptual_threshold}"
+              f"{'' if args.perceptual_apply else '，只报告，确认后使用 --perceptual-apply 合并'})")
+    merge_groups = merge_duplicate_groups(duplicates, perceptual if args.perceptual_apply else {}, file_to_hash)
+    
+    if duplicates or perceptual:
         print("\n  重复组详情:")
-        for h, files in list(duplicates.items())[:10]:
+        for h, files in list({**duplicates, **perceptual}.items())[:10]:
             print(f"    哈希 {h[:8]}... ({len(files)} 个文件)")
             for f in files[:3]:
                 print(f"      - {f}")
@@ -217,11 +821,14 @@ def main():
                 print(f"      - ... 还有 {len(files) - 3} 个")
     
     # 3. 查找引用
+    METRICS.phase('references')
     print("\n[3] 查找内容引用...")
-    references = find_all_references()
+    nav_index = load_nav_index(CONTENT_DIR)
+    references = find_all_references(nav_index)
     print(f"  被引用的图标: {len(references)}")
     
     # 4. 检查通用图标
+    METRICS.phase('generic_icons')
     print("\n[4] 检查通用图标...")
     for icon_type, config in GENERIC_ICONS.items():
         filename = config['filename']
@@ -232,17 +839,9 @@ def main():
             print(f"  ✗ {config['description']}: 不存在")
     
     # 5. 生成替换方案
+    METRICS.phase('plan')
     print("\n[5] 生成替换方案...")
-    replacements = {}
-    files_to_delete = []
-    
-    for file_hash, files in duplicates.items():
-        best_file = select_best_file(files, references)
-        
-        for file in files:
-            if file != best_file:
-                replacements[file] = best_file
-                files_to_delete.append(file)
+    replacements, files_to_delete = plan_replacements(merge_groups, references)
     
     print(f"  需要更新的引用: {len(replacements)}")
     print(f"  需要删除的文件: {len(files_to_delete)}")
@@ -256,26 +855,35 @@ def main():
         if len(replacements) > 15:
             print(f"  ... 还有 {len(replacements) - 15} 个")
     
-    # 7. 执行更新
-    print("\n[7] 更新 JSON 引用...")
-    updated_files, total_replacements = update_json_references(replacements, DRY_RUN)
+    # 7. 执行更新（执行模式下先做快照备份）
+    METRICS.phase('rewrite')
+    if not DRY_RUN and replacements:
+        print("\n[7] 备份并更新 JSON 引用...")
+        backup_files()
+    else:
+        print("\n[7] 更新 JSON 引用...")
+    updated_files, total_replacements = update_json_references(replacements, DRY_RUN, nav_index)
     print(f"  {'将更新' if DRY_RUN else '已更新'} {updated_files} 个文件, {total_replacements} 处引用")
     
     # 8. 删除文件
+    METRICS.phase('delete')
     print("\n[8] 删除重复文件...")
     deleted = delete_files(files_to_delete, DRY_RUN)
     print(f"  {'将删除' if DRY_RUN else '已删除'} {deleted} 个文件")
     
     # 9. 处理未引用文件
+    METRICS.phase('unreferenced')
     print("\n[9] 处理未引用文件...")
-    all_files = set(file_to_hash.keys())
-    referenced_files = set(references.keys())
-    unreferenced = all_files - referenced_files - set(files_to_delete)
-    
-    # 排除通用图标
-    for config in GENERIC_ICONS.values():
-        if config['filename'] in unreferenced:
-            unreferenced.remove(config['filename'])
+    unreferenced = set()
+    if manifest is not None:
+        # 全仓库引用扫描与改动量无关，增量模式下交给 gc_icons.py
+        print("  增量模式跳过（运行 python gc_icons.py 检查未引用文件）")
+    else:
+        # 引用来源不止 nav-groups：按 gc_icons.py 的标记阶段扫描所有内容集合和源文件
+        from gc_icons import GC_ROOTS, mark_references
+        all_files = {f.name for f in ICONS_DIR.iterdir() if f.is_file()}
+        referenced_files = set(mark_references()) | GC_ROOTS
+        unreferenced = all_files - referenced_files - set(files_to_delete)
     
     if unreferenced:
         print(f"  未引用文件: {len(unreferenced)}")
@@ -283,10 +891,18 @@ def main():
             print(f"    - {f}")
         if len(unreferenced) > 15:
             print(f"    - ... 还有 {len(unreferenced) - 15} 个")
-    else:
+        print("  运行 python gc_icons.py 将其移入隔离区并在宽限期后回收")
+    elif manifest is None:
         print("  没有未引用文件")
     
+    # 记录本次执行后的状态，供下次 --incremental 比较（预览模式记录为未合并，下次重新评估全部大小桶）
+    deleted_names = set() if DRY_RUN else set(files_to_delete)
+    save_dedupe_manifest({
+        name: signature for name, signature in signatures.items() if name not in deleted_names
+    }, manifest, merges_applied=not DRY_RUN, perceptual_applied=args.perceptual_apply and not DRY_RUN)
+    
     # 10. 总结
+    METRICS.phase('report')
     print("\n" + "=" * 70)
     print("总结")
     print("=" * 70)
@@ -303,11 +919,14 @@ def main():
             'original_count': len(file_to_hash),
             'unique_hashes': len(hash_to_files),
             'duplicate_groups': len(duplicates),
+            'perceptual_groups': len(perceptual),
             'duplicates_deleted': deleted,
             'unreferenced_count': len(unreferenced),
             'final_count': len(file_to_hash) - deleted,
         },
         'duplicates': {h: f for h, f in duplicates.items()},
+        'perceptual_duplicates': perceptual,
+        'perceptual_applied': args.perceptual_apply,
         'replacements': replacements,
         'files_deleted': files_to_delete,
         'unreferenced': list(unreferenced),
@@ -320,8 +939,35 @@ def main():
     
     if DRY_RUN:
         print("\n" + "=" * 70)
-        print("这是预览模式。要执行实际清理，请设置 DRY_RUN = False")
+        print("这是预览模式。要执行实际清理，请去掉 --dry-run（并确认 DRY_RUN = False）")
         print("=" * 70)
 
+def main():
+    global DRY_RUN
+    parser = argparse.ArgumentParser(description='图标去重和引用更新程序')
+    parser.add_argument('--dry-run', action='store_true', help='只预览，不改写 JSON、不删除文件')
+    parser.add_argument('--rebuild-index', action='store_true', help='忽略已有哈希索引，重新计算所有图标哈希')
+    parser.add_argument('--incremental', action='store_true', help='只重新评估相对上次执行发生变化的图标')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='并行任务数：哈希用线程池，感知哈希解码用进程池（默认 1）')
+    parser.add_argument('--perceptual', action='store_true', help='同时按感知哈希查找近似重复图标（需要 Pillow）')
+    parser.add_argument('--perceptual-threshold', type=int, default=PERCEPTUAL_THRESHOLD,
+                        help=f'感知哈希汉明距离阈值（默认 {PERCEPTUAL_THRESHOLD}）')
+    parser.add_argument('--perceptual-apply', action='store_true',
+                        help='合并感知近似组（改写引用并删除文件；默认只报告），隐含 --perceptual')
+    parser.add_argument('--watch', action='store_true', help='常驻监听图标目录，只对变化涉及的大小桶去重')
+    parser.add_argument('--debounce', type=float, default=1.0, help='监听模式的去抖时间（秒，默认 1）')
+    parser.add_argument('--poll', action='store_true', help='监听模式定时比较目录签名，不使用 inotify')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    args.perceptual = args.perceptual or args.perceptual_apply
+    DRY_RUN = DRY_RUN or args.dry_run
+
+    with instrumented(args, 'dedupe'):
+        if args.watch:
+            from icon_watch import run_watch
+            run_watch(args, fetch=False, dry_run=DRY_RUN)
+        else:
+            run(args)
+
 if __name__ == '__main__':
     main()
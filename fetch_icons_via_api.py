@@ -3,19 +3,55 @@
 批量获取资源图标的 Python 脚本（调用后台API版本）
 
 功能：
-1. 遍历 nav-groups 目录下的所有 JSON 文件
-2. 找出没有本地图标的资源
+1. 通过共享内容索引（nav_index.py）找出没有本地图标的资源
+2. 只打开含这些资源的 nav-groups JSON 文件
 3. 调用网站后台的 /api/smart-parse API 获取图标
-4. 更新 JSON 文件中的 icon 字段
+   （URL 规范化后合并，同一目标跨文件只请求一次，结果分发给所有引用它的资源）
+4. 更新 JSON 文件中的 icon 字段（结果先写入检查点日志，JSON 通过临时文件 + os.replace 原子写回）
 
 使用方法：
-    python fetch_icons_via_api.py [--workers N] [--dry-run] [--verbose] [--base-url URL]
+    python fetch_icons_via_api.py [--workers N] [--dry-run] [--verbose] [--base-url URL] [--per-file]
+                                  [--max-workers N] [--min-workers N] [--fixed-workers] [--target-latency S]
+                                  [--breaker-threshold N] [--breaker-cooldown S] [--resume] [--flush-interval S]
+                                  [--refresh] [--max-age H] [--no-batch] [--batch-size N] [--max-batch-size N]
+                                  [--no-local] [--generic-fallback] [--no-ingest-dedupe] [--perceptual [--perceptual-apply]] [--watch [--debounce S] [--poll] [--no-dedupe]]
+                                  [--metrics-json PATH] [--metrics-prom PATH] [--metrics-openmetrics PATH] [--profile [N]]
 
 参数：
-    --workers N     并行工作线程数（默认 5，避免API过载）
-    --dry-run       只检查不修改文件
-    --verbose       显示详细输出
-    --base-url URL  网站后台API地址（默认 http://localhost:4321）
+    --workers N             初始并发数（默认 5），所有文件共享同一个全局队列和连接池，
+                            并发按 AIMD 在 --min-workers 与 --max-workers 之间自动调整
+    --dry-run               只检查不修改文件
+    --verbose               显示详细输出
+    --base-url URL          网站后台API地址（默认 http://localhost:4321）
+    --per-file              逐文件处理（旧模式，每个文件单独开线程池，不使用结果缓存）
+    --max-workers N         自适应并发上限（默认 16）
+    --min-workers N         自适应并发下限（默认 1）
+    --fixed-workers         关闭自适应并发，固定使用 --workers 个线程
+    --target-latency S      单次请求延迟超过 S 秒视为过载（默认 10）
+    --breaker-threshold N   同一上游主机连续失败 N 次后熔断（默认 5，0 为关闭）
+    --breaker-cooldown S    熔断冷却时间（默认 60 秒）
+    --resume                重放 .icon_cache/fetch_journal.jsonl 检查点，继续上次中断的运行
+    --flush-interval S      每 S 秒把已有结果原子写回 JSON（默认 30）
+    --refresh               忽略 .icon_cache/fetch_cache.sqlite3 中的已有结果，全部重新请求
+    --max-age H             缓存有效期（小时），覆盖默认值（成功 30 天，失败 1 天）
+    --no-batch              不使用批量接口（默认在后台支持时启用：POST /api/smart-parse/batch 提交一批 URL，
+                            结果以 NDJSON 流式返回；后台不支持时自动回退到逐个 GET）
+    --batch-size N          初始批量大小（默认 20），之后按响应耗时自动调整
+    --max-batch-size N      批量大小上限（默认 200，且不超过后台声明的上限）
+    --no-local              关闭本地快速路径（默认先按 icon_resolver.py 的规则复用已有图标，只有未命中的目标调用 API）
+    --generic-fallback      GitHub / Google Play 目标本地未命中时直接使用通用图标，不调用 API
+    --no-ingest-dedupe      关闭获取时去重（默认每个新写入的图标到达时与已有图标比较字节哈希，
+                            重复则改用已有图标（优先 *-default.webp）并立即删除新文件，不必再运行 dedupe_icons_final.py）
+    --perceptual            获取时去重同时比较 dHash 感知哈希（需要 Pillow）；默认只统计近似的新图标，不删除
+    --perceptual-apply      按感知近似结果改用已有图标并删除新文件，隐含 --perceptual
+    --watch                 常驻监听模式（见 icon_watch.py）：内容索引、图标哈希索引和获取缓存常驻内存，
+                            nav-groups 变化时只为新增资源获取图标，图标目录变化时只对涉及的大小桶去重
+    --debounce S            监听模式的去抖时间（默认 1 秒）
+    --poll                  监听模式不使用 inotify，定时比较目录签名
+    --no-dedupe             监听模式下不对新图标去重
+    --metrics-json PATH     把阶段耗时、API 延迟直方图（按状态和第几次尝试）、读写字节数等指标写入 JSON
+    --metrics-prom PATH     同上，Prometheus textfile 格式；--metrics-openmetrics 为 OpenMetrics 格式
+    --profile [N]           用 cProfile 包裹运行，输出最耗时的 N 个函数（默认 25）
 
 注意：
     运行此脚本前，请确保网站服务器已启动（npm run dev 或 npm run preview）
@@ -26,12 +62,20 @@ import os
 import re
 import sys
 import argparse
+import random
+import sqlite3
 from urllib.parse import urlparse, quote
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from queue import Empty, SimpleQueue
 from threading import Lock
 import time
 
+from nav_index import icon_filename, iter_resources, is_local_icon, load_nav_index, normalize_url, url_domain
+from icon_resolver import LocalResolver
+from tool_metrics import METRICS, add_metrics_arguments, instrumented
+
 try:
     import requests
 except ImportError:
@@ -44,7 +88,16 @@ CONFIG = {
     'public_icon_prefix': '/images/logos',
     'timeout': 30,  # API 请求超时时间
     'retry_count': 2,  # 失败重试次数
-    'retry_delay': 1,  # 重试间隔（秒）
+    'retry_delay': 1,  # 重试退避基数（秒），第 n 次重试最多等待 retry_delay * 2^n
+    'retry_max_delay': 30,  # 单次退避等待上限（秒）
+    'cache_path': '.icon_cache/fetch_cache.sqlite3',  # 获取结果缓存
+    'cache_ttl_success': 30 * 24 * 3600,  # 成功结果有效期（秒）
+    'cache_ttl_failure': 24 * 3600,  # 确定性失败（后台答复无图标）的有效期（秒），期间直接跳过
+    'journal_path': '.icon_cache/fetch_journal.jsonl',  # 检查点日志，用于 --resume
+    'batch_path': '/api/smart-parse/batch',  # 批量接口：GET 探测是否支持，POST 提交 URL 列表，返回 NDJSON 流
+    'batch_concurrency': 2,  # 同时进行的批量请求数
+    'batch_target_seconds': 5,  # 批量大小按该目标耗时自动调整
+    'backend_failure_threshold': 5,  # 连续 N 个目标 5xx / 连接失败且涉及多个主机时判定后台故障，停止本次运行（0 为关闭）
 }
 
 # 全局锁用于线程安全的文件写入
@@ -60,65 +113,383 @@ def safe_print(*args, **kwargs):
 
 def has_local_icon(resource):
     """检查资源是否有本地图标"""
-    icon = resource.get('icon', '')
-    return icon and '/images/logos/' in icon
+    return is_local_icon(resource.get('icon', ''))
+
+
+class FetchCache:
+    """规范化 URL -> (状态, 图标, 获取时间) 的持久化缓存（SQLite），成功和失败分别设置有效期
+
+    只缓存后台给出的确定答复：成功（ok）和"没有图标"（not_found / not_local）。
+    5xx、超时、连接失败等后台或传输层错误不写入缓存，后台恢复后下次运行会重新请求。
+    旧版本写入的 failed 状态无法区分原因，有效期按 0 处理（视为未缓存）。
+    只在主线程中读写。
+    """
+
+    NEGATIVE_OUTCOMES = ('not_found', 'not_local')
+
+    def __init__(self, path, success_ttl, failure_ttl, refresh=False):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS fetch_results ('
+            'url TEXT PRIMARY KEY, status TEXT NOT NULL, icon TEXT, fetched_at REAL NOT NULL)'
+        )
+        self.ttl = {'ok': success_ttl, **{outcome: failure_ttl for outcome in self.NEGATIVE_OUTCOMES}}
+        self.refresh = refresh
+
+    def get(self, url):
+        """返回仍在有效期内的 (状态, 图标)，否则返回 None"""
+        if self.refresh:
+            return None
+        row = self.conn.execute(
+            'SELECT status, icon, fetched_at FROM fetch_results WHERE url = ?', (url,)
+        ).fetchone()
+        if not row:
+            return None
+        status, icon, fetched_at = row
+        if time.time() - fetched_at > self.ttl.get(status, 0):
+            return None
+        return status, icon
+
+    def put(self, url, icon, outcome='ok'):
+        """记录获取结果；没有图标且不是确定答复（outcome 不在 NEGATIVE_OUTCOMES）时不缓存，返回是否写入"""
+        status = 'ok' if icon else outcome
+        if status != 'ok' and status not in self.NEGATIVE_OUTCOMES:
+            return False
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO fetch_results (url, status, icon, fetched_at) VALUES (?, ?, ?, ?)',
+                (url, status, icon, time.time()),
+            )
+        return True
+
+    def close(self):
+        self.conn.close()
+
+
+class AdaptiveLimiter:
+    """AIMD 自适应并发：请求正常时每轮加 1，出现过载信号（5xx、超时、延迟超标）时乘性减半
+
+    每次减小后至少再完成 limit 个请求才会再次减小，避免一批并发失败把并发直接压到最小。
+    连接失败等传输层错误不是过载信号（后台未运行时减小并发没有意义），由 process_all_files 单独处理。
+    只在主线程中调用。
+    """
+
+    OVERLOAD_OUTCOMES = ('http_error', 'timeout')
+
+    def __init__(self, initial, minimum=1, maximum=None, target_latency=None, decrease_factor=0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum or initial)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self._since_decrease = 0
+
+    @property
+    def concurrency(self):
+        return int(self.limit)
+
+    def record(self, outcome, latency):
+        self._since_decrease += 1
+        overloaded = outcome in self.OVERLOAD_OUTCOMES or (
+            self.target_latency is not None and latency > self.target_latency
+        )
+        if overloaded:
+            if self._since_decrease >= self.concurrency:
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                self._since_decrease = 0
+        else:
+            # 加性增加：每完成约 limit 个正常请求，并发加 1
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class AdaptiveBatchSize:
+    """批量大小自适应：按上一批的单个 URL 平均耗时，把下一批调整到约 target 秒完成
+
+    每批最多增长一倍；批量请求失败时减半。只在主线程中调用。
+    """
+
+    def __init__(self, initial=20, minimum=1, maximum=200, target=5.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.size = min(max(initial, self.minimum), self.maximum)
+        self.target = target
+
+    def record(self, count, elapsed, ok):
+        if not ok:
+            self.size = max(self.minimum, self.size // 2)
+            return
+        if not count or elapsed <= 0:
+            return
+        ideal = int(self.target * count / elapsed)
+        self.size = min(self.maximum, max(self.minimum, min(ideal, self.size * 2)))
+
+
+class CircuitBreaker:
+    """按上游主机熔断：连续失败 threshold 次后，冷却期内该主机的请求直接判定失败
+
+    冷却期结束后只放行一个试探请求（半开），试探结果记录之前该主机的其他请求仍直接判定失败；
+    试探成功则恢复，失败则重新熔断。threshold 为 0 时不熔断。
+    """
+
+    def __init__(self, threshold=5, cooldown=60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = {}
+        self.opened_at = {}
+        self.probing = set()  # 试探请求尚未返回的主机
+        self.trips = 0
+
+    def allow(self, host):
+        opened_at = self.opened_at.get(host)
+        if opened_at is None:
+            return True
+        if host in self.probing or time.monotonic() - opened_at < self.cooldown:
+            return False
+        self.probing.add(host)
+        return True
+
+    def record(self, host, ok):
+        if not self.threshold or not host:
+            return
+        if host in self.probing:
+            self.probing.discard(host)
+            if ok:
+                del self.opened_at[host]
+                self.failures.pop(host, None)
+            else:
+                self.opened_at[host] = time.monotonic()
+                self.trips += 1
+                safe_print(f"    ⚠ {host}: 试探请求失败，重新熔断 {self.cooldown}s")
+            return
+        if ok:
+            self.failures.pop(host, None)
+            return
+        self.failures[host] = self.failures.get(host, 0) + 1
+        if self.failures[host] >= self.threshold and host not in self.opened_at:
+            self.opened_at[host] = time.monotonic()
+            self.trips += 1
+            safe_print(f"    ⚠ {host}: 连续失败 {self.failures[host]} 次，熔断 {self.cooldown}s")
+
+
+class FetchJournal:
+    """获取结果检查点日志（JSONL，结果到达即追加），中断后用 --resume 重放
+
+    每行记录 {file, path, url, icon}：分组文件、资源 JSON 路径、规范化 URL 和获取到的图标（失败为 null）。
+    结果写回分组文件之后清空（由 process_all_files 自己写回时在其结束时清空，否则由调用方写回后清空）。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+
+    def load(self):
+        """读取已完成的结果：(分组文件, JSON 路径) -> {'url', 'icon'}；忽略崩溃时写了一半的最后一行"""
+        entries = {}
+        if not self.path.exists():
+            return entries
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[(entry['file'], tuple(entry['path']))] = {'url': entry['url'], 'icon': entry['icon']}
+        return entries
+
+    def open(self, resume=False):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+
+    def record(self, file_path, json_path, url, icon):
+        self._file.write(json.dumps(
+            {'file': str(file_path), 'path': list(json_path), 'url': url, 'icon': icon},
+            ensure_ascii=False,
+        ) + '\n')
+        self._file.flush()
+
+    def sync(self):
+        if self._file:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
 
+    def clear(self):
+        self.close()
+        if self.path.exists():
+            self.path.unlink()
 
-def call_smart_parse_api(url, base_url, verbose=False):
-    """调用后台 API 获取图标"""
+
+def local_icon_exists(icon):
+    """缓存中的图标文件是否仍在本地（可能已被去重脚本删除）"""
+    filename = icon_filename(icon)
+    return bool(filename) and (Path(CONFIG['local_icon_path']) / filename).exists()
+
+
+def create_session(workers=5):
+    """创建带连接池的会话，所有工作线程复用 TCP 连接"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def backoff_delay(attempt):
+    """指数退避 + 全抖动：在 [0, min(上限, 基数 * 2^attempt)] 内随机等待"""
+    return random.uniform(0, min(CONFIG['retry_max_delay'], CONFIG['retry_delay'] * (2 ** attempt)))
+
+
+def classify_api_response(status_code, data, verbose=False):
+    """把单个 URL 的 API 结果转换为 (本地图标或 None, outcome)，单条请求和批量响应共用"""
+    if status_code == 200:
+        icon = (data or {}).get('icon') or ''
+        # 检查返回的图标是否是本地图标
+        if '/images/logos/' in icon:
+            # 移除时间戳参数
+            return icon.split('?')[0], 'ok'
+        if verbose:
+            safe_print(f"  API 返回非本地图标: {icon}")
+        return None, 'not_local'
+    if status_code == 404:
+        if verbose:
+            safe_print(f"  API 返回 404: 资源不存在")
+        return None, 'not_found'
+    if verbose:
+        safe_print(f"  API 返回错误: HTTP {status_code}")
+    return None, 'http_error'
+
+
+def fetch_target(url, base_url, verbose=False, session=None):
+    """调用后台 API 获取图标，返回结果详情
+
+    返回 {'icon', 'data', 'outcome', 'latency', 'attempts'}，outcome 为
+    ok / not_local / not_found / http_error / timeout / error。
+    5xx、超时和异常按指数退避重试；latency 为最后一次请求的耗时。
+    """
+    http = session or requests
     api_url = f"{base_url}/api/smart-parse?url={quote(url)}"
+    result = {'icon': None, 'data': None, 'outcome': 'error', 'latency': 0.0, 'attempts': 0}
     
     if verbose:
         safe_print(f"  调用 API: {api_url}")
     
     for attempt in range(CONFIG['retry_count']):
+        if attempt:
+            delay = backoff_delay(attempt - 1)
+            METRICS.inc('retries_total')
+            METRICS.inc('backoff_seconds_total', delay)
+            time.sleep(delay)
+        result['attempts'] = attempt + 1
+        start = time.monotonic()
         try:
-            response = requests.get(api_url, timeout=CONFIG['timeout'])
+            response = http.get(api_url, timeout=CONFIG['timeout'])
+            result['latency'] = time.monotonic() - start
+            METRICS.observe('smart_parse_request_seconds', result['latency'],
+                            status=response.status_code, attempt=attempt + 1)
+            METRICS.inc('bytes_read_total', len(response.content), stage='api')
             
-            if response.status_code == 200:
-                data = response.json()
-                icon = data.get('icon', '')
-                
-                # 检查返回的图标是否是本地图标
-                if icon and '/images/logos/' in icon:
-                    # 移除时间戳参数
-                    clean_icon = icon.split('?')[0]
-                    return clean_icon, data
-                else:
-                    if verbose:
-                        safe_print(f"  API 返回非本地图标: {icon}")
-                    return None, data
-            elif response.status_code == 404:
-                if verbose:
-                    safe_print(f"  API 返回 404: 资源不存在")
-                return None, None
-            else:
-                if verbose:
-                    safe_print(f"  API 返回错误: HTTP {response.status_code}")
-                if attempt < CONFIG['retry_count'] - 1:
-                    time.sleep(CONFIG['retry_delay'])
-                    continue
-                return None, None
+            data = response.json() if response.status_code == 200 else None
+            result['data'] = data
+            result['icon'], result['outcome'] = classify_api_response(response.status_code, data, verbose)
+            if result['outcome'] != 'http_error':
+                return result
                 
         except requests.exceptions.Timeout:
+            result['latency'] = time.monotonic() - start
+            METRICS.observe('smart_parse_request_seconds', result['latency'], status='timeout', attempt=attempt + 1)
             if verbose:
                 safe_print(f"  API 请求超时")
-            if attempt < CONFIG['retry_count'] - 1:
-                time.sleep(CONFIG['retry_delay'])
-                continue
-            return None, None
+            result['outcome'] = 'timeout'
         except Exception as e:
+            result['latency'] = time.monotonic() - start
+            METRICS.observe('smart_parse_request_seconds', result['latency'], status='error', attempt=attempt + 1)
             if verbose:
                 safe_print(f"  API 请求异常: {e}")
-            if attempt < CONFIG['retry_count'] - 1:
-                time.sleep(CONFIG['retry_delay'])
-                continue
-            return None, None
+            result['outcome'] = 'error'
     
-    return None, None
+    return result
+
+
+def probe_batch_support(base_url, session=None):
+    """GET 批量接口探测后台是否支持批量协议，返回单批 URL 上限（0 表示不支持，回退到逐个请求）"""
+    http = session or requests
+    try:
+        response = http.get(f"{base_url}{CONFIG['batch_path']}", timeout=5)
+        if response.status_code != 200:
+            return 0
+        info = response.json()
+    except (requests.exceptions.RequestException, ValueError):
+        return 0
+    if not isinstance(info, dict) or not info.get('batch'):
+        return 0
+    return int(info.get('max_urls') or 0)
+
+
+def fetch_batch(urls, base_url, on_result, verbose=False, session=None):
+    """POST 一批 URL 到批量接口，逐行读取 NDJSON 流，每条结果到达即调用 on_result(url, result)
+
+    每行为 {"url": ..., "status": HTTP 状态码, "icon": ...}，顺序按后台完成先后。
+    result 与 fetch_target 的返回值格式相同（latency 为后台报告的单条耗时）。
+    返回 {'status', 'delivered', 'elapsed'}：status 为 ok / unsupported（404/405，后台不再支持批量）/ failed；
+    delivered 为已收到最终结果的 URL 集合，其余 URL（包括单条返回 5xx 的）由调用方回退到逐个请求（带重试）。
+    """
+    http = session or requests
+    expected = set(urls)
+    outcome = {'status': 'failed', 'delivered': set(), 'elapsed': 0.0}
+    start = time.monotonic()
+    try:
+        with http.post(f"{base_url}{CONFIG['batch_path']}", json={'urls': list(urls)},
+                       stream=True, timeout=CONFIG['timeout']) as response:
+            if response.status_code in (404, 405):
+                outcome['status'] = 'unsupported'
+                return outcome
+            if response.status_code != 200:
+                if verbose:
+                    safe_print(f"  批量接口返回错误: HTTP {response.status_code}")
+                return outcome
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                METRICS.inc('bytes_read_total', len(line) + 1, stage='api')
+                try:
+                    item = json.loads(line)
+                    url = item['url']
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if url not in expected or url in outcome['delivered']:
+                    continue
+                status_code = item.get('status', 200)
+                icon, result_outcome = classify_api_response(status_code, item, verbose)
+                latency = float(item.get('elapsed') or 0.0)
+                METRICS.observe('smart_parse_request_seconds', latency, status=status_code, attempt='batch')
+                if result_outcome == 'http_error':
+                    # 单条 5xx 不算最终结果，留给调用方按逐个请求重试
+                    continue
+                outcome['delivered'].add(url)
+                on_result(url, {'icon': icon, 'data': item, 'outcome': result_outcome,
+                                'latency': latency, 'attempts': 1})
+            outcome['status'] = 'ok'
+    except requests.exceptions.RequestException as e:
+        if verbose:
+            safe_print(f"  批量请求异常: {e}")
+    finally:
+        outcome['elapsed'] = time.monotonic() - start
+        METRICS.observe('smart_parse_batch_seconds', outcome['elapsed'], status=outcome['status'])
+    return outcome
 
 
-def process_single_resource(resource, base_url, verbose=False):
+def call_smart_parse_api(url, base_url, verbose=False, session=None):
+    """调用后台 API 获取图标，返回 (图标, API 数据)"""
+    result = fetch_target(url, base_url, verbose, session)
+    return result['icon'], result['data']
+
+
+def process_single_resource(resource, base_url, verbose=False, session=None):
     """处理单个资源（用于并行调用）"""
     if has_local_icon(resource):
         return None, None, 'skipped'
@@ -129,7 +500,7 @@ def process_single_resource(resource, base_url, verbose=False):
     if not url:
         return name, None, 'no_url'
 
-    icon, api_data = call_smart_parse_api(url, base_url, verbose)
+    icon, api_data = call_smart_parse_api(url, base_url, verbose, session)
 
     if icon:
         return name, icon, 'success'
@@ -137,36 +508,55 @@ def process_single_resource(resource, base_url, verbose=False):
         return name, None, 'failed'
 
 
-def process_file(file_path, base_url, workers=5, dry_run=False, verbose=False):
-    """处理单个 JSON 文件"""
+def tally_result(stats, name, icon, status):
+    """累计单个资源的处理结果并输出"""
+    if status == 'success':
+        stats['success'] += 1
+        safe_print(f"    ✓ {name}: {icon}")
+    elif status == 'failed':
+        stats['failed'] += 1
+        safe_print(f"    ✗ {name}: 获取失败")
+    elif status == 'no_url':
+        stats['skipped'] += 1
+        safe_print(f"    - {name}: 无URL")
+    elif status == 'cached_failure':
+        stats['failed'] += 1
+        safe_print(f"    ✗ {name}: 近期获取失败（缓存），跳过")
+    elif status == 'circuit_open':
+        stats['failed'] += 1
+        safe_print(f"    ✗ {name}: 上游主机已熔断，跳过")
+    elif status == 'backend_down':
+        stats['failed'] += 1
+        safe_print(f"    ✗ {name}: 后台故障，未请求")
+
+
+def save_group_file(file_path, data):
+    """原子写回分组 JSON 文件：先写同目录临时文件，再 os.replace 替换，中途崩溃不会留下截断的 JSON"""
+    file_path = Path(file_path)
+    tmp_path = file_path.with_name(f'.{file_path.name}.tmp')
+    with file_lock:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write('\n')  # 与仓库中的分组文件（和 icon_pipeline.ContentModel.save）一致，以换行结尾
+            f.flush()
+            os.fsync(f.fileno())
+            METRICS.inc('bytes_written_total', f.tell(), stage='groups')
+        os.replace(tmp_path, file_path)
+    safe_print(f"  已保存更改: {file_path}")
+
+
+def process_file(file_path, base_url, workers=5, dry_run=False, verbose=False, session=None):
+    """处理单个 JSON 文件（逐文件模式）"""
     safe_print(f"\n处理文件: {file_path}")
 
     with open(file_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
 
-    # 收集所有需要处理的资源
-    resources_to_process = []
-
-    # 收集直属资源
-    if 'resources' in data:
-        for resource in data['resources']:
-            if not has_local_icon(resource):
-                resources_to_process.append(resource)
-
-    # 收集分类中的资源
-    if 'categories' in data:
-        for category in data['categories']:
-            if 'resources' in category:
-                for resource in category['resources']:
-                    if not has_local_icon(resource):
-                        resources_to_process.append(resource)
-
-            if 'tabs' in category:
-                for tab in category['tabs']:
-                    if 'list' in tab:
-                        for resource in tab['list']:
-                            if not has_local_icon(resource):
-                                resources_to_process.append(resource)
+    # 收集所有需要处理的资源（resources / categories[].resources / categories[].tabs[].list）
+    resources_to_process = [
+        resource for _, resource in iter_resources(data)
+        if not has_local_icon(resource)
+    ]
 
     if not resources_to_process:
         safe_print(f"  没有需要处理的资源")
@@ -185,7 +575,7 @@ def process_file(file_path, base_url, workers=5, dry_run=False, verbose=False):
 
     with ThreadPoolExecutor(max_workers=workers) as executor:
         future_to_idx = {
-            executor.submit(process_single_resource, resource, base_url, verbose): idx
+            executor.submit(process_single_resource, resource, base_url, verbose, session): idx
             for idx, resource in enumerate(resources_to_process)
         }
 
@@ -193,16 +583,9 @@ def process_file(file_path, base_url, workers=5, dry_run=False, verbose=False):
             idx = future_to_idx[future]
             try:
                 name, icon, status = future.result()
+                tally_result(stats, name, icon, status)
                 if status == 'success':
-                    stats['success'] += 1
                     results[idx] = icon
-                    safe_print(f"    ✓ {name}: {icon}")
-                elif status == 'failed':
-                    stats['failed'] += 1
-                    safe_print(f"    ✗ {name}: 获取失败")
-                elif status == 'no_url':
-                    stats['skipped'] += 1
-                    safe_print(f"    - {name}: 无URL")
             except Exception as e:
                 stats['failed'] += 1
                 safe_print(f"    ✗ 处理异常: {e}")
@@ -216,14 +599,411 @@ def process_file(file_path, base_url, workers=5, dry_run=False, verbose=False):
 
     # 保存文件
     if modified:
-        with file_lock:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        safe_print(f"  已保存更改: {file_path}")
+        save_group_file(file_path, data)
 
     return stats
 
 
+def process_all_files(json_files, base_url, workers=5, dry_run=False, verbose=False, session=None, cache=None,
+                      limiter=None, breaker=None, journal=None, resume=False, flush_interval=30, batch=None,
+                      resolver=None, only=None, ingest=None, documents=None, save=None, outcomes=None):
+    """全局队列模式：所有文件的缺失资源进入同一个线程池
+
+    - 传入 cache 时，有效期内的成功结果直接复用，后台确定答复没有图标的目标直接跳过，不再调用 API
+      （5xx、超时、连接失败不缓存）
+    - 传入 limiter 时按 AIMD 动态调整并发（否则固定为 workers），传入 breaker 时按上游主机熔断
+    - 5xx 和连接失败可能是后台本身的故障：连续出现时先不计入上游主机，直到其他目标得到确定答复（后台正常）；
+      连续 backend_failure_threshold 个且涉及多个主机（或连接失败）时重新检查后台，停止分发剩余目标
+    - 传入 journal 时每个 API 结果到达即写入检查点；resume=True 时先重放检查点，已完成的资源不再请求
+    - 传入 resolver（icon_resolver.LocalResolver）时，能在本地复用已有图标的目标不调用 API
+    - 传入 batch（AdaptiveBatchSize）时先通过批量接口按批提交，结果流式到达即分发；
+      批量失败或后台不再支持时，剩余目标回退到逐个请求
+    - 传入 ingest（dedupe_icons_final.IngestDeduper）时，新写入的图标与已有图标重复则改用已有图标并删除新文件
+    - 传入 only（{(文件, JSON 路径)}）时只处理其中的资源（--watch 模式只处理新增的资源）
+    - 传入 outcomes（字典）时记录每个资源的结果：(文件, JSON 路径) -> tally_result 的状态
+      （--watch 模式只把成功和确定失败的资源移出待获取列表）
+    - 某个文件的资源全部完成时立即写回，另外每 flush_interval 秒把已有结果的文件原子写回一次
+    - 传入 documents（文件 -> 已解析的数据）时直接修改其中的数据，不再读取文件；
+      传入 save（save(文件, 数据)）时用它代替 save_group_file 写回（icon_pipeline.py 只标记、最后统一写回）；
+      此时结果尚未落盘，检查点不在这里清空，由调用方写回之后清空
+    """
+    save = save or save_group_file
+    limiter = limiter or AdaptiveLimiter(workers)
+    breaker = breaker or CircuitBreaker(threshold=0)
+    stats = {'total': 0, 'success': 0, 'failed': 0, 'skipped': 0}
+    pending = {}
+    tasks = []
+
+    for file_path in json_files:
+        if documents is not None:
+            data = documents[file_path]
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                METRICS.inc('bytes_read_total', f.tell(), stage='groups')
+        resources = [(path, resource) for path, resource in iter_resources(data)
+                     if not has_local_icon(resource) and (only is None or (file_path, path) in only)]
+        if not resources:
+            continue
+        safe_print(f"  {file_path.name}: {len(resources)} 个需要处理的资源")
+        pending[file_path] = {'data': data, 'remaining': len(resources), 'dirty': False}
+        tasks.extend((file_path, path, resource) for path, resource in resources)
+
+    stats['total'] = len(tasks)
+    if dry_run:
+        for file_path, _, resource in tasks:
+            safe_print(f"  发现缺失本地图标的资源: {resource.get('name')} ({resource.get('url')})")
+        return stats
+
+    def flush(file_path):
+        state = pending[file_path]
+        if state['dirty']:
+            save(file_path, state['data'])
+            state['dirty'] = False
+
+    def finish(file_path):
+        state = pending[file_path]
+        state['remaining'] -= 1
+        if state['remaining'] == 0:
+            flush(file_path)
+
+    def apply(file_path, path, resource, icon, status):
+        name = resource.get('name', 'Unknown')
+        if outcomes is not None:
+            outcomes[(file_path, path)] = 'success' if icon else status
+        if icon:
+            tally_result(stats, name, icon, 'success')
+            resource['icon'] = icon
+            pending[file_path]['dirty'] = True
+        else:
+            tally_result(stats, name, None, status)
+        finish(file_path)
+
+    journaled = journal.load() if journal is not None and resume else {}
+    stats['resumed'] = 0
+
+    # single-flight 映射：规范化 URL -> 等待同一结果的所有资源，每个目标只请求一次
+    inflight = {}
+    for file_path, path, resource in tasks:
+        url = resource.get('url') or resource.get('official_site')
+        if not url:
+            apply(file_path, path, resource, None, 'no_url')
+            continue
+        key = normalize_url(url)
+        done = journaled.get((str(file_path), path))
+        if done and done['url'] == key:
+            stats['resumed'] += 1
+            apply(file_path, path, resource, done['icon'], 'failed')
+            continue
+        inflight.setdefault(key, []).append((file_path, path, resource))
+
+    stats['coalesced'] = sum(len(waiters) - 1 for waiters in inflight.values())
+
+    def deliver(waiters, icon, status):
+        for file_path, path, resource in waiters:
+            apply(file_path, path, resource, icon, status)
+
+    negative = []
+    if cache is not None:
+        stats['cache_hits'] = 0
+        stats['cache_negative'] = 0
+        for key in list(inflight):
+            cached = cache.get(key)
+            if cached is None:
+                continue
+            status, icon = cached
+            if status == 'ok':
+                if not local_icon_exists(icon):
+                    continue
+                stats['cache_hits'] += 1
+                deliver(inflight.pop(key), icon, 'success')
+            else:
+                negative.append(key)
+
+    # 本地快速路径：按 URL / GitHub 仓库 / Google Play 应用 / 域名复用已有图标，不调用 API
+    # （在缓存的成功结果之后、近期失败跳过之前，近期失败的目标也可能在本地命中）
+    if resolver is not None:
+        stats['local_candidates'] = len(inflight)
+        stats['local_hits'] = 0
+        for key in list(inflight):
+            hit = resolver.resolve(key)
+            if hit is None:
+                continue
+            icon, rule = hit
+            stats['local_hits'] += 1
+            stats[f'local_{rule}'] = stats.get(f'local_{rule}', 0) + 1
+            METRICS.inc('local_resolved_total', rule=rule)
+            deliver(inflight.pop(key), icon, 'success')
+
+    for key in negative:
+        if key in inflight:
+            stats['cache_negative'] += 1
+            deliver(inflight.pop(key), None, 'cached_failure')
+
+    if stats['resumed']:
+        safe_print(f"\n从检查点恢复: {stats['resumed']} 个资源已完成，跳过")
+    safe_print(f"\n全局队列: {len(inflight)} 个目标 URL（{len(tasks)} 个资源），"
+               f"并发 {limiter.concurrency}（{limiter.minimum}-{limiter.maximum}）")
+
+    queue = deque(inflight)
+    queued_at = time.monotonic()
+    running = {}
+    stats['circuit_open'] = 0
+    last_flush = time.monotonic()
+    # 连续的 5xx / 连接失败：(上游主机, outcome)，后台给出确定答复后才计入熔断
+    backend_streak = []
+    backend_down = False
+
+    def record_host(key, outcome):
+        """按结果更新上游主机熔断状态
+
+        只有超时、5xx 和请求异常算作主机失败；ok / not_found / not_local 是后台的确定答复，算作成功
+        （github.com 等共享主机上连续几个站点没有图标不应熔断）。
+        5xx 和请求异常可能是后台故障，暂存在 backend_streak 中，后台给出确定答复后才计入各自的主机。
+        """
+        nonlocal backend_down
+        host = url_domain(key)
+        if outcome == 'timeout':
+            breaker.record(host, False)
+            return
+        if outcome not in ('http_error', 'error'):
+            for failed_host, _ in backend_streak:
+                breaker.record(failed_host, False)
+            backend_streak.clear()
+            breaker.record(host, True)
+            return
+        backend_streak.append((host, outcome))
+        threshold = CONFIG['backend_failure_threshold']
+        if not threshold or len(backend_streak) < threshold:
+            return
+        hosts = {failed_host for failed_host, _ in backend_streak}
+        if len(hosts) == 1 and all(failed == 'http_error' for _, failed in backend_streak):
+            # 只有一个上游主机返回 5xx，与后台无关
+            for failed_host, _ in backend_streak:
+                breaker.record(failed_host, False)
+            backend_streak.clear()
+            return
+        backend_down = True
+        reason = '后台可访问但持续返回错误' if check_server_status(base_url) else '后台无法访问'
+        safe_print(f"    ⚠ 连续 {len(backend_streak)} 个目标请求失败（{reason}），停止分发剩余目标，不计入上游主机熔断")
+
+    def handle(key, result, adapt=True):
+        """分发一个目标的结果（只在主线程中调用，无需对 JSON 数据加锁）"""
+        icon = result['icon']
+        outcome = result['outcome']
+        if ingest is not None and icon:
+            # 先换成规范图标再写缓存，之后命中缓存的资源不会指向已删除的文件
+            icon = ingest.canonicalize(icon)
+            if icon is None:
+                # 后台返回的图标文件已不存在：按获取失败处理，不写入 JSON，也不缓存
+                outcome = 'missing_file'
+        METRICS.inc('targets_total', outcome=outcome)
+        if adapt:
+            limiter.record(result['outcome'], result['latency'])
+        record_host(key, result['outcome'])
+        if cache is not None:
+            cache.put(key, icon, outcome)
+        waiters = inflight.pop(key)
+        if journal is not None:
+            for file_path, path, _ in waiters:
+                journal.record(file_path, path, key, icon)
+        deliver(waiters, icon, 'failed')
+
+    def periodic_flush():
+        # 定期把已有结果的文件写回，长时间运行中断时损失有限
+        nonlocal last_flush
+        if time.monotonic() - last_flush >= flush_interval:
+            if journal is not None:
+                journal.sync()
+            for file_path in pending:
+                flush(file_path)
+            last_flush = time.monotonic()
+
+    def take_allowed():
+        """从队列取下一个目标；熔断中的主机直接判定失败，返回 None"""
+        key = queue.popleft()
+        if not breaker.allow(url_domain(key)):
+            stats['circuit_open'] += 1
+            deliver(inflight.pop(key), None, 'circuit_open')
+            return None
+        METRICS.observe('queue_wait_seconds', time.monotonic() - queued_at)
+        return key
+
+    if journal is not None:
+        journal.open(resume)
+    try:
+        if batch is not None and queue:
+            # 批量模式：结果由工作线程逐条放入 results，主线程按到达顺序分发；
+            # 批量请求失败时未收到结果的 URL 回退到下面的逐个请求（带重试）
+            stats['batches'] = 0
+            results = SimpleQueue()
+            fallback = []
+            batches = {}
+            batch_enabled = True
+            next_batch_id = 0
+
+            def run_batch(batch_id, keys):
+                outcome = fetch_batch(keys, base_url, lambda key, result: results.put(('result', key, result)),
+                                      verbose, session)
+                results.put(('done', batch_id, outcome))
+
+            with ThreadPoolExecutor(max_workers=CONFIG['batch_concurrency']) as executor:
+                while (queue and batch_enabled and not backend_down) or batches:
+                    while queue and batch_enabled and not backend_down and len(batches) < CONFIG['batch_concurrency']:
+                        keys = []
+                        while queue and len(keys) < batch.size:
+                            key = take_allowed()
+                            if key is not None:
+                                keys.append(key)
+                        if keys:
+                            batches[next_batch_id] = keys
+                            executor.submit(run_batch, next_batch_id, keys)
+                            next_batch_id += 1
+                            stats['batches'] += 1
+                            METRICS.inc('batch_urls_total', len(keys))
+                    if not batches:
+                        continue
+
+                    try:
+                        kind, key, payload = results.get(timeout=flush_interval)
+                    except Empty:
+                        kind = None
+                    if kind == 'result':
+                        handle(key, payload, adapt=False)
+                    elif kind == 'done':
+                        keys = batches.pop(key)
+                        batch.record(len(payload['delivered']), payload['elapsed'], payload['status'] == 'ok')
+                        if payload['status'] == 'unsupported':
+                            batch_enabled = False
+                            safe_print("  ⚠ 后台不再支持批量接口，剩余目标改为逐个请求")
+                        elif payload['status'] != 'ok':
+                            safe_print(f"  ⚠ 批量请求失败，{len(keys) - len(payload['delivered'])} 个目标改为逐个请求")
+                        elif verbose and len(payload['delivered']) < len(keys):
+                            safe_print(f"  {len(keys) - len(payload['delivered'])} 个目标返回 5xx，改为逐个请求重试")
+                        fallback.extend(k for k in keys if k not in payload['delivered'])
+                    periodic_flush()
+
+            stats['batch_fallback'] = len(fallback) + len(queue)
+            stats['final_batch_size'] = batch.size
+            queue.extendleft(reversed(fallback))
+
+        with ThreadPoolExecutor(max_workers=limiter.maximum) as executor:
+            while (queue and not backend_down) or running:
+                # 按当前并发上限补充任务
+                while queue and not backend_down and len(running) < limiter.concurrency:
+                    key = take_allowed()
+                    if key is not None:
+                        running[executor.submit(fetch_target, key, base_url, verbose, session)] = key
+                if not running:
+                    continue
+
+                done, _ = wait(running, timeout=flush_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'icon': None, 'outcome': 'error', 'latency': 0.0}
+                        safe_print(f"    ✗ 处理异常: {e}")
+                    handle(key, result)
+                periodic_flush()
+
+        stats['backend_down'] = len(queue)
+        while queue:
+            deliver(inflight.pop(queue.popleft()), None, 'backend_down')
+    finally:
+        # 无论正常结束还是中断，都把已拿到的结果写回
+        for file_path in pending:
+            flush(file_path)
+        if journal is not None:
+            journal.close()
+        if ingest is not None:
+            ingest.save()
+
+    if journal is not None and documents is None:
+        journal.clear()
+    if ingest is not None:
+        stats['ingest_checked'] = ingest.stats['checked']
+        stats['ingest_deduped'] = ingest.stats['deduped_bytes'] + ingest.stats['deduped_perceptual']
+        stats['ingest_perceptual'] = ingest.stats['deduped_perceptual']
+        stats['ingest_perceptual_candidates'] = ingest.stats['perceptual_candidates']
+        stats['ingest_bytes_saved'] = ingest.stats['bytes_saved']
+    stats['circuit_trips'] = breaker.trips
+    stats['final_concurrency'] = limiter.concurrency
+    return stats
+
+
+def create_ingest_deduper(args, nav_index):
+    """按参数创建获取时去重器；预览模式或 --no-ingest-dedupe 时返回 None"""
+    if args.dry_run or args.no_ingest_dedupe:
+        return None
+    from dedupe_icons_final import IngestDeduper
+    return IngestDeduper(nav_index.references, perceptual=args.perceptual or args.perceptual_apply,
+                         apply_perceptual=args.perceptual_apply)
+
+
+def create_batch(args, session):
+    """后台支持批量接口时按参数创建 AdaptiveBatchSize，否则返回 None（预览模式和 --no-batch 不探测）"""
+    if args.dry_run or args.no_batch:
+        return None
+    max_urls = probe_batch_support(args.base_url, session)
+    if not max_urls:
+        print("【逐个请求】后台未声明批量接口")
+        return None
+    batch = AdaptiveBatchSize(args.batch_size, maximum=min(args.max_batch_size, max_urls),
+                              target=CONFIG['batch_target_seconds'])
+    print(f"【批量模式】后台支持批量接口，初始批量 {batch.size}，上限 {batch.maximum}")
+    return batch
+
+
+def fetch_all(args, nav_index, json_files, session, batch=None, documents=None, save=None):
+    """全局队列模式：按参数创建缓存、检查点、并发控制、熔断、本地解析和获取时去重，执行 process_all_files
+
+    run 与 icon_pipeline.py 共用；documents / save 原样传给 process_all_files。
+    """
+    max_workers = args.workers if args.fixed_workers else max(args.workers, args.max_workers)
+    journal = FetchJournal(CONFIG['journal_path'])
+    if journal.path.exists() and not args.resume and not args.dry_run:
+        print(f"⚠ 发现上次中断留下的检查点 {journal.path}，本次将重新开始（使用 --resume 可继续）")
+    cache = None
+    if not args.dry_run:
+        max_age = args.max_age * 3600 if args.max_age is not None else None
+        cache = FetchCache(
+            CONFIG['cache_path'],
+            success_ttl=max_age if max_age is not None else CONFIG['cache_ttl_success'],
+            failure_ttl=max_age if max_age is not None else CONFIG['cache_ttl_failure'],
+            refresh=args.refresh,
+        )
+    try:
+        return process_all_files(
+            json_files,
+            base_url=args.base_url,
+            workers=args.workers,
+            dry_run=args.dry_run,
+            verbose=args.verbose,
+            session=session,
+            cache=cache,
+            limiter=AdaptiveLimiter(
+                args.workers,
+                minimum=args.workers if args.fixed_workers else args.min_workers,
+                maximum=max_workers,
+                target_latency=None if args.fixed_workers else args.target_latency,
+            ),
+            breaker=CircuitBreaker(args.breaker_threshold, args.breaker_cooldown),
+            journal=None if args.dry_run else journal,
+            resume=args.resume,
+            flush_interval=args.flush_interval,
+            batch=batch,
+            resolver=None if args.no_local else LocalResolver(nav_index, use_generic=args.generic_fallback),
+            ingest=create_ingest_deduper(args, nav_index),
+            documents=documents,
+            save=save,
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+
+
 def check_server_status(base_url):
     """检查服务器是否运行"""
     try:
@@ -233,14 +1013,45 @@ def check_server_status(base_url):
         return False
 
 
-def main():
-    parser = argparse.ArgumentParser(description='批量获取资源图标（调用后台API版本）')
-    parser.add_argument('--workers', '-w', type=int, default=5, help='并行工作线程数（默认 5）')
-    parser.add_argument('--dry-run', action='store_true', help='只检查不修改')
-    parser.add_argument('--verbose', '-v', action='store_true', help='显示详细输出')
-    parser.add_argument('--base-url', type=str, default='http://localhost:4321', help='网站后台API地址（默认 http://localhost:4321）')
-    args = parser.parse_args()
+def print_stats(stats, dry_run=False):
+    """输出获取统计（run 与 icon_pipeline.py 共用）"""
+    print(f"总资源数: {stats['total']}")
+    if not dry_run:
+        print(f"成功获取: {stats['success']}")
+        print(f"获取失败: {stats['failed']}")
+        print(f"跳过: {stats['skipped']}")
+        if 'coalesced' in stats:
+            print(f"合并重复 URL，节省 API 调用: {stats['coalesced']}")
+        if 'circuit_open' in stats:
+            print(f"熔断: {stats['circuit_trips']} 个主机，跳过 {stats['circuit_open']} 个目标")
+            print(f"结束时并发: {stats['final_concurrency']}")
+        if stats.get('backend_down'):
+            print(f"后台故障: 停止分发，{stats['backend_down']} 个目标未请求")
+        if 'local_hits' in stats:
+            candidates = stats['local_candidates']
+            rules = ', '.join(f"{key[6:]} {value}" for key, value in stats.items()
+                              if key.startswith('local_') and key not in ('local_hits', 'local_candidates'))
+            rate = f"{stats['local_hits'] / candidates:.0%}" if candidates else '-'
+            print(f"本地解析: {stats['local_hits']}/{candidates} 个目标（命中率 {rate}）"
+                  + (f"，{rules}" if rules else ''))
+        if 'ingest_checked' in stats:
+            print(f"获取时去重: 新图标 {stats['ingest_checked']} 个，与已有图标重复已删除 "
+                  f"{stats['ingest_deduped']} 个（感知近似 {stats['ingest_perceptual']}），"
+                  f"节省 {stats['ingest_bytes_saved'] / 1024:.1f} KB")
+            if stats.get('ingest_perceptual_candidates'):
+                print(f"  感知近似（只报告，未删除）: {stats['ingest_perceptual_candidates']} 个，"
+                      f"确认后使用 --perceptual-apply 合并")
+        if 'batches' in stats:
+            print(f"批量请求: {stats['batches']} 次，回退逐个请求 {stats['batch_fallback']} 个目标，"
+                  f"结束时批量大小 {stats['final_batch_size']}")
+        if stats.get('resumed'):
+            print(f"从检查点恢复: {stats['resumed']}")
+        if 'cache_hits' in stats:
+            print(f"缓存命中: 成功 {stats['cache_hits']}, 近期失败跳过 {stats['cache_negative']}")
+
 
+def run(args):
+    """执行获取流程（main 解析参数后调用）"""
     # 检查目录
     groups_dir = Path('src/content/nav-groups')
     if not groups_dir.exists():
@@ -254,6 +1065,7 @@ def main():
     print()
     
     # 检查服务器状态
+    METRICS.phase('check_server')
     print("检查服务器状态...")
     if not check_server_status(args.base_url):
         print(f"❌ 错误: 无法连接到服务器 {args.base_url}")
@@ -271,36 +1083,106 @@ def main():
     
     if args.dry_run:
         print("【干运行模式】只检查不修改")
-    print(f"【并行模式】使用 {args.workers} 个工作线程")
+    if args.per_file:
+        print(f"【并行模式】使用 {args.workers} 个工作线程（逐文件）")
+    elif args.fixed_workers:
+        print(f"【并行模式】使用 {args.workers} 个工作线程（全局队列）")
+    else:
+        print(f"【并行模式】自适应并发，初始 {args.workers}，范围 {args.min_workers}-{max(args.workers, args.max_workers)}（全局队列）")
+    if args.perceptual:
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            print("感知去重需要安装依赖: pip install Pillow")
+            sys.exit(1)
     if args.verbose:
         print("【详细模式】显示详细输出")
     print()
 
     total_stats = {'total': 0, 'success': 0, 'failed': 0, 'skipped': 0}
 
-    # 遍历所有 JSON 文件
-    json_files = sorted(groups_dir.glob('*.json'))
+    # 通过共享内容索引只处理含缺失图标资源的分组文件
+    METRICS.phase('index')
+    nav_index = load_nav_index(groups_dir)
+    json_files = sorted(nav_index.missing_icon_resources())
+    print(f"分组文件: {len(nav_index.groups)}，其中 {len(json_files)} 个含缺失本地图标的资源")
 
-    for json_file in json_files:
-        stats = process_file(
-            json_file,
-            base_url=args.base_url,
-            workers=args.workers,
-            dry_run=args.dry_run,
-            verbose=args.verbose
-        )
-        for key in total_stats:
-            total_stats[key] += stats.get(key, 0)
+    max_workers = args.workers if args.fixed_workers else max(args.workers, args.max_workers)
+    session = create_session(max_workers)
+
+    batch = None if args.per_file else create_batch(args, session)
+
+    METRICS.phase('fetch')
+
+    if args.per_file:
+        for json_file in json_files:
+            stats = process_file(
+                json_file,
+                base_url=args.base_url,
+                workers=args.workers,
+                dry_run=args.dry_run,
+                verbose=args.verbose,
+                session=session,
+            )
+            for key in total_stats:
+                total_stats[key] += stats.get(key, 0)
+    else:
+        total_stats = fetch_all(args, nav_index, json_files, session, batch)
 
     # 打印统计
+    METRICS.phase('summary')
+    for key, value in total_stats.items():
+        if key not in ('final_concurrency', 'final_batch_size'):
+            METRICS.inc('resources_total', value, result=key)
     print("\n" + "=" * 60)
     print("处理完成!")
     print("=" * 60)
-    print(f"总资源数: {total_stats['total']}")
-    if not args.dry_run:
-        print(f"成功获取: {total_stats['success']}")
-        print(f"获取失败: {total_stats['failed']}")
-        print(f"跳过: {total_stats['skipped']}")
+    print_stats(total_stats, args.dry_run)
+
+def add_fetch_arguments(parser):
+    """添加全局队列模式的获取参数（main 与 icon_pipeline.py 共用）"""
+    parser.add_argument('--workers', '-w', type=int, default=5, help='初始并发数 / 逐文件模式线程数（默认 5）')
+    parser.add_argument('--base-url', type=str, default='http://localhost:4321', help='网站后台API地址（默认 http://localhost:4321）')
+    parser.add_argument('--max-workers', type=int, default=16, help='自适应并发上限（默认 16）')
+    parser.add_argument('--min-workers', type=int, default=1, help='自适应并发下限（默认 1）')
+    parser.add_argument('--fixed-workers', action='store_true', help='关闭自适应并发，固定使用 --workers 个线程')
+    parser.add_argument('--target-latency', type=float, default=10.0, help='单次请求延迟超过该值（秒）视为过载（默认 10）')
+    parser.add_argument('--breaker-threshold', type=int, default=5, help='同一上游主机连续失败多少次后熔断（0 为关闭，默认 5）')
+    parser.add_argument('--breaker-cooldown', type=float, default=60, help='熔断冷却时间（秒，默认 60）')
+    parser.add_argument('--resume', action='store_true', help='重放上次中断留下的检查点，已完成的资源不再请求')
+    parser.add_argument('--flush-interval', type=float, default=30, help='定期写回 JSON 文件的间隔（秒，默认 30）')
+    parser.add_argument('--refresh', action='store_true', help='忽略已缓存的获取结果，全部重新请求')
+    parser.add_argument('--max-age', type=float, default=None, help='缓存有效期（小时），同时覆盖成功和失败结果的默认有效期')
+    parser.add_argument('--no-batch', action='store_true', help='不使用批量接口，逐个 URL 请求')
+    parser.add_argument('--no-local', action='store_true', help='关闭本地快速路径，所有目标都调用 API')
+    parser.add_argument('--generic-fallback', action='store_true', help='GitHub / Google Play 本地未命中时使用通用图标')
+    parser.add_argument('--batch-size', type=int, default=20, help='初始批量大小（默认 20，按响应耗时自动调整）')
+    parser.add_argument('--max-batch-size', type=int, default=200, help='批量大小上限（默认 200）')
+    parser.add_argument('--no-ingest-dedupe', action='store_true', help='关闭获取时去重')
+    parser.add_argument('--perceptual', action='store_true', help='获取时去重同时比较感知哈希（需要 Pillow，默认只报告）')
+    parser.add_argument('--perceptual-apply', action='store_true', help='按感知近似结果删除新图标，隐含 --perceptual')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量获取资源图标（调用后台API版本）')
+    parser.add_argument('--dry-run', action='store_true', help='只检查不修改')
+    parser.add_argument('--verbose', '-v', action='store_true', help='显示详细输出')
+    parser.add_argument('--per-file', action='store_true', help='逐文件处理（旧模式，每个文件单独的线程池）')
+    add_fetch_arguments(parser)
+    parser.add_argument('--watch', action='store_true', help='常驻监听内容和图标目录的变化')
+    parser.add_argument('--debounce', type=float, default=1.0, help='监听模式的去抖时间（秒，默认 1）')
+    parser.add_argument('--poll', action='store_true', help='监听模式定时比较目录签名，不使用 inotify')
+    parser.add_argument('--no-dedupe', action='store_true', help='监听模式下不对新图标去重')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    args.perceptual = args.perceptual or args.perceptual_apply
+
+    with instrumented(args, 'fetch'):
+        if args.watch:
+            from icon_watch import run_watch
+            run_watch(args, dedupe=not args.no_dedupe)
+        else:
+            run(args)
 
 
 if __name__ == "__main__":
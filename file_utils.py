@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+图标工具共用的文件辅助函数
+===========================
+
+功能：
+1. file_signature：文件签名 (大小, 修改时间 ns, inode)，增量状态（哈希索引、内容索引、图集、搜索分片）
+   都用它判断文件是否变化；原子替换会换 inode，修改时间被还原的替换也能发现
+2. write_atomic：先写同目录临时文件再 os.replace，中途崩溃不会留下半个文件
+3. format_bytes：字节数格式化为 B / KB / MB
+"""
+
+import os
+from pathlib import Path
+
+
+def file_signature(stat_result) -> list:
+    """文件签名：(大小, 修改时间 ns, inode)，任一变化即视为文件已改变"""
+    return [stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino]
+
+
+def write_atomic(path, data):
+    """原子写入 bytes 或 str（str 按 UTF-8 编码），目录不存在时先创建"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def format_bytes(size: int) -> str:
+    if size >= 1024 * 1024:
+        return f'{size / 1024 / 1024:.1f} MB'
+    return f'{size / 1024:.1f} KB' if size >= 1024 else f'{size} B'
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+未引用图标回收程序（标记-清除）
+===========================
+
+功能：
+1. 标记：一次流式扫描 src/ 和 public/ 下的所有文本源文件（内容集合 JSON、MDX、.astro、
+   组件脚本、样式、HTML 等），收集 /images/logos/ 引用；通用图标始终视为被引用
+2. 清除：public/images/logos/ 中未被引用的文件（任意扩展名）移入隔离区
+   .icon_cache/icon_quarantine/，记录移入时间
+3. 隔离超过宽限期（默认 7 天）的文件在之后的运行中才真正删除，并统计回收字节数
+4. 隔离区中重新被引用的文件自动移回图标目录
+
+扫描只读取每个文件一次、对内容做一次正则匹配，耗时与仓库大小线性相关。
+通过字符串拼接动态生成的图标路径无法被标记，这类图标需加入 GC_ROOTS。
+
+使用方法：
+    python gc_icons.py [--dry-run] [--grace-days N] [--restore [NAME ...]]
+
+参数：
+    --dry-run           只预览，不移动或删除文件
+    --grace-days N      隔离宽限期（天，默认 7；0 表示本次移入隔离区后下次运行即删除）
+    --restore [NAME]    把指定（不指定则全部）隔离文件移回图标目录
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import argparse
+from pathlib import Path
+
+from dedupe_icons_final import ICONS_DIR, CACHE_DIR, GENERIC_ICONS
+from file_utils import format_bytes
+from tool_metrics import METRICS
+
+# ==================== 配置 ====================
+MARK_ROOTS = [Path('./src'), Path('./public')]
+MARK_EXTENSIONS = {
+    '.json', '.md', '.mdx', '.astro', '.ts', '.tsx', '.js', '.jsx', '.mjs',
+    '.css', '.html', '.yaml', '.yml',
+}
+QUARANTINE_DIR = CACHE_DIR / 'icon_quarantine'
+QUARANTINE_MANIFEST = QUARANTINE_DIR / 'manifest.json'
+GRACE_DAYS = 7
+
+# 始终保留的图标（通用图标等），不依赖内容引用
+GC_ROOTS = {config['filename'] for config in GENERIC_ICONS.values()}
+
+ICON_REF_BYTES_PATTERN = re.compile(rb'/images/logos/([^"\'\s?#)<>\\`]+)')
+
+# ==================== 标记 ====================
+
+def iter_source_files():
+    """遍历需要扫描的文本源文件（跳过图标目录本身）"""
+    icons_dir = ICONS_DIR.resolve()
+    for root in MARK_ROOTS:
+        for dirpath, dirnames, filenames in os.walk(root):
+            current = Path(dirpath)
+            dirnames[:] = sorted(d for d in dirnames if (current / d).resolve() != icons_dir)
+            for filename in sorted(filenames):
+                path = current / filename
+                if path.suffix.lower() in MARK_EXTENSIONS:
+                    yield path
+
+def mark_references() -> dict:
+    """扫描源文件，返回 图标文件名 -> 引用它的源文件列表"""
+    marked = {}
+    for path in iter_source_files():
+        try:
+            data = path.read_bytes()
+        except OSError as e:
+            print(f"  警告: 读取 {path} 失败: {e}")
+            continue
+        METRICS.inc('bytes_read_total', len(data), stage='mark')
+        for match in ICON_REF_BYTES_PATTERN.finditer(data):
+            try:
+                name = match.group(1).decode('utf-8')
+            except UnicodeDecodeError:
+                continue
+            sources = marked.setdefault(name, [])
+            if not sources or sources[-1] != str(path):
+                sources.append(str(path))
+    return marked
+
+# ==================== 隔离区 ====================
+
+def load_quarantine() -> dict:
+    """隔离清单：文件名 -> {'quarantined_at': 时间戳, 'bytes': 大小}"""
+    if not QUARANTINE_MANIFEST.exists():
+        return {}
+    try:
+        with open(QUARANTINE_MANIFEST, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_quarantine(manifest: dict):
+    QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = QUARANTINE_MANIFEST.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, QUARANTINE_MANIFEST)
+
+def restore_files(names, manifest: dict, dry_run: bool) -> list:
+    """把隔离文件移回图标目录；图标目录中已有同名文件时保留隔离副本"""
+    restored = []
+    for name in sorted(names):
+        source = QUARANTINE_DIR / name
+        if not source.exists() or (ICONS_DIR / name).exists():
+            continue
+        if not dry_run:
+            shutil.move(str(source), str(ICONS_DIR / name))
+            manifest.pop(name, None)
+        restored.append(name)
+    return restored
+
+def expire_files(manifest: dict, grace_seconds: float, now: float, dry_run: bool, exclude=()) -> tuple:
+    """删除超过宽限期的隔离文件，返回 (文件名列表, 回收字节数)
+
+    exclude 是本次已恢复的文件：预览模式下它们仍在清单中，不能同时列为过期
+    """
+    expired = []
+    reclaimed = 0
+    for name, entry in sorted(manifest.items()):
+        if name in exclude or now - entry['quarantined_at'] < grace_seconds:
+            continue
+        path = QUARANTINE_DIR / name
+        if path.exists():
+            reclaimed += path.stat().st_size
+            if not dry_run:
+                path.unlink()
+        expired.append(name)
+    if not dry_run:
+        for name in expired:
+            del manifest[name]
+    return expired, reclaimed
+
+def quarantine_files(names, manifest: dict, now: float, dry_run: bool) -> int:
+    """把未引用文件移入隔离区，返回移动的字节数"""
+    moved = 0
+    for name in sorted(names):
+        path = ICONS_DIR / name
+        size = path.stat().st_size
+        moved += size
+        if not dry_run:
+            QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+            os.replace(path, QUARANTINE_DIR / name)
+            manifest[name] = {'quarantined_at': now, 'bytes': size}
+    return moved
+
+def collect_garbage(manifest: dict, grace_days: float, now: float, dry_run: bool) -> dict:
+    """标记 → 恢复重新被引用的隔离文件 → 删除过期隔离文件 → 隔离未引用文件（main 与 icon_pipeline.py 共用）"""
+    # 1. 标记
+    print("[1] 标记引用...")
+    start = time.perf_counter()
+    marked = mark_references()
+    live = set(marked) | GC_ROOTS
+    print(f"  被引用的图标: {len(marked)}（耗时 {time.perf_counter() - start:.2f}s）")
+
+    # 2. 恢复重新被引用的隔离文件
+    print("\n[2] 检查隔离区...")
+    restored = restore_files(set(manifest) & live, manifest, dry_run)
+    print(f"  隔离中: {len(manifest)}, {'将恢复' if dry_run else '已恢复'}（重新被引用）: {len(restored)}")
+    for name in restored:
+        print(f"    - {name}")
+
+    # 3. 删除过期的隔离文件
+    print("\n[3] 删除超过宽限期的隔离文件...")
+    expired, reclaimed = expire_files(manifest, grace_days * 86400, now, dry_run, exclude=set(restored))
+    print(f"  {'将删除' if dry_run else '已删除'}: {len(expired)}, 回收 {format_bytes(reclaimed)}")
+    for name in expired[:15]:
+        print(f"    - {name}")
+    if len(expired) > 15:
+        print(f"    - ... 还有 {len(expired) - 15} 个")
+
+    # 4. 清除：未引用文件移入隔离区
+    print("\n[4] 隔离未引用文件...")
+    icons = sorted(f.name for f in ICONS_DIR.iterdir() if f.is_file())
+    orphans = [name for name in icons if name not in live]
+    moved = quarantine_files(orphans, manifest, now, dry_run)
+    print(f"  图标文件: {len(icons)}, 未引用: {len(orphans)} ({format_bytes(moved)})")
+    for name in orphans[:15]:
+        print(f"    - {name}")
+    if len(orphans) > 15:
+        print(f"    - ... 还有 {len(orphans) - 15} 个")
+
+    if not dry_run:
+        save_quarantine(manifest)
+
+    return {
+        'marked': len(marked),
+        'restored': restored,
+        'expired': expired,
+        'reclaimed_bytes': reclaimed,
+        'quarantined': orphans,
+        'quarantined_bytes': moved,
+    }
+
+# ==================== 主逻辑 ====================
+
+def main():
+    parser = argparse.ArgumentParser(description='未引用图标回收程序')
+    parser.add_argument('--dry-run', action='store_true', help='只预览，不移动或删除文件')
+    parser.add_argument('--grace-days', type=float, default=GRACE_DAYS, help=f'隔离宽限期（天，默认 {GRACE_DAYS}）')
+    parser.add_argument('--restore', nargs='*', default=None, metavar='NAME', help='把隔离文件移回图标目录（不指定则全部）')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("未引用图标回收程序")
+    print("=" * 70)
+    print(f"模式: {'预览模式' if args.dry_run else '执行模式'}")
+    print(f"宽限期: {args.grace_days:g} 天")
+    print()
+
+    manifest = load_quarantine()
+    now = time.time()
+
+    if args.restore is not None:
+        names = args.restore or list(manifest)
+        restored = restore_files(names, manifest, args.dry_run)
+        if not args.dry_run:
+            save_quarantine(manifest)
+        print(f"{'将恢复' if args.dry_run else '已恢复'} {len(restored)} 个文件")
+        for name in restored:
+            print(f"  - {name}")
+        return
+
+    result = collect_garbage(manifest, args.grace_days, now, args.dry_run)
+
+    # 5. 总结
+    print("\n" + "=" * 70)
+    print("总结")
+    print("=" * 70)
+    print(f"  {'将隔离' if args.dry_run else '已隔离'}: {len(result['quarantined'])} 个文件 "
+          f"({format_bytes(result['quarantined_bytes'])})")
+    print(f"  {'将回收' if args.dry_run else '已回收'}: {len(result['expired'])} 个文件 "
+          f"({format_bytes(result['reclaimed_bytes'])})")
+    print(f"  隔离区剩余: {len(manifest)} 个文件（{QUARANTINE_DIR}）")
+
+if __name__ == '__main__':
+    main()
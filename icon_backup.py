@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+图标与分组数据的内容寻址备份
+===========================
+
+功能：
+1. 快照只记录 路径 -> 内容哈希（与去重脚本相同的 blake2b），文件内容按哈希存入 objects/，
+   相同内容只存一份，每次备份只增加发生变化的字节
+2. 大小和修改时间与上一个快照一致的文件直接沿用上次的哈希，不重新读取
+3. restore 按快照恢复 logos 和 nav-groups 目录（恢复前自动为当前状态再做一个快照）
+4. prune 只保留最近 N 个快照，并删除不再被任何快照引用的对象
+
+存储结构（icon_cleanup_backup/）：
+    objects/<哈希前 2 位>/<哈希>     文件内容（只读）
+    snapshots/<时间戳>.json          {'trees': {'logos': {文件名: [哈希, 大小, 修改时间]}, ...}}
+
+旧版本 copytree 生成的 <时间戳>/ 目录不受影响，可手动删除。
+
+使用方法：
+    python icon_backup.py snapshot              # 创建快照
+    python icon_backup.py list                  # 列出快照
+    python icon_backup.py restore <时间戳>      # 恢复到指定快照
+    python icon_backup.py prune --keep N        # 只保留最近 N 个快照
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+from dedupe_icons_final import ICONS_DIR, CONTENT_DIR, BACKUP_DIR, calculate_file_hash
+from file_utils import format_bytes
+
+# ==================== 配置 ====================
+OBJECTS_DIR = BACKUP_DIR / 'objects'
+SNAPSHOTS_DIR = BACKUP_DIR / 'snapshots'
+
+# 快照中的目录树：名称 -> 目录
+BACKUP_TREES = {
+    'logos': ICONS_DIR,
+    'nav-groups': CONTENT_DIR,
+}
+
+# ==================== 工具函数 ====================
+
+def object_path(digest: str) -> Path:
+    return OBJECTS_DIR / digest[:2] / digest
+
+def snapshot_path(timestamp: str) -> Path:
+    return SNAPSHOTS_DIR / f'{timestamp}.json'
+
+def list_snapshots() -> list:
+    """按时间顺序返回快照时间戳"""
+    if not SNAPSHOTS_DIR.exists():
+        return []
+    return sorted(p.stem for p in SNAPSHOTS_DIR.glob('*.json'))
+
+def load_snapshot(timestamp: str) -> dict:
+    with open(snapshot_path(timestamp), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def store_object(source: Path, digest: str) -> int:
+    """把文件内容存入对象库，返回新写入的字节数（已存在时为 0）"""
+    target = object_path(digest)
+    if target.exists():
+        return 0
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f'.{digest}.tmp')
+    shutil.copyfile(source, tmp_path)
+    os.chmod(tmp_path, 0o444)
+    os.replace(tmp_path, target)
+    return target.stat().st_size
+
+# ==================== 快照 ====================
+
+def create_snapshot(label: str = '') -> tuple:
+    """为所有目录树创建快照，返回 (时间戳, 新写入字节数)
+
+    大小和修改时间与上一个快照相同的文件沿用其哈希，只有变化的文件会被读取。
+    """
+    snapshots = list_snapshots()
+    previous = load_snapshot(snapshots[-1])['trees'] if snapshots else {}
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    trees = {}
+    written = 0
+    for tree, directory in BACKUP_TREES.items():
+        known = previous.get(tree, {})
+        files = {}
+        with os.scandir(directory) as it:
+            dir_entries = sorted((e for e in it if e.is_file() and not e.name.startswith('.')), key=lambda e: e.name)
+        for dir_entry in dir_entries:
+            stat_result = dir_entry.stat()
+            cached = known.get(dir_entry.name)
+            if cached and cached[1:] == [stat_result.st_size, stat_result.st_mtime_ns] \
+                    and object_path(cached[0]).exists():
+                digest = cached[0]
+            else:
+                digest = calculate_file_hash(Path(dir_entry.path))
+                written += store_object(Path(dir_entry.path), digest)
+            files[dir_entry.name] = [digest, stat_result.st_size, stat_result.st_mtime_ns]
+        trees[tree] = files
+
+    SNAPSHOTS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = snapshot_path(timestamp).with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'timestamp': timestamp, 'label': label, 'trees': trees}, f, ensure_ascii=False)
+    os.replace(tmp_path, snapshot_path(timestamp))
+    return timestamp, written
+
+def restore_snapshot(timestamp: str, dry_run: bool = False) -> dict:
+    """把目录树恢复到快照状态：写回内容不同的文件，删除快照中不存在的文件"""
+    trees = load_snapshot(timestamp)['trees']
+    stats = {'restored': 0, 'removed': 0, 'unchanged': 0}
+    for tree, files in trees.items():
+        directory = BACKUP_TREES[tree]
+        current = set()
+        if directory.exists():
+            with os.scandir(directory) as it:
+                current = {e.name for e in it if e.is_file() and not e.name.startswith('.')}
+
+        for name, (digest, size, mtime_ns) in files.items():
+            target = directory / name
+            if target.exists():
+                stat_result = target.stat()
+                if stat_result.st_size == size and (
+                        stat_result.st_mtime_ns == mtime_ns or calculate_file_hash(target) == digest):
+                    stats['unchanged'] += 1
+                    continue
+            if not dry_run:
+                directory.mkdir(parents=True, exist_ok=True)
+                tmp_path = directory / f'.{name}.restore.tmp'
+                shutil.copyfile(object_path(digest), tmp_path)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, target)
+                os.utime(target, ns=(mtime_ns, mtime_ns))
+            stats['restored'] += 1
+
+        for name in sorted(current - set(files)):
+            if not dry_run:
+                (directory / name).unlink()
+            stats['removed'] += 1
+    return stats
+
+def prune_snapshots(keep: int, dry_run: bool = False) -> tuple:
+    """只保留最近 keep 个快照，删除无引用的对象，返回 (删除的快照, 删除的对象数, 回收字节数)"""
+    snapshots = list_snapshots()
+    removed = snapshots[:-keep] if keep > 0 else snapshots
+    kept = snapshots[len(removed):]
+
+    live = set()
+    for timestamp in kept:
+        for files in load_snapshot(timestamp)['trees'].values():
+            live.update(entry[0] for entry in files.values())
+
+    # 先删除清单再回收对象：中途中断时只会留下无引用的对象，不会留下指向缺失对象的清单
+    if not dry_run:
+        for timestamp in removed:
+            snapshot_path(timestamp).unlink()
+
+    objects = 0
+    reclaimed = 0
+    if OBJECTS_DIR.exists():
+        for path in OBJECTS_DIR.glob('*/*'):
+            if path.name.startswith('.') or path.name in live:
+                continue
+            objects += 1
+            reclaimed += path.stat().st_size
+            if not dry_run:
+                os.chmod(path, 0o644)
+                path.unlink()
+    return removed, objects, reclaimed
+
+def store_size() -> int:
+    if not OBJECTS_DIR.exists():
+        return 0
+    return sum(p.stat().st_size for p in OBJECTS_DIR.glob('*/*'))
+
+# ==================== 主逻辑 ====================
+
+def main():
+    parser = argparse.ArgumentParser(description='图标与分组数据的内容寻址备份')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='创建快照')
+    snapshot_parser.add_argument('--label', type=str, default='', help='快照说明')
+
+    subparsers.add_parser('list', help='列出快照')
+
+    restore_parser = subparsers.add_parser('restore', help='恢复到指定快照')
+    restore_parser.add_argument('timestamp', help='快照时间戳（list 输出的第一列，可只写前缀）')
+    restore_parser.add_argument('--dry-run', action='store_true', help='只预览，不写文件')
+
+    prune_parser = subparsers.add_parser('prune', help='只保留最近 N 个快照')
+    prune_parser.add_argument('--keep', type=int, required=True, help='保留的快照数')
+    prune_parser.add_argument('--dry-run', action='store_true', help='只预览，不删除')
+
+    args = parser.parse_args()
+
+    if args.command == 'snapshot':
+        timestamp, written = create_snapshot(args.label)
+        print(f"快照已创建: {timestamp}（新写入 {format_bytes(written)}）")
+
+    elif args.command == 'list':
+        snapshots = list_snapshots()
+        if not snapshots:
+            print("没有快照")
+            return
+        for timestamp in snapshots:
+            snapshot = load_snapshot(timestamp)
+            counts = ', '.join(f"{tree} {len(files)}" for tree, files in snapshot['trees'].items())
+            label = f"  {snapshot['label']}" if snapshot.get('label') else ''
+            print(f"{timestamp}  {counts}{label}")
+        print(f"\n快照 {len(snapshots)} 个，对象库 {format_bytes(store_size())}")
+
+    elif args.command == 'restore':
+        matches = [t for t in list_snapshots() if t.startswith(args.timestamp)]
+        if len(matches) != 1:
+            print(f"找不到唯一匹配的快照: {args.timestamp}（匹配 {len(matches)} 个）")
+            sys.exit(1)
+        if not args.dry_run:
+            safety, _ = create_snapshot(f'恢复 {matches[0]} 前自动备份')
+            print(f"当前状态已备份: {safety}")
+        stats = restore_snapshot(matches[0], args.dry_run)
+        print(f"{'将恢复' if args.dry_run else '已恢复'}到 {matches[0]}: "
+              f"写回 {stats['restored']}, 删除 {stats['removed']}, 未变化 {stats['unchanged']}")
+
+    elif args.command == 'prune':
+        removed, objects, reclaimed = prune_snapshots(args.keep, args.dry_run)
+        print(f"{'将删除' if args.dry_run else '已删除'} {len(removed)} 个快照, "
+              f"{objects} 个对象, 回收 {format_bytes(reclaimed)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+图标维护流水线（获取 → 压缩 → 去重 → 回收，单进程共享状态）
+===========================
+
+功能：
+1. 启动时读取一次所有 nav-groups JSON，建立内存中的内容模型；各阶段直接修改内存数据，
+   内容索引（图标引用、缺失图标的资源）由内存数据生成，不再重复解析文件
+2. 按顺序执行选中的阶段（--stages，默认全部）：
+   - fetch     为缺失本地图标的资源调用后台 API 获取图标（与 fetch_icons_via_api.py 相同的全局队列、
+               缓存、本地快速路径、批量接口和获取时去重），结果只写入内存
+   - optimize  缩小超尺寸图标、把 PNG/ICO/JPG/GIF/SVG 转换为 WebP/AVIF（与 optimize_icons.py 相同），
+               新文件立即写入，引用改写在内存中完成
+   - dedupe    按大小 → 头尾部分哈希 → 完整哈希查找重复图标（持久化哈希索引，只计算新文件），
+               引用改写在内存中完成；在压缩之后执行，转换得到的 WebP 也参与去重
+   - gc        在写回之后执行：未引用图标移入隔离区，超过宽限期的隔离文件删除（与 gc_icons.py 相同）
+3. 写回：所有改写过的分组 JSON 各原子写回一次（保留文件末尾换行），之后才删除被替换的图标文件，
+   中途失败不会留下指向已删除文件的引用；有图标要删除时先做快照备份（icon_backup.py）
+4. 合并报告 icon_pipeline_report.json（代替 icon_dedupe_report.json / icon_optimize_report.json），
+   包含每个阶段的结果和耗时
+
+获取阶段的结果在写回前只在内存中：每个结果到达即记录在检查点（.icon_cache/fetch_journal.jsonl），
+写回之后才清空；中断后使用 --resume 重新运行即可恢复未写回的结果。
+后台服务器未启动时跳过获取阶段，其余阶段照常执行。
+
+使用方法：
+    python icon_pipeline.py [--stages fetch,optimize,dedupe,gc] [--dry-run] [--verbose] [--jobs N]
+                            [--incremental] [--rebuild-index] [--perceptual [--perceptual-threshold N] [--perceptual-apply]]
+                            [--max-size PX] [--format webp|avif] [--lossy [--quality Q]] [--recompress]
+                            [--grace-days N] [获取参数，见 fetch_icons_via_api.py]
+                            [--metrics-json PATH] [--metrics-prom PATH] [--metrics-openmetrics PATH] [--profile [N]]
+
+参数：
+    --stages LIST       逗号分隔的阶段，按 fetch → optimize → dedupe → gc 的顺序执行（默认全部）
+    --dry-run           只预览：各阶段照常计算，不写 JSON、不写入 / 删除 / 移动图标文件
+    --jobs N            去重哈希和压缩编码的并行任务数（默认 1）
+    --incremental       去重阶段只重新评估相对上次执行发生变化的图标（同 dedupe_icons_final.py）
+    --rebuild-index     忽略已有哈希索引，重新计算所有图标哈希
+    --perceptual        获取时去重和去重阶段同时比较 dHash 感知哈希（需要 Pillow），默认只报告近似结果
+    --perceptual-apply  确认后按感知近似结果合并（改写引用、删除文件），隐含 --perceptual
+    --grace-days N      回收阶段的隔离宽限期（天，默认 7）
+    压缩参数 --max-size / --format / --lossy / --quality / --recompress 同 optimize_icons.py
+
+依赖：
+    pip install requests（获取阶段）、pip install Pillow（压缩阶段和 --perceptual）
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+
+import fetch_icons_via_api as fetcher
+from dedupe_icons_final import (
+    ICONS_DIR, PERCEPTUAL_THRESHOLD, analyze_icons, backup_files, delete_files, find_perceptual_groups,
+    load_dedupe_manifest, map_ordered, merge_duplicate_groups, plan_replacements, save_dedupe_manifest,
+)
+from file_utils import format_bytes, write_atomic
+from gc_icons import GRACE_DAYS, collect_garbage, load_quarantine
+from nav_index import CONTENT_DIR, ICON_PREFIX, NavIndex, group_records, icon_filename
+from tool_metrics import METRICS, add_metrics_arguments, instrumented
+
+# ==================== 配置 ====================
+STAGES = ('fetch', 'optimize', 'dedupe', 'gc')
+REPORT_PATH = Path('./icon_pipeline_report.json')
+
+# 与 optimize_icons.py 的默认值一致（该模块导入时要求 Pillow，只在压缩阶段导入）
+MAX_ICON_SIZE = 128
+DEFAULT_QUALITY = 90
+
+# ==================== 内容模型 ====================
+
+def rewrite_icon_value(value: str, replacements: dict):
+    """按替换表改写一个图标路径（保留 ?t= 等参数），不需要改写时返回 None"""
+    if not value.startswith(ICON_PREFIX):
+        return None
+    name = icon_filename(value)
+    new_name = replacements.get(name)
+    if new_name is None or new_name == name:
+        return None
+    return f'{ICON_PREFIX}{new_name}{value[len(ICON_PREFIX) + len(name):]}'
+
+def _rewrite_node(node, replacements: dict) -> int:
+    """递归改写 JSON 数据中所有以 /images/logos/ 开头的字符串，返回改写次数"""
+    count = 0
+    items = node.items() if isinstance(node, dict) else enumerate(node)
+    for key, value in list(items):
+        if isinstance(value, str):
+            new_value = rewrite_icon_value(value, replacements)
+            if new_value is not None:
+                node[key] = new_value
+                count += 1
+        elif isinstance(value, (dict, list)):
+            count += _rewrite_node(value, replacements)
+    return count
+
+class ContentModel:
+    """nav-groups 内容的内存模型：每个分组文件只读取一次，各阶段修改内存数据，最后每个变化的文件只写回一次"""
+
+    def __init__(self, content_dir: Path = CONTENT_DIR):
+        self.content_dir = Path(content_dir)
+        self.documents = {}         # 分组文件 -> 已解析的数据
+        self.trailing_newline = {}  # 写回时保持原文件末尾换行，避免无关的 diff
+        self.dirty = set()
+        self.icons_to_delete = []   # 被替换的图标，JSON 写回之后才删除
+        self.journal = None         # 获取阶段的检查点，分组文件写回之后才清空
+
+        for json_file in sorted(self.content_dir.glob('*.json')):
+            text = json_file.read_text(encoding='utf-8')
+            METRICS.inc('bytes_read_total', len(text.encode('utf-8')), stage='groups')
+            self.documents[json_file] = json.loads(text)
+            self.trailing_newline[json_file] = text.endswith('\n')
+
+    def nav_index(self) -> NavIndex:
+        """由内存数据建立内容索引（包含尚未写回的修改）"""
+        groups = {}
+        pages = {}
+        for json_file, data in self.documents.items():
+            pages[json_file.name], groups[json_file.name] = group_records(data)
+        return NavIndex(groups, self.content_dir, pages)
+
+    def mark_dirty(self, json_file, data=None):
+        """标记分组文件需要写回（签名与 save_group_file 相同，可直接作为 process_all_files 的 save）"""
+        self.dirty.add(Path(json_file))
+
+    def rewrite_icons(self, replacements: dict) -> tuple:
+        """在内存中改写图标引用，返回 (涉及的文件数, 替换次数)"""
+        updated_files = 0
+        total_replacements = 0
+        if not any(old != new for old, new in replacements.items()):
+            return updated_files, total_replacements
+        for json_file, data in self.documents.items():
+            count = _rewrite_node(data, replacements)
+            if count:
+                self.dirty.add(json_file)
+                updated_files += 1
+                total_replacements += count
+        return updated_files, total_replacements
+
+    def save(self) -> list:
+        """把标记过的分组文件各原子写回一次，返回写回的文件列表"""
+        written = []
+        for json_file in sorted(self.dirty):
+            text = json.dumps(self.documents[json_file], ensure_ascii=False, indent=2)
+            if self.trailing_newline[json_file]:
+                text += '\n'
+            tmp_path = json_file.with_name(f'.{json_file.name}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, json_file)
+            METRICS.inc('bytes_written_total', len(text.encode('utf-8')), stage='groups')
+            written.append(json_file)
+        self.dirty.clear()
+        if self.journal is not None:
+            self.journal.clear()
+            self.journal = None
+        return written
+
+# ==================== 阶段 ====================
+
+def stage_fetch(model: ContentModel, args) -> dict:
+    """获取缺失的图标，结果写入内存数据"""
+    print("  检查服务器状态...")
+    if not fetcher.check_server_status(args.base_url):
+        print(f"  ❌ 无法连接到服务器 {args.base_url}，跳过获取阶段（请先运行 npm run dev 或 npm run preview）")
+        return {'error': 'server_unreachable'}
+
+    nav_index = model.nav_index()
+    json_files = sorted(nav_index.missing_icon_resources())
+    print(f"  分组文件: {len(nav_index.groups)}，其中 {len(json_files)} 个含缺失本地图标的资源")
+    if not json_files:
+        return {'total': 0}
+
+    max_workers = args.workers if args.fixed_workers else max(args.workers, args.max_workers)
+    session = fetcher.create_session(max_workers)
+    batch = fetcher.create_batch(args, session)
+    stats = fetcher.fetch_all(args, nav_index, json_files, session, batch,
+                              documents=model.documents, save=model.mark_dirty)
+    if not args.dry_run:
+        model.journal = fetcher.FetchJournal(fetcher.CONFIG['journal_path'])
+    for key, value in stats.items():
+        if key not in ('final_concurrency', 'final_batch_size'):
+            METRICS.inc('resources_total', value, result=key)
+    print()
+    fetcher.print_stats(stats, args.dry_run)
+    return stats
+
+def stage_dedupe(model: ContentModel, args) -> tuple:
+    """查找重复图标，引用改写在内存中完成；返回 (报告, 本次扫描的图标签名, 上次的清单)"""
+    manifest = None
+    if args.incremental:
+        manifest = load_dedupe_manifest()
+        if manifest is None:
+            print("  没有上次执行的清单，执行完整扫描")
+
+    hash_to_files, file_to_hash, signatures = analyze_icons(args.rebuild_index, args.jobs, manifest)
+    print(f"  总图标数: {len(file_to_hash)}")
+    print(f"  唯一哈希数: {len(hash_to_files)}")
+
+    duplicates = {h: f for h, f in hash_to_files.items() if len(f) > 1}
+    perceptual = {}
+    if args.perceptual:
+        perceptual = find_perceptual_groups(hash_to_files, args.perceptual_threshold, args.jobs)
+    print(f"  重复组数: {len(duplicates)}" + (
+        f", 感知近似组数: {len(perceptual)}{'' if args.perceptual_apply else '（只报告）'}" if args.perceptual else ''))
+
+    references = model.nav_index().references
+    groups = merge_duplicate_groups(duplicates, perceptual if args.perceptual_apply else {}, file_to_hash)
+    replacements, files_to_delete = plan_replacements(groups, references)
+    for old, new in list(replacements.items())[:15]:
+        print(f"    {old} -> {new} (引用: {len(references.get(old, []))})")
+    if len(replacements) > 15:
+        print(f"    ... 还有 {len(replacements) - 15} 个")
+    updated_files, total_replacements = model.rewrite_icons(replacements)
+    model.icons_to_delete.extend(files_to_delete)
+    print(f"  内存中改写: {updated_files} 个文件, {total_replacements} 处引用；待删除重复文件 {len(files_to_delete)} 个")
+
+    report = {
+        'summary': {
+            'original_count': len(file_to_hash),
+            'unique_hashes': len(hash_to_files),
+            'duplicate_groups': len(duplicates),
+            'perceptual_groups': len(perceptual),
+            'duplicates_deleted': len(files_to_delete),
+            'final_count': len(file_to_hash) - len(files_to_delete),
+        },
+        'duplicates': duplicates,
+        'perceptual_duplicates': perceptual,
+        'perceptual_applied': args.perceptual_apply,
+        'replacements': replacements,
+        'files_deleted': files_to_delete,
+    }
+    return report, signatures, manifest
+
+def stage_optimize(model: ContentModel, args) -> dict:
+    """压缩 / 转换图标：新文件立即写入（只新增或原子替换），引用改写在内存中完成"""
+    from optimize_icons import (
+        OUTPUT_FORMATS, RASTER_EXTENSIONS, SVG_EXTENSION, converted_name, optimize_icon,
+        referenced_outside_groups,
+    )
+
+    files = sorted(
+        f for f in ICONS_DIR.iterdir() if f.is_file() and f.suffix.lower() in RASTER_EXTENSIONS | {SVG_EXTENSION}
+    )
+    bytes_before = sum(f.stat().st_size for f in files)
+    print(f"  图标数: {len(files)}, 总大小: {format_bytes(bytes_before)}")
+
+    results = map_ordered(
+        optimize_icon,
+        [(f, args.max_size, args.format, args.quality, args.lossy, args.recompress) for f in files],
+        args.jobs,
+        use_processes=True,
+    )
+    _, target_ext = OUTPUT_FORMATS[args.format]
+    conversions = {}
+    taken = set()
+    recompressed = []
+    errors = {}
+    bytes_after = 0
+    for result in results:
+        name = result['name']
+        if result['action'] == 'convert':
+            conversions[name] = converted_name(name, target_ext, taken)
+            bytes_after += result['new_size']
+        elif result['action'] == 'recompress':
+            recompressed.append(name)
+            bytes_after += result['new_size']
+        else:
+            bytes_after += result['old_size']
+            if result['reason'].startswith('解码失败'):
+                errors[name] = result['reason']
+
+    if not args.dry_run:
+        for result in results:
+            if result['action'] == 'convert':
+                write_atomic(ICONS_DIR / conversions[result['name']], result['data'])
+            elif result['action'] == 'recompress':
+                write_atomic(ICONS_DIR / result['name'], result['data'])
+    updated_files, total_replacements = model.rewrite_icons(conversions)
+    # nav-groups 之外仍引用的原文件保留，不再被引用后由回收阶段隔离
+    kept = referenced_outside_groups(conversions)
+    model.icons_to_delete.extend(name for name in conversions if name not in kept)
+
+    print(f"  转换格式: {len(conversions)}, 重新压缩: {len(recompressed)}, 解码失败: {len(errors)}")
+    print(f"  内存中改写: {updated_files} 个文件, {total_replacements} 处引用"
+          + (f"；{len(kept)} 个原文件仍被其他源文件引用，保留" if kept else ''))
+    print(f"  {'将节省' if args.dry_run else '已节省'}: {format_bytes(bytes_before - bytes_after)}")
+    return {
+        'summary': {
+            'scanned': len(files),
+            'converted': len(conversions),
+            'recompressed': len(recompressed),
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'bytes_saved': bytes_before - bytes_after,
+        },
+        'conversions': conversions,
+        'recompressed': recompressed,
+        'kept_originals': kept,
+        'errors': errors,
+    }
+
+def write_back(model: ContentModel, dry_run: bool) -> dict:
+    """各阶段结束后统一写回：先备份，再写 JSON（每个文件一次），最后删除被替换的图标"""
+    if dry_run:
+        for json_file in sorted(model.dirty):
+            print(f"  [将写回] {json_file.name}")
+        print(f"  将写回 {len(model.dirty)} 个分组文件，将删除 {len(model.icons_to_delete)} 个图标")
+        return {'files_written': sorted(f.name for f in model.dirty), 'icons_deleted': len(model.icons_to_delete)}
+
+    backup = backup_files('icon_pipeline.py 写回前') if model.icons_to_delete else None
+    written = model.save()
+    for json_file in written:
+        print(f"  [已写回] {json_file.name}")
+    deleted = delete_files(model.icons_to_delete, dry_run=False)
+    print(f"  已写回 {len(written)} 个分组文件，已删除 {deleted} 个图标")
+    return {'files_written': [f.name for f in written], 'icons_deleted': deleted, 'backup': backup}
+
+# ==================== 主逻辑 ====================
+
+@contextmanager
+def timed_stage(timings: dict, name: str):
+    """记录阶段耗时（同时作为指标阶段）"""
+    METRICS.phase(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round(time.perf_counter() - start, 3)
+
+def run(args, stages: list):
+    """按顺序执行选中的阶段，写回并保存合并报告"""
+    print("=" * 70)
+    print("图标维护流水线")
+    print("=" * 70)
+    print(f"模式: {'预览模式' if args.dry_run else '执行模式'}")
+    print(f"阶段: {' → '.join(stages)}")
+    print()
+
+    started = time.perf_counter()
+    timings = {}
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'dry_run': args.dry_run,
+        'stages': stages,
+        'timings': timings,
+    }
+    step = 1
+
+    with timed_stage(timings, 'load'):
+        print(f"[{step}] 读取内容...")
+        model = ContentModel()
+        print(f"  分组文件: {len(model.documents)}")
+
+    dedupe_state = None
+    for stage, title, func in (
+        ('fetch', '获取缺失图标', stage_fetch),
+        ('optimize', '压缩优化图标', stage_optimize),
+        ('dedupe', '查找重复图标', stage_dedupe),
+    ):
+        if stage not in stages:
+            continue
+        step += 1
+        print(f"\n[{step}] {title}（{stage}）...")
+        with timed_stage(timings, stage):
+            result = func(model, args)
+        if stage == 'dedupe':
+            result, *dedupe_state = result
+        report[stage] = result
+
+    step += 1
+    print(f"\n[{step}] 写回...")
+    with timed_stage(timings, 'write'):
+        report['write'] = write_back(model, args.dry_run)
+        if dedupe_state is not None:
+            signatures, manifest = dedupe_state
+            deleted_names = set() if args.dry_run else set(report['dedupe']['files_deleted'])
+            save_dedupe_manifest({
+                name: signature for name, signature in signatures.items() if name not in deleted_names
+            }, manifest, merges_applied=not args.dry_run,
+                perceptual_applied=args.perceptual_apply and not args.dry_run)
+
+    if 'gc' in stages:
+        step += 1
+        print(f"\n[{step}] 回收未引用图标（gc）...")
+        with timed_stage(timings, 'gc'):
+            report['gc'] = collect_garbage(load_quarantine(), args.grace_days, time.time(), args.dry_run)
+
+    METRICS.end_phase()
+    timings['total'] = round(time.perf_counter() - started, 3)
+
+    print("\n" + "=" * 70)
+    print("总结")
+    print("=" * 70)
+    if 'fetch' in report:
+        fetch = report['fetch']
+        print("  获取: " + ('已跳过（服务器未启动）' if 'error' in fetch else
+                         f"缺失 {fetch['total']}, 成功 {fetch.get('success', 0)}, 失败 {fetch.get('failed', 0)}"))
+    if 'optimize' in report:
+        summary = report['optimize']['summary']
+        print(f"  压缩: 转换 {summary['converted']}, 重新压缩 {summary['recompressed']}, "
+              f"{'将节省' if args.dry_run else '已节省'} {format_bytes(summary['bytes_saved'])}")
+    if 'dedupe' in report:
+        summary = report['dedupe']['summary']
+        print(f"  去重: 重复组 {summary['duplicate_groups'] + summary['perceptual_groups']}, "
+              f"{'将删除' if args.dry_run else '已删除'} {summary['duplicates_deleted']}")
+    print(f"  写回: {len(report['write']['files_written'])} 个分组文件")
+    if 'gc' in report:
+        gc = report['gc']
+        print(f"  回收: {'将隔离' if args.dry_run else '已隔离'} {len(gc['quarantined'])}, "
+              f"{'将删除' if args.dry_run else '已删除'}过期 {len(gc['expired'])}")
+    print("  耗时: " + ', '.join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+
+    with open(REPORT_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n报告已保存: {REPORT_PATH}")
+
+def parse_stages(value: str) -> list:
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in STAGES]
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(f"未知阶段: {', '.join(unknown) or '（空）'}，可选: {', '.join(STAGES)}")
+    return [stage for stage in STAGES if stage in names]
+
+def main():
+    parser = argparse.ArgumentParser(description='图标维护流水线（获取 → 压缩 → 去重 → 回收）')
+    parser.add_argument('--stages', type=parse_stages, default=list(STAGES),
+                        help=f"逗号分隔的阶段（默认 {','.join(STAGES)}）")
+    parser.add_argument('--dry-run', action='store_true', help='只预览，不写文件')
+    parser.add_argument('--verbose', '-v', action='store_true', help='显示详细输出')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='去重哈希和压缩编码的并行任务数（默认 1）')
+    parser.add_argument('--incremental', action='store_true', help='去重阶段只重新评估相对上次执行发生变化的图标')
+    parser.add_argument('--rebuild-index', action='store_true', help='忽略已有哈希索引，重新计算所有图标哈希')
+    parser.add_argument('--perceptual-threshold', type=int, default=PERCEPTUAL_THRESHOLD,
+                        help=f'感知哈希汉明距离阈值（默认 {PERCEPTUAL_THRESHOLD}）')
+    parser.add_argument('--max-size', type=int, default=MAX_ICON_SIZE, help=f'图标最长边上限（默认 {MAX_ICON_SIZE}）')
+    parser.add_argument('--format', choices=['avif', 'webp'], default='webp', help='压缩阶段的输出格式（默认 webp）')
+    parser.add_argument('--quality', type=int, default=DEFAULT_QUALITY, help=f'有损候选的编码质量（默认 {DEFAULT_QUALITY}）')
+    parser.add_argument('--lossy', action='store_true', help='压缩阶段同时尝试有损编码（默认只用无损编码）')
+    parser.add_argument('--recompress', action='store_true', help='尺寸未超限的同格式图标也尝试重新编码')
+    parser.add_argument('--grace-days', type=float, default=GRACE_DAYS, help=f'隔离宽限期（天，默认 {GRACE_DAYS}）')
+    fetcher.add_fetch_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    args.perceptual = args.perceptual or args.perceptual_apply
+
+    if not CONTENT_DIR.exists():
+        print(f"错误: 未找到目录 {CONTENT_DIR}")
+        sys.exit(1)
+    if 'optimize' in args.stages or args.perceptual:
+        try:
+            from PIL import features
+        except ImportError:
+            print("压缩阶段和 --perceptual 需要安装依赖: pip install Pillow")
+            sys.exit(1)
+        if 'optimize' in args.stages and args.format == 'avif' and not features.check('avif'):
+            print("当前 Pillow 不支持 AVIF 编码，请升级 Pillow 或使用 --format webp")
+            sys.exit(1)
+
+    with instrumented(args, 'pipeline'):
+        run(args, args.stages)
+
+if __name__ == '__main__':
+    main()
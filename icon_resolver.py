@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+本地图标解析（fetch_icons_via_api.py 调用 API 前的快速路径）
+===========================
+
+功能：
+按与 /api/smart-parse 相同的规则给 URL 分类，直接复用本地已有的图标，不发网络请求：
+1. 同一规范化 URL 的其他资源已有本地图标
+2. GitHub 仓库：同一 user/repo 的资源已有图标，或存在后台命名的 <user>-<repo>.webp
+3. Google Play 应用：同一 appId 的资源已有图标，或存在 gp-<appId>.webp
+4. 普通网站：同一主机的资源已有图标（后台 domainIconCache 同样按主机复用），或存在 <主机>.webp；
+   否则在同一可注册域名（docs.foo.com 与 foo.com）下只有一个图标，且该图标来自主域名本身
+   或已被至少两个子域名共用时，复用该图标（避免把某个子站的图标套到同域名的其他子站上）
+5. 可选：GitHub / Google Play 未命中时直接使用通用图标（github-default.webp 等）
+
+只有未命中的 URL 才交给 API。图标文件必须仍在 public/images/logos/ 中才会被复用。
+
+使用方法：
+    python icon_resolver.py [--generic] [URL ...]    # 不指定 URL 时统计缺失图标资源的本地命中率
+"""
+
+import os
+import re
+import argparse
+from pathlib import Path
+from collections import Counter, defaultdict
+from urllib.parse import urlparse, parse_qs
+
+from nav_index import ICON_PREFIX, icon_filename, load_nav_index, normalize_url, url_domain
+
+# ==================== 配置 ====================
+ICONS_DIR = Path('./public/images/logos')
+
+# 通用图标（与 dedupe_icons_final.GENERIC_ICONS 一致）：URL 类型 -> 文件名
+GENERIC_ICON_FILES = {
+    'github': 'github-default.webp',
+    'googleplay': 'googleplay-default.webp',
+}
+
+# 两级公共后缀：可注册域名取最后三段
+TWO_LEVEL_SUFFIXES = {
+    'com.cn', 'net.cn', 'org.cn', 'gov.cn', 'edu.cn', 'ac.cn',
+    'com.hk', 'com.tw', 'org.tw', 'com.sg', 'com.my', 'com.au', 'net.au', 'org.au', 'com.br',
+    'co.uk', 'org.uk', 'ac.uk', 'co.jp', 'ne.jp', 'or.jp', 'co.kr', 'or.kr', 'co.in', 'co.nz', 'co.za',
+}
+
+# 多租户托管域名：每个子域名是独立站点，同样取最后三段
+SHARED_HOST_SUFFIXES = {
+    'github.io', 'gitee.io', 'gitlab.io', 'vercel.app', 'netlify.app', 'pages.dev', 'workers.dev',
+    'web.app', 'firebaseapp.com', 'herokuapp.com', 'onrender.com', 'fly.dev', 'surge.sh', 'glitch.me',
+    'blogspot.com', 'wordpress.com', 'notion.site', 'gitbook.io', 'readthedocs.io', 'azurewebsites.net',
+    'streamlit.app', 'substack.com',
+}
+
+GITHUB_REPO_PATTERN = re.compile(r'^/([^/]+)/([^/]+)')
+
+# ==================== 工具函数 ====================
+
+def safe_icon_name(prefix: str) -> str:
+    """与后台 downloadAndOptimizeImage 相同的文件名规则：非字母数字转 -，合并、去首尾，截断 50 字符"""
+    name = re.sub(r'-+', '-', re.sub(r'[^a-zA-Z0-9]', '-', prefix)).strip('-')[:50]
+    return f'{name}.webp'
+
+def registrable_domain(host: str) -> str:
+    """近似的可注册域名（不依赖公共后缀列表）：一般取最后两段，两级后缀和托管域名取最后三段"""
+    labels = host.split('.')
+    if len(labels) > 2 and '.'.join(labels[-2:]) in TWO_LEVEL_SUFFIXES | SHARED_HOST_SUFFIXES:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+def classify_url(url):
+    """按后台的处理分支给 URL 分类，返回 (类型, 键)
+
+    类型为 github（键 user/repo，小写）/ googleplay（键 appId）/ web（键为主机名）；无法解析时返回 (None, None)。
+    """
+    if not url:
+        return None, None
+    try:
+        parsed = urlparse(url if '//' in url else f'https://{url}')
+    except ValueError:
+        return None, None
+    host = (parsed.hostname or '').lower()
+    if not host:
+        return None, None
+    if host == 'github.com':
+        match = GITHUB_REPO_PATTERN.match(parsed.path)
+        if match:
+            return 'github', f'{match.group(1)}/{match.group(2)}'.lower()
+    if host == 'play.google.com' and '/store/apps/details' in parsed.path:
+        app_id = parse_qs(parsed.query).get('id', [''])[0]
+        if app_id:
+            return 'googleplay', app_id
+    return 'web', url_domain(url)
+
+def predicted_filename(url) -> str:
+    """后台处理该 URL 时会保存的图标文件名（网站类型为按主机命名的第三方图标）"""
+    kind, key = classify_url(url)
+    if kind == 'github':
+        match = GITHUB_REPO_PATTERN.match(urlparse(url if '//' in url else f'https://{url}').path)
+        return safe_icon_name(f'{match.group(1)}-{match.group(2)}')
+    if kind == 'googleplay':
+        return safe_icon_name('gp-' + re.sub(r'[^a-zA-Z0-9]', '-', key)[:30])
+    if kind == 'web':
+        return safe_icon_name(key.replace('.', '-'))
+    return None
+
+# ==================== 解析器 ====================
+
+class LocalResolver:
+    """从内容索引和图标目录建立的本地解析表"""
+
+    def __init__(self, nav_index, icons_dir: Path = ICONS_DIR, use_generic: bool = False):
+        self.icons_dir = Path(icons_dir)
+        self.icons = set(os.listdir(self.icons_dir)) if self.icons_dir.exists() else set()
+        self.use_generic = use_generic
+        generic = set(GENERIC_ICON_FILES.values())
+
+        # 键 -> 图标文件名计数（同一键有多个图标时取引用最多的）
+        self.by_url = defaultdict(Counter)
+        self.by_kind = {'github': defaultdict(Counter), 'googleplay': defaultdict(Counter)}
+        self.by_host = defaultdict(Counter)
+        self.by_site = defaultdict(lambda: defaultdict(set))  # 可注册域名 -> 图标文件名 -> 使用它的主机
+
+        for entry in nav_index.resources():
+            filename = icon_filename(entry['full_path'])
+            if not filename or filename not in self.icons or not entry['url']:
+                continue
+            self.by_url[normalize_url(entry['url'])][filename] += 1
+            kind, key = classify_url(entry['url'])
+            if kind in self.by_kind:
+                self.by_kind[kind][key][filename] += 1
+            elif kind == 'web' and key and filename not in generic:
+                self.by_host[key][filename] += 1
+                self.by_site[registrable_domain(key)][filename].add(key)
+
+    @staticmethod
+    def _icon(filename: str) -> str:
+        return f'{ICON_PREFIX}{filename}'
+
+    def resolve(self, url):
+        """返回 (图标路径, 命中规则) 或 None；规则为 url / github / googleplay / host / site / generic"""
+        known = self.by_url.get(normalize_url(url))
+        if known:
+            return self._icon(known.most_common(1)[0][0]), 'url'
+
+        kind, key = classify_url(url)
+        if kind is None:
+            return None
+        predicted = predicted_filename(url)
+
+        if kind in self.by_kind:
+            known = self.by_kind[kind].get(key)
+            if known:
+                return self._icon(known.most_common(1)[0][0]), kind
+            if predicted in self.icons:
+                return self._icon(predicted), kind
+            if self.use_generic and GENERIC_ICON_FILES[kind] in self.icons:
+                return self._icon(GENERIC_ICON_FILES[kind]), 'generic'
+            return None
+
+        if not key:
+            return None
+        known = self.by_host.get(key)
+        if known:
+            return self._icon(known.most_common(1)[0][0]), 'host'
+        if predicted in self.icons:
+            return self._icon(predicted), 'host'
+        site = registrable_domain(key)
+        known = self.by_site.get(site)
+        if known and len(known) == 1:
+            filename, hosts = next(iter(known.items()))
+            if site in hosts or len(hosts) >= 2:
+                return self._icon(filename), 'site'
+        return None
+
+# ==================== 主逻辑 ====================
+
+def main():
+    parser = argparse.ArgumentParser(description='本地图标解析')
+    parser.add_argument('urls', nargs='*', help='要解析的 URL（不指定则统计缺失图标资源）')
+    parser.add_argument('--generic', action='store_true', help='GitHub / Google Play 未命中时使用通用图标')
+    args = parser.parse_args()
+
+    nav_index = load_nav_index()
+    resolver = LocalResolver(nav_index, use_generic=args.generic)
+
+    if args.urls:
+        for url in args.urls:
+            hit = resolver.resolve(url)
+            print(f"{url}\n  -> {f'{hit[0]}（{hit[1]}）' if hit else '未命中，需要调用 API'}")
+        return
+
+    targets = {}
+    for entries in nav_index.missing_icon_resources().values():
+        for entry in entries:
+            if entry['url']:
+                targets.setdefault(normalize_url(entry['url']), entry['url'])
+    rules = Counter()
+    for url in targets.values():
+        hit = resolver.resolve(url)
+        rules[hit[1] if hit else 'miss'] += 1
+    hits = len(targets) - rules.pop('miss', 0)
+    print(f"缺失图标的目标 URL: {len(targets)}")
+    print(f"本地命中: {hits}（{hits / len(targets):.0%}）" if targets else "本地命中: 0")
+    for rule, count in rules.most_common():
+        print(f"  {rule}: {count}")
+
+if __name__ == '__main__':
+    main()
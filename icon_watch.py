@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+图标工具的常驻监听模式（fetch_icons_via_api.py --watch / dedupe_icons_final.py --watch）
+===========================
+
+功能：
+1. 启动时加载一次内容索引、图标哈希索引和获取缓存（连接池、自适应并发、熔断状态），之后常驻内存
+2. 监听 src/content/nav-groups（Keystatic 保存内容时写入）和 public/images/logos：
+   Linux 上用 inotify（通过 ctypes 调用 libc，不需要第三方库），其他平台或 --poll 时定时比较目录签名
+3. 去抖：收到事件后等到 --debounce 秒内没有新事件再处理，一次保存产生的多个事件只处理一次
+4. 分组文件变化：只重新解析变化的文件，找出新增的（或图标被清空的）缺失图标资源，只为它们获取图标，
+   本地快速路径、缓存和批量接口与一次性运行相同
+5. 图标目录变化：只对新增 / 修改 / 删除的图标所在的大小桶计算哈希并去重（更新引用、删除重复文件），
+   不重新扫描整个目录；不支持 --perceptual，近似重复仍需一次性运行
+6. 启动时已缺失图标的资源先获取一次；后台服务器未启动时不退出，待获取资源保留在列表中，
+   服务器恢复后自动补上；超时、熔断等暂时失败的资源也保留，每 30 秒重试
+
+本程序写回的分组文件和新下载的图标同样会触发事件，重新处理时没有新增资源 / 重复组，不会循环。
+
+使用方法：
+    python fetch_icons_via_api.py --watch [--debounce S] [--poll] [--no-dedupe] [其他获取参数]
+    python dedupe_icons_final.py --watch [--debounce S] [--poll] [--jobs N]
+"""
+
+import os
+import sys
+import time
+import errno
+import signal
+import select
+import struct
+import ctypes
+import ctypes.util
+from pathlib import Path
+from collections import defaultdict
+from datetime import datetime
+
+import dedupe_icons_final as dedupe_tool
+from file_utils import file_signature
+from nav_index import CONTENT_DIR, NavIndex, is_local_icon, load_nav_index, normalize_url, parse_group_file
+from tool_metrics import METRICS
+
+# ==================== 配置 ====================
+ICONS_DIR = dedupe_tool.ICONS_DIR
+POLL_INTERVAL = 1.0  # 轮询模式的目录扫描间隔（秒）
+MAX_DEBOUNCE_WAIT = 10.0  # 持续有事件时最多推迟处理的时间（秒）
+SERVER_RETRY_INTERVAL = 30.0  # 服务器不可用时重试待获取资源的间隔（秒）
+# 确定的结果：移出待获取列表；其余失败（超时、熔断、后台故障等）留在列表中稍后重试
+# （后台确定没有图标的目标会写入负缓存，下一次重试时以 cached_failure 结束）
+SETTLED_OUTCOMES = ('success', 'no_url', 'cached_failure')
+
+# inotify 事件（linux/inotify.h）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MODIFY
+EVENT_HEADER = struct.Struct('iIII')
+
+# ==================== 监听 ====================
+
+class InotifyWatcher:
+    """inotify 监听若干目录（不递归），read() 返回变化的文件路径集合"""
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 失败')
+        self.directories = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f'无法监听 {directory}')
+            self.directories[wd] = Path(directory)
+        self.overflowed = False
+
+    def read(self, timeout) -> set:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return set()
+            raise
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出：调用方需要对所有目录做一次完整比较
+                self.overflowed = True
+            elif name and wd in self.directories:
+                changed.add(self.directories[wd] / os.fsdecode(name))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """定时比较目录签名（大小、修改时间、inode）的回退实现"""
+
+    def __init__(self, directories, interval: float = POLL_INTERVAL):
+        self.interval = interval
+        self.snapshots = {Path(directory): self._scan(directory) for directory in directories}
+        self.overflowed = False
+
+    @staticmethod
+    def _scan(directory) -> dict:
+        with os.scandir(directory) as it:
+            return {entry.name: file_signature(entry.stat()) for entry in it if entry.is_file()}
+
+    def read(self, timeout) -> set:
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        changed = set()
+        for directory, previous in self.snapshots.items():
+            current = self._scan(directory)
+            changed.update(directory / name for name in set(previous) | set(current)
+                           if previous.get(name) != current.get(name))
+            self.snapshots[directory] = current
+        return changed
+
+    def close(self):
+        pass
+
+def create_watcher(directories, poll: bool = False):
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directories), 'inotify'
+        except (OSError, AttributeError) as e:
+            print(f"  inotify 不可用（{e}），改为轮询")
+    return PollingWatcher(directories), f'轮询（每 {POLL_INTERVAL:g} 秒）'
+
+def collect_changes(watcher, debounce: float, timeout=None) -> set:
+    """等待第一批事件（最多 timeout 秒），再等到 debounce 秒内没有新事件，返回期间变化的所有路径"""
+    changed = watcher.read(timeout)
+    if not changed and not watcher.overflowed:
+        return set()
+    deadline = time.monotonic() + MAX_DEBOUNCE_WAIT
+    while time.monotonic() < deadline:
+        more = watcher.read(debounce)
+        if not more:
+            break
+        changed |= more
+    # 临时文件（.xxx.tmp 等）不处理，替换完成后会有目标文件本身的事件
+    return {path for path in changed if not path.name.startswith('.') and not path.name.endswith('.tmp')}
+
+# ==================== 常驻状态 ====================
+
+class WatchDaemon:
+    """常驻内存的内容索引、图标哈希索引和获取状态"""
+
+    def __init__(self, args, fetch: bool = True, dedupe: bool = True, dry_run: bool = False):
+        self.args = args
+        self.fetch_enabled = fetch
+        self.dedupe_enabled = dedupe
+        self.dry_run = dry_run
+        self.jobs = getattr(args, 'jobs', 1)
+        self.pending = defaultdict(set)  # 分组文件 -> 待获取图标的资源 JSON 路径
+        self.server_down = False
+        self.last_attempt = 0.0
+
+        # 内容索引：分组文件名 -> 资源记录 / 页面名
+        nav_index = load_nav_index(CONTENT_DIR)
+        self.groups = dict(nav_index.groups)
+        self.pages = dict(nav_index.pages)
+        print(f"  内容索引: {len(self.groups)} 个分组文件, "
+              f"{sum(len(records) for records in self.groups.values())} 个资源")
+
+        # 启动前就缺图标的资源（例如上次运行时服务器不可用）也加入待获取列表
+        if fetch:
+            for path, entries in nav_index.missing_icon_resources().items():
+                self.pending[path] = {entry['json_path'] for entry in entries}
+            print(f"  待获取图标: {sum(len(paths) for paths in self.pending.values())} 个资源")
+
+        # 图标哈希索引：先按一次性运行的方式补齐，之后只在内存中增量更新
+        if dedupe:
+            dedupe_tool.analyze_icons(jobs=self.jobs)
+            self.entries = dedupe_tool.load_hash_index()
+            self.by_size = defaultdict(set)
+            for name, entry in self.entries.items():
+                self.by_size[entry['sig'][0]].add(name)
+            print(f"  图标哈希索引: {len(self.entries)} 个图标")
+
+        if fetch:
+            self._init_fetcher()
+
+    def _init_fetcher(self):
+        import fetch_icons_via_api as fetcher
+        args = self.args
+        self.fetcher = fetcher
+        max_workers = args.workers if args.fixed_workers else max(args.workers, args.max_workers)
+        self.session = fetcher.create_session(max_workers)
+        self.limiter = fetcher.AdaptiveLimiter(
+            args.workers,
+            minimum=args.workers if args.fixed_workers else args.min_workers,
+            maximum=max_workers,
+            target_latency=None if args.fixed_workers else args.target_latency,
+        )
+        self.breaker = fetcher.CircuitBreaker(args.breaker_threshold, args.breaker_cooldown)
+        self.cache = None
+        if not self.dry_run:
+            max_age = args.max_age * 3600 if args.max_age is not None else None
+            self.cache = fetcher.FetchCache(
+                fetcher.CONFIG['cache_path'],
+                success_ttl=max_age if max_age is not None else fetcher.CONFIG['cache_ttl_success'],
+                failure_ttl=max_age if max_age is not None else fetcher.CONFIG['cache_ttl_failure'],
+                refresh=args.refresh,
+            )
+        self.batch = None
+        self.batch_probed = False
+        print(f"  获取缓存: {fetcher.CONFIG['cache_path'] if self.cache else '预览模式不使用'}")
+
+    def nav_index(self) -> NavIndex:
+        return NavIndex(self.groups, CONTENT_DIR, self.pages)
+
+    def close(self):
+        if self.fetch_enabled and self.cache is not None:
+            self.cache.close()
+
+    # -------- 分组文件 --------
+
+    def on_groups_changed(self, names: list):
+        """重新解析变化的分组文件，把新增的缺失图标资源加入待获取列表"""
+        added = 0
+        for name in names:
+            path = CONTENT_DIR / name
+            previous = self.groups.get(name, [])
+            if not path.exists():
+                self.groups.pop(name, None)
+                self.pages.pop(name, None)
+                self.pending.pop(path, None)
+                print(f"  {name}: 已删除")
+                continue
+            try:
+                page, records = parse_group_file(path)
+            except (OSError, ValueError) as e:
+                # 编辑器可能正在写入，等下一次事件
+                print(f"  警告: 读取 {name} 失败: {e}")
+                continue
+            self.groups[name] = records
+            self.pages[name] = page
+
+            # 之前就缺图标的目标已经尝试过（确定的失败结果在缓存中），只处理新出现的
+            known_missing = {normalize_url(record['url'] or record['official_site'])
+                             for record in previous if not is_local_icon(record['icon'])}
+            new_paths = {tuple(record['path']) for record in records
+                         if not is_local_icon(record['icon'])
+                         and normalize_url(record['url'] or record['official_site']) not in known_missing}
+            added += len(new_paths)
+            if self.fetch_enabled:
+                # JSON 路径随插入位置变化，待获取列表按当前内容重新计算
+                still_missing = {tuple(record['path']) for record in records if not is_local_icon(record['icon'])}
+                self.pending[path] = (self.pending.get(path, set()) & still_missing) | new_paths
+                if not self.pending[path]:
+                    del self.pending[path]
+            print(f"  {name}: {len(records)} 个资源, 新增缺失图标 {len(new_paths)}")
+        METRICS.inc('watch_groups_changed_total', len(names))
+        return added
+
+    def fetch_pending(self):
+        """为待获取列表中的资源获取图标；服务器不可用时保留，稍后重试"""
+        fetcher, args = self.fetcher, self.args
+        self.last_attempt = time.monotonic()
+        if not fetcher.check_server_status(args.base_url):
+            if not self.server_down:
+                print(f"  ⚠ 无法连接到服务器 {args.base_url}，"
+                      f"{sum(len(paths) for paths in self.pending.values())} 个资源稍后重试")
+            self.server_down = True
+            return
+        if self.server_down:
+            print(f"  ✓ 服务器已恢复: {args.base_url}")
+            self.server_down = False
+
+        if not self.batch_probed and not (self.dry_run or args.no_batch):
+            max_urls = fetcher.probe_batch_support(args.base_url, self.session)
+            if max_urls:
+                self.batch = fetcher.AdaptiveBatchSize(args.batch_size, maximum=min(args.max_batch_size, max_urls),
+                                                       target=fetcher.CONFIG['batch_target_seconds'])
+        self.batch_probed = True
+
+        files = sorted(self.pending)
+        only = {(path, json_path) for path, json_paths in self.pending.items() for json_path in json_paths}
+        resolver = None
+        if not args.no_local:
+            from icon_resolver import LocalResolver
+            resolver = LocalResolver(self.nav_index(), use_generic=args.generic_fallback)
+        outcomes = {}
+        stats = fetcher.process_all_files(
+            files, base_url=args.base_url, workers=args.workers, dry_run=self.dry_run, verbose=args.verbose,
+            session=self.session, cache=self.cache, limiter=self.limiter, breaker=self.breaker,
+            flush_interval=args.flush_interval, batch=self.batch, resolver=resolver, only=only,
+            ingest=fetcher.create_ingest_deduper(args, self.nav_index()), outcomes=outcomes,
+        )
+        if self.dry_run:
+            # 预览模式不请求，只列出一次
+            self.pending.clear()
+        else:
+            for path in files:
+                self.pending[path] = {json_path for json_path in self.pending[path]
+                                      if outcomes.get((path, json_path)) not in SETTLED_OUTCOMES}
+                if not self.pending[path]:
+                    del self.pending[path]
+        for key in ('success', 'failed', 'skipped'):
+            METRICS.inc('resources_total', stats[key], result=key)
+        print(f"  获取: {stats['total']} 个资源, 成功 {stats['success']}, 失败 {stats['failed']}, "
+              f"跳过 {stats['skipped']}, 本地命中 {stats.get('local_hits', 0)}, "
+              f"获取时去重 {stats.get('ingest_deduped', 0)}"
+              + (f"；{sum(len(paths) for paths in self.pending.values())} 个资源稍后重试" if self.pending else ''))
+
+    # -------- 图标目录 --------
+
+    def on_icons_changed(self, names: list):
+        """更新变化图标的签名，只对涉及的大小桶计算哈希并去重"""
+        affected = set()
+        for name in names:
+            if not name.endswith('.webp'):
+                continue
+            old = self.entries.get(name)
+            try:
+                signature = file_signature((ICONS_DIR / name).stat())
+            except FileNotFoundError:
+                signature = None
+            if old and old['sig'] == signature:
+                continue
+            if old:
+                affected.add(old['sig'][0])
+                self.by_size[old['sig'][0]].discard(name)
+                del self.entries[name]
+            if signature:
+                self.entries[name] = {'sig': signature}
+                self.by_size[signature[0]].add(name)
+                affected.add(signature[0])
+        if not affected:
+            return
+
+        buckets = {size: sorted(self.by_size[size]) for size in sorted(affected) if len(self.by_size[size]) > 1}
+        hashed, _, _ = dedupe_tool.hash_size_buckets(self.entries, buckets, self.jobs)
+        duplicates = {self.entries[files[0]]['hash']: files
+                      for groups in hashed.values() for files in groups if len(files) > 1}
+        METRICS.inc('watch_buckets_rehashed_total', len(buckets))
+        print(f"  图标变化: {len(names)} 个文件, 重新评估大小桶 {len(buckets)}, 重复组 {len(duplicates)}")
+
+        if duplicates:
+            nav_index = self.nav_index()
+            replacements, files_to_delete = dedupe_tool.plan_replacements(duplicates, nav_index.references)
+            for old, new in replacements.items():
+                print(f"    {old} -> {new}")
+            if not self.dry_run:
+                dedupe_tool.backup_files()
+            dedupe_tool.update_json_references(replacements, self.dry_run, nav_index)
+            deleted = dedupe_tool.delete_files(files_to_delete, self.dry_run)
+            print(f"  {'将删除' if self.dry_run else '已删除'} {deleted} 个重复文件")
+            if not self.dry_run:
+                for name in files_to_delete:
+                    entry = self.entries.pop(name, None)
+                    if entry:
+                        self.by_size[entry['sig'][0]].discard(name)
+        dedupe_tool.save_hash_index(self.entries)
+
+# ==================== 主逻辑 ====================
+
+def run_watch(args, fetch: bool = True, dedupe: bool = True, dry_run: bool = None):
+    """常驻监听，直到 Ctrl+C"""
+    if dry_run is None:
+        dry_run = getattr(args, 'dry_run', False)
+    print("=" * 70)
+    print("图标工具常驻监听模式")
+    print("=" * 70)
+    print(f"模式: {'预览模式' if dry_run else '执行模式'}")
+    print(f"功能: {'、'.join(label for label, enabled in (('获取新增资源图标', fetch), ('新图标去重', dedupe)) if enabled)}")
+    print()
+
+    print("[1] 加载索引...")
+    daemon = WatchDaemon(args, fetch=fetch, dedupe=dedupe, dry_run=dry_run)
+
+    directories = [CONTENT_DIR] + ([ICONS_DIR] if dedupe else [])
+    watcher, method = create_watcher(directories, getattr(args, 'poll', False))
+    print(f"\n[2] 开始监听（{method}，去抖 {args.debounce:g} 秒，Ctrl+C 退出）")
+    for directory in directories:
+        print(f"  - {directory}")
+
+    # 作为服务运行时按 SIGTERM 正常退出（关闭缓存、写出指标）
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        if fetch and daemon.pending:
+            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] 获取启动时已缺失的图标")
+            daemon.fetch_pending()
+        while True:
+            timeout = SERVER_RETRY_INTERVAL if daemon.pending else None
+            changed = collect_changes(watcher, args.debounce, timeout)
+            if watcher.overflowed:
+                # 事件丢失：按目录内容重新比较所有文件（与一次性运行相同的成本，极少发生）
+                watcher.overflowed = False
+                print("  ⚠ 事件队列溢出，重新比较全部文件")
+                changed |= {CONTENT_DIR / name for name in daemon.groups}
+                changed |= set(CONTENT_DIR.glob('*.json'))
+                if dedupe:
+                    changed |= {ICONS_DIR / name for name in daemon.entries} | set(ICONS_DIR.glob('*.webp'))
+
+            group_names = sorted({path.name for path in changed if path.parent == CONTENT_DIR
+                                  and path.suffix == '.json'})
+            icon_names = sorted({path.name for path in changed if path.parent == ICONS_DIR})
+            retry = daemon.pending and time.monotonic() - daemon.last_attempt >= SERVER_RETRY_INTERVAL
+            if not (group_names or icon_names or retry):
+                continue
+
+            start = time.perf_counter()
+            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] 分组文件变化 {len(group_names)}, "
+                  f"图标变化 {len(icon_names)}")
+            # 先更新内容索引，去重时的引用计数和获取时的本地解析都基于最新内容
+            if group_names:
+                daemon.on_groups_changed(group_names)
+            if icon_names and dedupe:
+                daemon.on_icons_changed(icon_names)
+            if fetch and daemon.pending:
+                daemon.fetch_pending()
+            METRICS.observe('watch_cycle_seconds', time.perf_counter() - start)
+            print(f"  处理耗时 {time.perf_counter() - start:.2f}s")
+    except KeyboardInterrupt:
+        print("\n已停止监听")
+    finally:
+        watcher.close()
+        daemon.close()
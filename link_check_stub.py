@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+本地站点替身服务器（用于基准测试和离线调试 check_links.py）
+
+功能：
+按路径的第一段决定响应，后面的部分只用来区分不同链接：
+    /ok/...        200，带 ETag 和 Last-Modified；条件请求命中时返回 304
+    /redirect/...  301 跳转到 /ok/...
+    /nohead/...    HEAD 返回 405，GET 返回 200（不支持 HEAD 的站点）
+    /blocked/...   403（拒绝爬虫）
+    /gone/...      404
+    /error/...     500
+    /slow/...      延迟 --slow-latency 秒后返回 200（模拟超时）
+其他路径返回 200。GET 响应带一段正文，用于确认检查程序不读取正文。
+统计请求数、304 数和同时进行的请求峰值，基准测试用来验证每主机并发限制。
+
+使用方法：
+    python link_check_stub.py [--port N] [--latency 秒] [--slow-latency 秒] [--verbose]
+
+    （分组文件中的资源 url 指向 http://127.0.0.1:4398/ok/1 等地址后运行 check_links.py）
+"""
+
+import time
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# ==================== 配置 ====================
+DEFAULT_PORT = 4398
+LAST_MODIFIED = 'Mon, 06 Jan 2025 08:00:00 GMT'
+BODY = b'<!doctype html><title>stub</title>' + b' ' * 16384
+
+# ==================== 服务器 ====================
+
+class LinkStubHandler(BaseHTTPRequestHandler):
+    """站点替身请求处理"""
+
+    server_version = 'LinkCheckStub/1.0'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, headers: dict = None, body: bool = True):
+        data = BODY if body and self.command == 'GET' and status != 304 else b''
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if status != 304:
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(BODY) if body and status != 304 else 0))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def _handle(self):
+        server = self.server
+        server.enter()
+        try:
+            if server.latency:
+                time.sleep(server.latency)
+            path = urlparse(self.path).path
+            kind = path.strip('/').split('/')[0]
+            rest = path.strip('/')[len(kind):]
+
+            if kind == 'ok':
+                etag = '"' + hashlib.sha1(path.encode('utf-8')).hexdigest()[:16] + '"'
+                validators = {'ETag': etag, 'Last-Modified': LAST_MODIFIED}
+                if self.headers.get('If-None-Match') == etag \
+                        or (not self.headers.get('If-None-Match')
+                            and self.headers.get('If-Modified-Since') == LAST_MODIFIED):
+                    server.count('not_modified')
+                    self._send(304, validators)
+                else:
+                    self._send(200, validators)
+            elif kind == 'redirect':
+                self._send(301, {'Location': f'/ok{rest}'}, body=False)
+            elif kind == 'nohead':
+                self._send(405 if self.command == 'HEAD' else 200)
+            elif kind == 'blocked':
+                self._send(403)
+            elif kind == 'gone':
+                self._send(404)
+            elif kind == 'error':
+                self._send(500)
+            elif kind == 'slow':
+                time.sleep(server.slow_latency)
+                self._send(200)
+            else:
+                self._send(200)
+        finally:
+            server.leave()
+
+    def do_HEAD(self):
+        self._handle()
+
+    def do_GET(self):
+        self._handle()
+
+class LinkStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, slow_latency=5.0, verbose=False):
+        super().__init__(address, LinkStubHandler)
+        self.latency = latency
+        self.slow_latency = slow_latency
+        self.verbose = verbose
+        self.requests = 0
+        self.not_modified = 0
+        self.active = 0
+        self.peak_active = 0
+        self._lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # 检查程序读完响应头就关闭 GET 连接，连接重置属于正常情况
+        if self.verbose:
+            super().handle_error(request, client_address)
+
+    def enter(self):
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+
+    def leave(self):
+        with self._lock:
+            self.active -= 1
+
+    def count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = self.not_modified = self.peak_active = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+def start_link_stub(port: int = 0, **options) -> LinkStubServer:
+    """在后台线程启动替身服务器（port=0 自动分配端口），返回服务器对象"""
+    server = LinkStubServer(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ==================== 主逻辑 ====================
+
+def main():
+    parser = argparse.ArgumentParser(description='本地站点替身服务器')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'监听端口（默认 {DEFAULT_PORT}）')
+    parser.add_argument('--latency', type=float, default=0.05, help='每个请求的固定延迟（秒，默认 0.05）')
+    parser.add_argument('--slow-latency', type=float, default=5.0, help='/slow/ 路径的额外延迟（秒，默认 5）')
+    parser.add_argument('--verbose', '-v', action='store_true', help='输出请求日志')
+    args = parser.parse_args()
+
+    server = LinkStubServer(('127.0.0.1', args.port), latency=args.latency,
+                            slow_latency=args.slow_latency, verbose=args.verbose)
+    print(f"替身服务器运行中: {server.base_url}（Ctrl+C 退出）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
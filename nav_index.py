@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+nav-groups 内容索引（dedupe_icons_final.py 与 fetch_icons_via_api.py 共用）
+===========================
+
+功能：
+1. 结构化遍历 src/content/nav-groups/*.json 中的资源：
+   - resources[]
+   - categories[].resources[]
+   - categories[].tabs[].list[]
+2. 建立内存索引：
+   - 图标文件名 -> [(分组文件, JSON 路径, 资源名, url)]
+   - url / 域名 -> 资源
+3. 记录分组所属页面（pageName），按页面汇总引用的图标
+4. 索引缓存到 .icon_cache/nav_index.json，按文件签名（大小、修改时间和 inode）失效，
+   只重新解析发生变化的分组文件
+
+统一的边界规则：
+- 图标引用忽略 ?t= 等查询参数，按文件名（含 .png 等任意扩展名）索引
+- 资源同时按 url 和 official_site 建立 url/域名索引，url 键经过 normalize_url 规范化
+
+使用方法：
+    python nav_index.py [--rebuild]    # 输出索引统计
+"""
+
+import os
+import json
+import argparse
+from pathlib import Path
+from collections import defaultdict
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+from file_utils import file_signature
+
+# ==================== 配置 ====================
+CONTENT_DIR = Path('./src/content/nav-groups')
+CACHE_DIR = Path('./.icon_cache')
+NAV_INDEX_PATH = CACHE_DIR / 'nav_index.json'
+NAV_INDEX_VERSION = 2
+
+ICON_PREFIX = '/images/logos/'
+
+# 规范化 URL 时去掉的跟踪参数（另外所有 utm_ 前缀参数都会去掉）
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'yclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga',
+    'spm', 'ref_src', 'share_source', 'share_medium', 'si',
+}
+
+# ==================== 工具函数 ====================
+
+def iter_resources(data: dict):
+    """按固定顺序遍历分组数据中的资源，产出 (JSON 路径, 资源)
+
+    JSON 路径为键/下标组成的元组，例如 ('categories', 0, 'tabs', 1, 'list', 3)。
+    """
+    for i, resource in enumerate(data.get('resources') or []):
+        yield ('resources', i), resource
+
+    for c, category in enumerate(data.get('categories') or []):
+        for i, resource in enumerate(category.get('resources') or []):
+            yield ('categories', c, 'resources', i), resource
+
+        for t, tab in enumerate(category.get('tabs') or []):
+            for i, resource in enumerate(tab.get('list') or []):
+                yield ('categories', c, 'tabs', t, 'list', i), resource
+
+def format_path(path) -> str:
+    """('categories', 0, 'resources', 3) -> 'categories[0].resources[3]'"""
+    text = ''
+    for part in path:
+        if isinstance(part, int):
+            text += f'[{part}]'
+        else:
+            text += f'.{part}' if text else part
+    return text
+
+def resolve_path(data: dict, path):
+    """按 JSON 路径取出资源对象"""
+    node = data
+    for part in path:
+        node = node[part]
+    return node
+
+def is_local_icon(icon) -> bool:
+    """图标是否指向本地 /images/logos/ 目录"""
+    return bool(icon) and ICON_PREFIX in icon
+
+def icon_filename(icon):
+    """从图标路径提取本地文件名（去掉 ?t= 等参数）；非本地图标返回 None"""
+    if not is_local_icon(icon):
+        return None
+    name = icon.split(ICON_PREFIX, 1)[1].split('?', 1)[0].split('#', 1)[0]
+    return name or None
+
+def url_domain(url):
+    """提取小写主机名（去掉 www. 前缀）"""
+    if not url:
+        return None
+    try:
+        host = urlparse(url if '//' in url else f'//{url}').hostname
+    except ValueError:
+        return None
+    if not host:
+        return None
+    return host[4:] if host.startswith('www.') else host
+
+def normalize_url(url):
+    """规范化 URL：小写协议和主机、去掉默认端口、跟踪参数、锚点和结尾斜杠
+
+    用作请求合并和 url 索引的键，同一目标的不同写法得到相同结果。
+    """
+    if not url:
+        return None
+    url = url.strip()
+    try:
+        parsed = urlparse(url if '//' in url else f'https://{url}')
+        host = (parsed.hostname or '').lower()
+        port = parsed.port
+    except ValueError:
+        return url
+    if not host:
+        return url
+
+    scheme = (parsed.scheme or 'https').lower()
+    netloc = host
+    if port and not (scheme == 'http' and port == 80) and not (scheme == 'https' and port == 443):
+        netloc = f'{host}:{port}'
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith('utm_')
+    ])
+    path = parsed.path.rstrip('/')
+    return urlunparse((scheme, netloc, path, parsed.params, query, ''))
+
+def parse_group_file(json_file: Path) -> tuple:
+    """解析单个分组文件，返回 (页面名, 资源记录列表)"""
+    with open(json_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return group_records(data)
+
+def group_records(data: dict) -> tuple:
+    """从已解析的分组数据提取 (页面名, 资源记录列表)"""
+    records = []
+    for path, resource in iter_resources(data):
+        records.append({
+            'path': list(path),
+            'name': resource.get('name', ''),
+            'url': resource.get('url') or '',
+            'official_site': resource.get('official_site') or '',
+            'icon': resource.get('icon') or '',
+        })
+    return data.get('pageName') or 'home', records
+
+# ==================== 索引 ====================
+
+class NavIndex:
+    """nav-groups 资源索引"""
+
+    def __init__(self, groups: dict, content_dir: Path = CONTENT_DIR, pages: dict = None):
+        # groups: 分组文件名 -> 资源记录列表（按文件名排序，遍历顺序稳定）
+        # pages: 分组文件名 -> 页面名（nav-pages 中的 id）
+        self.content_dir = content_dir
+        self.groups = dict(sorted(groups.items()))
+        self.pages = pages or {}
+        self.references = defaultdict(list)
+        self.by_url = defaultdict(list)  # 键为 normalize_url 结果
+        self.by_domain = defaultdict(list)
+
+        for group_name, records in self.groups.items():
+            for record in records:
+                entry = self._entry(group_name, record)
+                filename = icon_filename(record['icon'])
+                if filename:
+                    self.references[filename].append(entry)
+                for url in {record['url'], record['official_site']} - {''}:
+                    self.by_url[normalize_url(url)].append(entry)
+                    domain = url_domain(url)
+                    if domain:
+                        self.by_domain[domain].append(entry)
+
+    def _entry(self, group_name: str, record: dict) -> dict:
+        return {
+            'file': self.content_dir / group_name,
+            'path': format_path(record['path']),
+            'json_path': tuple(record['path']),
+            'name': record['name'],
+            'url': record['url'] or record['official_site'],
+            'full_path': record['icon'],
+        }
+
+    def group_files(self) -> list:
+        return [self.content_dir / name for name in self.groups]
+
+    def resources(self):
+        """遍历所有资源条目"""
+        for group_name, records in self.groups.items():
+            for record in records:
+                yield self._entry(group_name, record)
+
+    def missing_icon_resources(self) -> dict:
+        """没有本地图标的资源，按分组文件归类"""
+        missing = defaultdict(list)
+        for group_name, records in self.groups.items():
+            for record in records:
+                if not is_local_icon(record['icon']):
+                    missing[self.content_dir / group_name].append(self._entry(group_name, record))
+        return dict(missing)
+
+    def page_icons(self) -> dict:
+        """每个页面引用的本地图标文件名（排序去重）"""
+        icons = defaultdict(set)
+        for group_name, records in self.groups.items():
+            page = self.pages.get(group_name, 'home')
+            for record in records:
+                filename = icon_filename(record['icon'])
+                if filename:
+                    icons[page].add(filename)
+        return {page: sorted(names) for page, names in sorted(icons.items())}
+
+    def files_referencing(self, filenames) -> list:
+        """引用了任一指定图标文件的分组文件"""
+        files = set()
+        for filename in filenames:
+            for ref in self.references.get(filename, []):
+                files.add(ref['file'])
+        return sorted(files)
+
+def _load_cache(rebuild: bool) -> dict:
+    if rebuild or not NAV_INDEX_PATH.exists():
+        return {}
+    try:
+        with open(NAV_INDEX_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != NAV_INDEX_VERSION:
+        return {}
+    return data.get('files', {})
+
+def _save_cache(files: dict):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = NAV_INDEX_PATH.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': NAV_INDEX_VERSION, 'files': files}, f, ensure_ascii=False)
+    os.replace(tmp_path, NAV_INDEX_PATH)
+
+def load_nav_index(content_dir: Path = CONTENT_DIR, rebuild: bool = False) -> NavIndex:
+    """加载内容索引：未变化的分组文件直接使用缓存，变化的重新解析"""
+    # 缓存只对应默认内容目录，其他目录（如基准测试的合成数据）每次重新解析
+    use_cache = Path(content_dir) == CONTENT_DIR
+    cached = _load_cache(rebuild) if use_cache else {}
+    files = {}
+
+    for json_file in sorted(Path(content_dir).glob('*.json')):
+        signature = file_signature(json_file.stat())
+        entry = cached.get(json_file.name)
+        if not entry or entry.get('sig') != signature:
+            try:
+                page, resources = parse_group_file(json_file)
+                entry = {'sig': signature, 'page': page, 'resources': resources}
+            except (OSError, ValueError) as e:
+                print(f"  警告: 读取 {json_file.name} 失败: {e}")
+                continue
+        files[json_file.name] = entry
+
+    if use_cache and files != cached:
+        _save_cache(files)
+
+    return NavIndex({name: entry['resources'] for name, entry in files.items()}, Path(content_dir),
+                    {name: entry['page'] for name, entry in files.items()})
+
+# ==================== 主逻辑 ====================
+
+def main():
+    parser = argparse.ArgumentParser(description='nav-groups 内容索引')
+    parser.add_argument('--rebuild', action='store_true', help='忽略缓存，重新解析所有分组文件')
+    args = parser.parse_args()
+
+    index = load_nav_index(rebuild=args.rebuild)
+    total = sum(len(records) for records in index.groups.values())
+    missing = index.missing_icon_resources()
+    print(f"分组文件: {len(index.groups)}")
+    print(f"页面数: {len(index.page_icons())}")
+    print(f"资源数: {total}")
+    print(f"被引用的图标: {len(index.references)}")
+    print(f"域名数: {len(index.by_domain)}")
+    print(f"缺少本地图标的资源: {sum(len(v) for v in missing.values())}")
+
+if __name__ == '__main__':
+    main()
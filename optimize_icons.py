@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+图标压缩优化程序
+===========================
+
+功能：
+1. 缩小超过最大尺寸的图标（卡片中图标显示为 32px，默认保留 128px，与后台生成的图标尺寸一致）
+2. 默认无损重新编码（WebP 无损）；--lossy 时另外尝试有损编码（默认 q=90），取体积更小者；
+   同格式文件只在体积确实变小时替换。Pillow 的 AVIF 编码器没有无损模式，
+   --format avif 时按 quality=100、4:4:4 编码，结果只是近无损
+3. 把 PNG/ICO/JPG/GIF 以及内嵌位图的 SVG 转换为 WebP/AVIF，
+   并通过去重脚本的同一引用更新流程（update_json_references）改写 JSON 引用；
+   原文件只在 nav-groups 之外没有引用时删除（按 gc_icons.mark_references 扫描），
+   仍被其他源文件引用的原文件保留，不再被引用后由 gc_icons.py 回收
+4. 统计节省的字节数，列出超出体积预算的图标，报告保存到 icon_optimize_report.json
+
+使用方法：
+    python optimize_icons.py [--dry-run] [--max-size PX] [--budget BYTES] [--format webp|avif]
+                             [--lossy [--quality Q]] [--recompress] [--jobs N]
+
+参数：
+    --dry-run         只预览，不写文件
+    --max-size PX     图标最长边上限（默认 128）
+    --budget BYTES    单个图标体积预算，超出的图标会在报告中列出（默认 10240）
+    --format FMT      输出格式 webp 或 avif（默认 webp，avif 需要 Pillow 支持）
+    --lossy           同时尝试有损编码，取体积更小者（默认只用无损编码）
+    --quality Q       有损候选的编码质量 0-100（默认 90，只在 --lossy 时使用）
+    --recompress      尺寸未超限的同格式图标也尝试重新编码（默认只处理超尺寸和需要转换格式的图标）
+    --jobs N          并行解码 / 编码的进程数（默认 1）
+
+依赖：
+    pip install Pillow
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import base64
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+from dedupe_icons_final import ICONS_DIR, CONTENT_DIR, map_ordered, update_json_references
+from file_utils import format_bytes, write_atomic
+from nav_index import load_nav_index
+
+try:
+    from PIL import Image, features
+except ImportError:
+    print("请先安装依赖: pip install Pillow")
+    sys.exit(1)
+
+# ==================== 配置 ====================
+MAX_ICON_SIZE = 128
+BYTE_BUDGET = 10 * 1024
+DEFAULT_QUALITY = 90
+# 同格式重新编码至少节省这个比例才替换，避免为几个字节改动文件
+MIN_SAVING_RATIO = 0.05
+REPORT_PATH = Path('./icon_optimize_report.json')
+
+RASTER_EXTENSIONS = {'.webp', '.png', '.ico', '.jpg', '.jpeg', '.gif', '.bmp', '.avif'}
+SVG_EXTENSION = '.svg'
+OUTPUT_FORMATS = {'webp': ('WEBP', '.webp'), 'avif': ('AVIF', '.avif')}
+
+SVG_RASTER_PATTERN = re.compile(rb'data:image/(?:png|jpe?g|webp|gif);base64,([A-Za-z0-9+/=\s]+)')
+
+# ==================== 工具函数 ====================
+
+def extract_svg_raster(data: bytes):
+    """提取 SVG 中内嵌的位图（<image href="data:image/png;base64,...">）；纯矢量 SVG 返回 None"""
+    match = SVG_RASTER_PATTERN.search(data)
+    if not match:
+        return None
+    return base64.b64decode(re.sub(rb'\s+', b'', match.group(1)))
+
+def encode_image(img, output_format: str, quality: int = DEFAULT_QUALITY, lossy: bool = False) -> bytes:
+    """按指定格式编码：默认只用无损编码；lossy=True 时另外尝试有损（quality）编码，返回体积更小的一个
+
+    AVIF 没有可用的无损模式（Pillow 不提供 identity 矩阵），"无损"候选为 quality=100、4:4:4 的近无损编码。
+    """
+    pil_format, _ = OUTPUT_FORMATS[output_format]
+    if pil_format == 'WEBP':
+        candidates = [{'lossless': True, 'quality': 80, 'method': 4}]
+        if lossy:
+            candidates.append({'quality': quality, 'method': 4})
+    else:
+        candidates = [{'quality': 100, 'subsampling': '4:4:4'}]
+        if lossy:
+            candidates.append({'quality': quality})
+
+    best = None
+    for options in candidates:
+        buffer = io.BytesIO()
+        img.save(buffer, pil_format, **options)
+        data = buffer.getvalue()
+        if best is None or len(data) < len(best):
+            best = data
+    return best
+
+def optimize_icon(path: Path, max_size: int, output_format: str, quality: int,
+                  lossy: bool = False, recompress: bool = False) -> dict:
+    """进程池任务：解码并重新编码单个图标，只返回结果，不写文件
+
+    action 为 convert（换格式）、recompress（同格式缩小体积）或 skip。
+    """
+    result = {'name': path.name, 'action': 'skip', 'reason': '', 'data': None,
+              'old_size': path.stat().st_size, 'new_size': None, 'size': None}
+    _, target_ext = OUTPUT_FORMATS[output_format]
+    ext = path.suffix.lower()
+    try:
+        raw = path.read_bytes()
+        if ext == SVG_EXTENSION:
+            raw = extract_svg_raster(raw)
+            if raw is None:
+                result['reason'] = '矢量 SVG'
+                return result
+
+        with Image.open(io.BytesIO(raw)) as img:
+            result['size'] = list(img.size)
+            resized = max(img.size) > max_size
+            if getattr(img, 'is_animated', False):
+                result['reason'] = '动图'
+                return result
+            if ext == target_ext and not resized and not recompress:
+                result['reason'] = '尺寸未超限'
+                return result
+            img.load()
+            has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+            img = img.convert('RGBA' if has_alpha else 'RGB')
+
+        if resized:
+            img.thumbnail((max_size, max_size), Image.LANCZOS)
+
+        data = encode_image(img, output_format, quality, lossy)
+        if ext != target_ext:
+            result.update(action='convert', data=data, new_size=len(data))
+        elif len(data) < result['old_size'] * (1 - MIN_SAVING_RATIO):
+            result.update(action='recompress', data=data, new_size=len(data))
+        else:
+            result['reason'] = '重新编码后未明显变小'
+    except Exception as e:
+        result['reason'] = f'解码失败: {e}'
+    return result
+
+def converted_name(name: str, target_ext: str, taken: set) -> str:
+    """转换后的文件名：同名目标已存在（或本次已分配）时加上原扩展名避免覆盖"""
+    stem, ext = os.path.splitext(name)
+    candidate = f'{stem}{target_ext}'
+    if candidate in taken or (ICONS_DIR / candidate).exists():
+        candidate = f'{stem}-{ext.lstrip(".").lower()}{target_ext}'
+    taken.add(candidate)
+    return candidate
+
+def referenced_outside_groups(names) -> dict:
+    """nav-groups 之外仍引用这些图标的源文件（gc_icons.mark_references 扫描 src/ 和 public/）"""
+    from gc_icons import mark_references
+    marked = mark_references()
+    outside = {}
+    for name in names:
+        sources = [source for source in marked.get(name, []) if Path(source).parent != CONTENT_DIR]
+        if sources:
+            outside[name] = sources
+    return outside
+
+# ==================== 主逻辑 ====================
+
+def main():
+    parser = argparse.ArgumentParser(description='图标压缩优化程序')
+    parser.add_argument('--dry-run', action='store_true', help='只预览，不写文件')
+    parser.add_argument('--max-size', type=int, default=MAX_ICON_SIZE, help=f'图标最长边上限（默认 {MAX_ICON_SIZE}）')
+    parser.add_argument('--budget', type=int, default=BYTE_BUDGET, help=f'单个图标体积预算（字节，默认 {BYTE_BUDGET}）')
+    parser.add_argument('--format', choices=sorted(OUTPUT_FORMATS), default='webp', help='输出格式（默认 webp）')
+    parser.add_argument('--lossy', action='store_true', help='同时尝试有损编码，取体积更小者（默认只用无损编码）')
+    parser.add_argument('--quality', type=int, default=DEFAULT_QUALITY, help=f'有损候选的编码质量（默认 {DEFAULT_QUALITY}）')
+    parser.add_argument('--recompress', action='store_true', help='尺寸未超限的同格式图标也尝试重新编码')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='并行进程数（默认 1）')
+    args = parser.parse_args()
+
+    if args.format == 'avif' and not features.check('avif'):
+        print("当前 Pillow 不支持 AVIF 编码，请升级 Pillow 或使用 --format webp")
+        sys.exit(1)
+
+    print("=" * 70)
+    print("图标压缩优化程序")
+    print("=" * 70)
+    print(f"模式: {'预览模式' if args.dry_run else '执行模式'}")
+    lossless_label = '无损' if args.format == 'webp' else '近无损'
+    print(f"输出: {args.format.upper()} {f'{lossless_label} / 有损 q={args.quality} 取小' if args.lossy else lossless_label}, "
+          f"最长边 {args.max_size}px, 预算 {format_bytes(args.budget)}")
+    if args.format == 'avif' and not args.lossy:
+        print("注意: AVIF 没有无损模式，按 quality=100、4:4:4 近无损编码")
+    print()
+
+    # 1. 扫描图标
+    print("[1] 扫描图标文件...")
+    files = sorted(
+        f for f in ICONS_DIR.iterdir()
+        if f.is_file() and f.suffix.lower() in RASTER_EXTENSIONS | {SVG_EXTENSION}
+    )
+    bytes_before = sum(f.stat().st_size for f in files)
+    print(f"  图标数: {len(files)}, 总大小: {format_bytes(bytes_before)}")
+
+    # 2. 解码并重新编码
+    print("\n[2] 重新编码...")
+    results = map_ordered(
+        optimize_icon,
+        [(f, args.max_size, args.format, args.quality, args.lossy, args.recompress) for f in files],
+        args.jobs,
+        use_processes=True,
+    )
+    _, target_ext = OUTPUT_FORMATS[args.format]
+    conversions = {}
+    taken = set()
+    recompressed = []
+    errors = {}
+    final_sizes = {}
+    for result in results:
+        name = result['name']
+        if result['action'] == 'convert':
+            conversions[name] = converted_name(name, target_ext, taken)
+            final_sizes[conversions[name]] = result['new_size']
+        elif result['action'] == 'recompress':
+            recompressed.append(name)
+            final_sizes[name] = result['new_size']
+        else:
+            final_sizes[name] = result['old_size']
+            if result['reason'].startswith('解码失败'):
+                errors[name] = result['reason']
+    print(f"  转换格式: {len(conversions)}")
+    print(f"  重新压缩: {len(recompressed)}")
+    if errors:
+        print(f"  解码失败: {len(errors)}")
+        for name, reason in list(errors.items())[:10]:
+            print(f"    - {name}: {reason}")
+
+    # 3. 写入新文件
+    print("\n[3] 写入优化后的图标...")
+    if not args.dry_run:
+        for result in results:
+            if result['action'] == 'convert':
+                write_atomic(ICONS_DIR / conversions[result['name']], result['data'])
+            elif result['action'] == 'recompress':
+                write_atomic(ICONS_DIR / result['name'], result['data'])
+    print(f"  {'将写入' if args.dry_run else '已写入'} {len(conversions) + len(recompressed)} 个文件")
+
+    # 4. 更新引用（与去重脚本相同的单次扫描替换）
+    print("\n[4] 更新 JSON 引用...")
+    nav_index = load_nav_index(CONTENT_DIR)
+    updated_files, total_replacements = update_json_references(conversions, args.dry_run, nav_index)
+    print(f"  {'将更新' if args.dry_run else '已更新'} {updated_files} 个文件, {total_replacements} 处引用")
+
+    # 5. 删除已转换的原文件（nav-groups 之外仍有引用的保留）
+    print("\n[5] 删除已转换的原文件...")
+    kept = referenced_outside_groups(conversions)
+    removable = [name for name in conversions if name not in kept]
+    if not args.dry_run:
+        for name in removable:
+            (ICONS_DIR / name).unlink()
+    print(f"  {'将删除' if args.dry_run else '已删除'} {len(removable)} 个文件")
+    if kept:
+        print(f"  保留 {len(kept)} 个仍被其他源文件引用的原文件（不再被引用后由 gc_icons.py 回收）")
+        for name, sources in list(kept.items())[:10]:
+            print(f"    - {name}: {', '.join(sources[:3])}")
+
+    # 6. 体积预算
+    print("\n[6] 检查体积预算...")
+    over_budget = sorted(
+        ((name, size) for name, size in final_sizes.items() if size > args.budget),
+        key=lambda item: (-item[1], item[0]),
+    )
+    print(f"  超出预算 ({format_bytes(args.budget)}): {len(over_budget)}")
+    for name, size in over_budget[:15]:
+        print(f"    - {name}: {format_bytes(size)}")
+    if len(over_budget) > 15:
+        print(f"    - ... 还有 {len(over_budget) - 15} 个")
+
+    # 7. 总结
+    bytes_after = sum(final_sizes.values())
+    print("\n" + "=" * 70)
+    print("总结")
+    print("=" * 70)
+    print(f"  优化前: {format_bytes(bytes_before)}")
+    print(f"  优化后: {format_bytes(bytes_after)}")
+    print(f"  {'将节省' if args.dry_run else '已节省'}: {format_bytes(bytes_before - bytes_after)}")
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'dry_run': args.dry_run,
+        'settings': {
+            'format': args.format,
+            'quality': args.quality,
+            'lossy': args.lossy,
+            'max_size': args.max_size,
+            'budget': args.budget,
+        },
+        'summary': {
+            'scanned': len(files),
+            'converted': len(conversions),
+            'recompressed': len(recompressed),
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'bytes_saved': bytes_before - bytes_after,
+            'over_budget': len(over_budget),
+        },
+        'conversions': conversions,
+        'recompressed': recompressed,
+        'kept_originals': kept,
+        'over_budget': [{'file': name, 'bytes': size} for name, size in over_budget],
+        'errors': errors,
+    }
+    with open(REPORT_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n报告已保存: {REPORT_PATH}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+本地 /api/smart-parse 替身服务器（用于基准测试和离线调试 fetch_icons_via_api.py）
+
+功能：
+1. GET /                          返回 200，供 check_server_status 探测
+2. GET /api/smart-parse?url=URL   按 URL 生成确定的本地图标路径并返回 JSON
+3. 可配置响应延迟和错误率，模拟慢速或不稳定的后台
+4. 故障注入：指定上游主机固定失败或变慢，并发超过容量时返回 503（模拟后台过载）
+5. 批量协议：GET /api/smart-parse/batch 声明支持和单批上限；POST 同一路径提交 {"urls": [...]}，
+   后台并行解析，每完成一个 URL 就以 NDJSON 行流式返回（chunked），--no-batch 模拟不支持批量的后台
+
+6. 写入图标：--icons-dir 指定目录时，像真实后台一样把图标写入该目录；--duplicate-rate 比例的 URL
+   写入与目录中已有图标字节相同的内容（模拟后台下载到重复图标），用于测试获取时去重
+
+延迟模型：--latency 是每个 HTTP 请求的固定开销（批量请求只付一次），--item-latency 是每个 URL 的解析耗时。
+
+使用方法：
+    python smart_parse_stub.py [--port N] [--latency 秒] [--jitter 秒] [--error-rate 比例]
+                               [--fail-hosts a.com,b.com] [--slow-hosts c.com] [--slow-latency 秒]
+                               [--capacity N] [--item-latency 秒] [--no-batch] [--max-batch N]
+                               [--icons-dir DIR [--duplicate-rate 比例]]
+
+    python fetch_icons_via_api.py --base-url http://127.0.0.1:4399
+"""
+
+import os
+import json
+import random
+import hashlib
+import re
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# ==================== 配置 ====================
+DEFAULT_PORT = 4399
+BATCH_PATH = '/api/smart-parse/batch'
+BATCH_WORKERS = 8  # 批量请求内并行解析的 URL 数
+
+# ==================== 服务器 ====================
+
+def icon_for_url(url: str) -> str:
+    """按 URL 生成确定的图标路径（与前端缓存文件名风格一致：host-path 用 - 连接）"""
+    parsed = urlparse(url)
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', f"{parsed.hostname or ''}{parsed.path}").strip('-')
+    return f'/images/logos/{slug or "unknown"}.webp'
+
+class StubHandler(BaseHTTPRequestHandler):
+    """smart-parse 替身请求处理"""
+
+    server_version = 'SmartParseStub/1.0'
+    protocol_version = 'HTTP/1.1'
+    # 关闭 Nagle 算法，避免头部和正文分两次发送时触发延迟 ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path == '/':
+            self._send_json(200, {'ok': True})
+            return
+        if parsed.path == BATCH_PATH and self.server.batch:
+            self._send_json(200, {'batch': True, 'max_urls': self.server.max_batch})
+            return
+        if parsed.path != '/api/smart-parse':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        url = parse_qs(parsed.query).get('url', [''])[0]
+        server = self.server
+        if not server.enter():
+            self._send_json(503, {'error': 'overloaded'})
+            return
+        try:
+            if server.latency:
+                time.sleep(server.latency)
+            status, payload = server.parse_url(url)
+            self._send_json(status, payload)
+        finally:
+            server.leave()
+
+    def do_POST(self):
+        server = self.server
+        if urlparse(self.path).path != BATCH_PATH or not server.batch:
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+            urls = [str(url) for url in body['urls']]
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {'error': 'expected {"urls": [...]}'})
+            return
+        if len(urls) > server.max_batch:
+            self._send_json(413, {'error': f'at most {server.max_batch} urls per batch'})
+            return
+        if not server.enter():
+            self._send_json(503, {'error': 'overloaded'})
+            return
+        try:
+            if server.latency:
+                time.sleep(server.latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            # 每个 URL 解析完成即写出一行，顺序按完成先后
+            with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as executor:
+                futures = {executor.submit(server.parse_url, url): url for url in urls}
+                for future in as_completed(futures):
+                    status, payload = future.result()
+                    line = {'url': futures[future], 'status': status, **payload}
+                    self._write_chunk(json.dumps(line, ensure_ascii=False).encode('utf-8') + b'\n')
+            self._write_chunk(b'')
+        finally:
+            server.leave()
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, verbose=False,
+                 fail_hosts=(), slow_hosts=(), slow_latency=0.0, capacity=0,
+                 item_latency=0.0, batch=True, max_batch=100, icons_dir=None, duplicate_rate=0.0):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.verbose = verbose
+        self.fail_hosts = set(fail_hosts)
+        self.slow_hosts = set(slow_hosts)
+        self.slow_latency = slow_latency
+        self.capacity = capacity
+        self.item_latency = item_latency
+        self.batch = batch
+        self.max_batch = max_batch
+        self.icons_dir = icons_dir
+        self.duplicate_rate = duplicate_rate
+        # 重复图标的内容来源：启动时目录中已有的图标
+        self.existing_icons = sorted(
+            name for name in os.listdir(icons_dir) if name.endswith('.webp')
+        ) if icons_dir else []
+        self.icons_written = 0
+        self.requests = 0
+        self.urls_parsed = 0
+        self.rejected = 0
+        self.active = 0
+        self.peak_active = 0
+        self._lock = threading.Lock()
+
+    def parse_url(self, url: str) -> tuple:
+        """模拟解析单个 URL，返回 (HTTP 状态码, 响应 JSON)"""
+        start = time.monotonic()
+        host = (urlparse(url).hostname or '').lower()
+        delay = self.item_latency + random.uniform(0, self.jitter)
+        if host in self.slow_hosts:
+            delay += self.slow_latency
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            self.urls_parsed += 1
+        if host in self.fail_hosts or random.random() < self.error_rate:
+            return 500, {'error': 'injected failure'}
+        icon = icon_for_url(url)
+        if self.icons_dir:
+            self.write_icon(url, icon.rsplit('/', 1)[-1])
+        return 200, {'url': url, 'icon': f'{icon}?t={int(time.time() * 1000)}',
+                     'elapsed': round(time.monotonic() - start, 6)}
+
+    def write_icon(self, url: str, filename: str):
+        """按 URL 确定地生成图标内容：一部分复制已有图标的字节，其余为唯一内容"""
+        digest = hashlib.sha256(url.encode('utf-8')).digest()
+        if self.existing_icons and digest[0] / 256 < self.duplicate_rate:
+            source = self.existing_icons[int.from_bytes(digest[1:5], 'big') % len(self.existing_icons)]
+            with open(os.path.join(self.icons_dir, source), 'rb') as f:
+                data = f.read()
+        else:
+            data = b'RIFF' + digest * 32
+        tmp_path = os.path.join(self.icons_dir, f'.{filename}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.icons_dir, filename))
+        with self._lock:
+            self.icons_written += 1
+
+    def enter(self) -> bool:
+        """登记一个进行中的请求；超过容量（capacity > 0）时拒绝"""
+        with self._lock:
+            self.requests += 1
+            if self.capacity and self.active >= self.capacity:
+                self.rejected += 1
+                return False
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.active -= 1
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+def start_stub_server(port: int = 0, **options) -> StubServer:
+    """在后台线程启动替身服务器（port=0 自动分配端口），返回服务器对象"""
+    server = StubServer(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def split_hosts(text: str) -> list:
+    return [host.strip().lower() for host in text.split(',') if host.strip()]
+
+# ==================== 主逻辑 ====================
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 /api/smart-parse 替身服务器')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'监听端口（默认 {DEFAULT_PORT}）')
+    parser.add_argument('--latency', type=float, default=0.05, help='每个 HTTP 请求的固定开销（秒，默认 0.05）')
+    parser.add_argument('--item-latency', type=float, default=0.0, help='每个 URL 的解析耗时（秒，默认 0）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='额外随机延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 500 的比例（0-1）')
+    parser.add_argument('--fail-hosts', type=str, default='', help='固定返回 500 的上游主机，逗号分隔')
+    parser.add_argument('--slow-hosts', type=str, default='', help='额外变慢的上游主机，逗号分隔')
+    parser.add_argument('--slow-latency', type=float, default=5.0, help='慢主机的额外延迟（秒，默认 5）')
+    parser.add_argument('--capacity', type=int, default=0, help='同时处理的请求上限，超出返回 503（0 为不限）')
+    parser.add_argument('--no-batch', action='store_true', help='不提供批量接口（模拟旧版后台）')
+    parser.add_argument('--max-batch', type=int, default=100, help='单批 URL 上限（默认 100）')
+    parser.add_argument('--icons-dir', type=str, default=None, help='把图标写入该目录（默认不写文件）')
+    parser.add_argument('--duplicate-rate', type=float, default=0.0, help='写入与已有图标相同内容的比例（0-1）')
+    parser.add_argument('--verbose', '-v', action='store_true', help='输出请求日志')
+    args = parser.parse_args()
+
+    server = StubServer(('127.0.0.1', args.port), latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, verbose=args.verbose,
+                        fail_hosts=split_hosts(args.fail_hosts), slow_hosts=split_hosts(args.slow_hosts),
+                        slow_latency=args.slow_latency, capacity=args.capacity,
+                        item_latency=args.item_latency, batch=not args.no_batch, max_batch=args.max_batch,
+                        icons_dir=args.icons_dir, duplicate_rate=args.duplicate_rate)
+    print(f"替身服务器运行中: {server.base_url}（Ctrl+C 退出）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
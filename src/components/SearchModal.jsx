@@ -3,10 +3,39 @@ import React, { useState, useEffect, useRef } from 'react';
 import Fuse from 'fuse.js';
 import { Search, X, Command, ExternalLink, Copy, Check, Zap } from 'lucide-react';
 
-// 动态获取 nav-groups 文件夹下的所有分组数据
-const navFiles = import.meta.glob('../content/nav-groups/*.json', { eager: true });
-// 处理可能的 default 导出
-const navResources = Object.values(navFiles).map((file) => file.default || file);
+// 预构建的搜索索引（build_search_index.py 生成到 public/search/）：按页面分片，
+// 第一次打开搜索时才加载，不再把全部 nav-groups JSON 打包进脚本、也不在浏览器里现场建索引
+const SEARCH_BASE = `${import.meta.env.BASE_URL.replace(/\/$/, '')}/search`;
+const FUSE_OPTIONS = {
+  keys: ['name', 'desc', 'category', 'tabName'],
+  threshold: 0.4,
+  distance: 100,
+  includeScore: true,
+};
+
+let searchIndexPromise = null;
+
+// 每个分片单独建 Fuse（索引记录的下标对应分片内的 docs），失败后下次打开重试
+const loadSearchIndex = () => {
+  if (!searchIndexPromise) {
+    searchIndexPromise = (async () => {
+      const response = await fetch(`${SEARCH_BASE}/index.json`);
+      if (!response.ok) throw new Error(`HTTP ${response.status}`);
+      const entries = Object.values(await response.json());
+      return Promise.all(entries.map(async (entry) => {
+        const shardResponse = await fetch(`${SEARCH_BASE}/${entry.file}`);
+        if (!shardResponse.ok) throw new Error(`HTTP ${shardResponse.status}`);
+        const shard = await shardResponse.json();
+        const docs = shard.docs.map((doc) => ({ ...doc, pageName: shard.page || 'home' }));
+        return new Fuse(docs, FUSE_OPTIONS, Fuse.parseIndex(shard.index));
+      }));
+    })().catch((err) => {
+      searchIndexPromise = null;
+      throw err;
+    });
+  }
+  return searchIndexPromise;
+};
 
 export function SearchTrigger() {
   return (
@@ -73,78 +102,8 @@ export default function SearchModal() {
     }
   };
 
-  // --- 修复：适配 nav-groups 数据结构的扁平化逻辑 ---
-  // nav-groups 目录下每个 JSON 文件就是一个 group
-  const allLinks = navResources.flatMap(group => {
-    const groupName = group.name || '未命名分组';
-    const pageName = group.pageName || 'home';
-    const links = [];
-    
-    // 1. 处理分组直属资源
-    if (group.resources && group.resources.length > 0) {
-      group.resources.forEach((item, idx) => {
-        if (item.name && item.url) {
-          links.push({
-            ...item,
-            sectionName: groupName,
-            pageName: pageName,
-            category: '',
-            tabName: '',
-            resourceId: `top-${groupName}-${idx}`
-          });
-        }
-      });
-    }
-    
-    // 2. 处理分类下的资源
-    if (group.categories && group.categories.length > 0) {
-      group.categories.forEach((cat, catIdx) => {
-        const catName = cat.name || '';
-        
-        // 2.1 处理分类直属资源
-        if (cat.resources && cat.resources.length > 0) {
-          cat.resources.forEach((item, idx) => {
-            if (item.name && item.url) {
-              links.push({
-                ...item,
-                sectionName: groupName,
-                pageName: pageName,
-                category: catName,
-                tabName: '',
-                resourceId: `cat-${catIdx}-${idx}`,
-                categoryIndex: catIdx
-              });
-            }
-          });
-        }
-        
-        // 2.2 处理 tabs 结构
-        if (cat.tabs && cat.tabs.length > 0) {
-          cat.tabs.forEach((tab, tabIdx) => {
-            const tabName = tab.tabName || '';
-            if (tab.list && tab.list.length > 0) {
-              tab.list.forEach((item, idx) => {
-                if (item.name && item.url) {
-                  links.push({
-                    ...item,
-                    sectionName: groupName,
-                    pageName: pageName,
-                    category: catName,
-                    tabName: tabName,
-                    resourceId: `tab-${catIdx}-${tabIdx}-${idx}`,
-                    categoryIndex: catIdx,
-                    tabIndex: tabIdx
-                  });
-                }
-              });
-            }
-          });
-        }
-      });
-    }
-    
-    return links;
-  });
+  const [fuses, setFuses] = useState(null);
+  const [loadError, setLoadError] = useState(false);
 
   useEffect(() => {
     const handleOpen = () => openModal();
@@ -182,6 +141,17 @@ export default function SearchModal() {
     };
   }, [isOpen, results, selectedIndex]);
 
+  // 第一次打开时加载搜索索引
+  useEffect(() => {
+    if (!isOpen || fuses) return;
+    let cancelled = false;
+    setLoadError(false);
+    loadSearchIndex()
+      .then((loaded) => { if (!cancelled) setFuses(loaded); })
+      .catch(() => { if (!cancelled) setLoadError(true); });
+    return () => { cancelled = true; };
+  }, [isOpen, fuses]);
+
   useEffect(() => {
     if (isOpen) {
       setTimeout(() => inputRef.current?.focus(), 100);
@@ -193,21 +163,18 @@ export default function SearchModal() {
 
   // 搜索逻辑
   useEffect(() => {
-    if (!query) {
+    if (!query || !fuses) {
       setResults([]);
       return;
     }
 
-    const fuse = new Fuse(allLinks, {
-      keys: ['name', 'desc', 'category', 'tabName'],
-      threshold: 0.4,
-      distance: 100,
-    });
-
-    const searchResults = fuse.search(query);
+    // 各分片的结果按 score 合并（越小越匹配）
+    const searchResults = fuses
+      .flatMap((fuse) => fuse.search(query))
+      .sort((a, b) => a.score - b.score);
     setResults(searchResults.slice(0, 10)); // 只显示前10个结果
     setSelectedIndex(0);
-  }, [query]);
+  }, [query, fuses]);
 
   const handleNavigate = (item) => {
     closeModal();
@@ -335,6 +302,13 @@ export default function SearchModal() {
                   </div>
                 ))}
               </div>
+            ) : loadError ? (
+              <div className="py-12 text-center text-slate-400">
+                <div className="text-lg font-medium mb-1">搜索索引加载失败</div>
+                <div className="text-sm opacity-70">请稍后重新打开搜索</div>
+              </div>
+            ) : query && !fuses ? (
+              <div className="py-12 text-center text-slate-400 text-sm">正在加载搜索索引...</div>
             ) : query ? (
               <div className="py-12 text-center text-slate-400">
                 <div className="mb-4">
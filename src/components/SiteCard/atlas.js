@@ -0,0 +1,44 @@
+// src/components/SiteCard/atlas.js
+// 构建时读取 build_icon_atlas.py 生成的图集清单（public/atlas/），只在 .astro 的 frontmatter 中使用
+import fs from 'node:fs';
+import path from 'node:path';
+
+const ATLAS_DIR = path.join(process.cwd(), 'public', 'atlas');
+const cache = new Map();
+
+const readJson = (name) => JSON.parse(fs.readFileSync(path.join(ATLAS_DIR, name), 'utf-8'));
+
+/**
+ * 读取页面图集：{ css, icons: { 文件名: { w, h } } }
+ * 没有生成图集或页面不在图集中时返回 null，卡片继续按单独图片加载
+ */
+export const getAtlasPage = (page) => {
+  // 开发模式下每次重新读取，重新生成图集后刷新页面即可生效
+  if (!import.meta.env.DEV && cache.has(page)) return cache.get(page);
+  let atlas = null;
+  try {
+    const bundle = readJson('index.json')[page];
+    if (bundle) {
+      atlas = { css: bundle.css, icons: readJson(bundle.manifest).icons || {} };
+    }
+  } catch (e) {
+    atlas = null;
+  }
+  cache.set(page, atlas);
+  return atlas;
+};
+
+/**
+ * 图标在图集中时返回 { name, style }：按图集格子的宽高比缩放到 size 以内
+ */
+export const getAtlasIcon = (atlas, icon, size) => {
+  if (!atlas || !icon || !icon.includes('/images/logos/')) return null;
+  const name = icon.split('/images/logos/')[1].split('?')[0].split('#')[0];
+  const box = atlas.icons[name];
+  if (!box) return null;
+  const scale = size / Math.max(box.w, box.h);
+  return {
+    name,
+    style: `width: ${Math.round(box.w * scale)}px; height: ${Math.round(box.h * scale)}px;`,
+  };
+};
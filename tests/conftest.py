@@ -0,0 +1,40 @@
+"""pytest 公共配置：工具脚本都在仓库根目录，以顶层模块方式导入"""
+
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from smart_parse_stub import start_stub_server
+
+
+@pytest.fixture
+def smart_parse_stub():
+    """启动 smart-parse 替身服务器的工厂（参数同 StubServer），测试结束自动关闭"""
+    servers = []
+
+    def start(**options):
+        server = start_stub_server(**options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def group_file(tmp_path):
+    """写一个分组文件的工厂：只有直属资源，都没有本地图标"""
+    def write(name, urls):
+        path = tmp_path / f'{name}.json'
+        resources = [{'name': f'{name}-{i}', 'url': url, 'icon': ''} for i, url in enumerate(urls)]
+        path.write_text(json.dumps({'name': name, 'pageName': 'home', 'resources': resources},
+                                   ensure_ascii=False), encoding='utf-8')
+        return path
+
+    return write
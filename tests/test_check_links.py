@@ -0,0 +1,140 @@
+"""check_links.py：ETag / Last-Modified 条件请求、304 处理，以及 --confirm 连续失败次数阈值"""
+
+import pytest
+
+import check_links
+from fetch_icons_via_api import create_session
+from link_check_stub import start_link_stub
+
+
+@pytest.fixture
+def link_stub():
+    server = start_link_stub()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session():
+    session = create_session(4)
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def state(tmp_path):
+    state = check_links.LinkState(tmp_path / 'link_state.sqlite3')
+    yield state
+    state.close()
+
+
+def url(stub, path):
+    return f'{stub.base_url}{path}'
+
+
+def sweep(urls, session, state, **options):
+    return check_links.sweep(urls, session, state, workers=4, per_host=4, interval=0, timeout=5, **options)
+
+
+# ==================== 条件请求 ====================
+
+def test_first_check_records_validators(link_stub, session):
+    result = check_links.check_link(url(link_stub, '/ok/1'), session)
+    assert result['outcome'] == 'ok'
+    assert result['status_code'] == 200
+    assert result['etag']
+    assert result['last_modified'] == 'Mon, 06 Jan 2025 08:00:00 GMT'
+
+
+def test_conditional_request_returns_304(link_stub, session):
+    first = check_links.check_link(url(link_stub, '/ok/1'), session)
+    second = check_links.check_link(url(link_stub, '/ok/1'), session, previous=first)
+    assert second['outcome'] == 'not_modified'
+    assert second['status_code'] == 304
+    assert link_stub.not_modified == 1
+
+
+def test_stale_etag_gets_full_response(link_stub, session):
+    previous = {'etag': '"stale"', 'last_modified': None}
+    result = check_links.check_link(url(link_stub, '/ok/1'), session, previous=previous)
+    assert result['outcome'] == 'ok'
+    assert link_stub.not_modified == 0
+
+
+def test_304_keeps_stored_validators(link_stub, session, state):
+    target = url(link_stub, '/ok/1')
+    sweep([target], session, state)
+    stored = state.get(target)
+    assert stored['etag'] and stored['outcome'] == 'ok'
+
+    results = sweep([target], session, state)
+    assert results[target]['outcome'] == 'not_modified'
+    assert link_stub.not_modified == 1
+    again = state.get(target)
+    assert again['etag'] == stored['etag']
+    assert again['last_modified'] == stored['last_modified']
+
+    # 验证器保留下来，之后的检查仍然是 304
+    sweep([target], session, state)
+    assert link_stub.not_modified == 2
+
+
+def test_head_error_is_confirmed_with_get(link_stub, session):
+    result = check_links.check_link(url(link_stub, '/nohead/1'), session)
+    assert result['method'] == 'GET'
+    assert result['outcome'] == 'ok'
+
+
+@pytest.mark.parametrize('path, outcome', [
+    ('/blocked/1', 'blocked'),
+    ('/gone/1', 'gone'),
+    ('/error/1', 'server_error'),
+    ('/redirect/1', 'ok'),
+])
+def test_outcome_classification(link_stub, session, path, outcome):
+    assert check_links.check_link(url(link_stub, path), session)['outcome'] == outcome
+
+
+# ==================== --confirm ====================
+
+def test_failures_accumulate_until_confirm_threshold(link_stub, session, state):
+    target = url(link_stub, '/gone/1')
+    first = sweep([target], session, state)[target]
+    assert first['failures'] == 1
+    assert check_links.decide_status('ok', first, confirm=2) == 'ok'
+
+    second = sweep([target], session, state)[target]
+    assert second['failures'] == 2
+    assert check_links.decide_status('ok', second, confirm=2) == '网站失效'
+
+
+def test_recovery_resets_failures(state):
+    target = 'https://flaky.example/'
+    failed = {'outcome': 'gone', 'status_code': 404, 'etag': None, 'last_modified': None}
+    assert state.record(target, failed, None) == 1
+    healthy = {'outcome': 'ok', 'status_code': 200, 'etag': None, 'last_modified': None}
+    assert state.record(target, healthy, state.get(target)) == 0
+    assert state.record(target, failed, state.get(target)) == 1
+
+
+def test_dry_run_does_not_advance_failures(link_stub, session, state):
+    target = url(link_stub, '/gone/1')
+    for _ in range(3):
+        result = sweep([target], session, state, dry_run=True)[target]
+        assert result['failures'] == 1
+    assert state.get(target) is None
+
+
+@pytest.mark.parametrize('outcome, expected', [
+    ('timeout', '网站超时'),
+    ('unreachable', '网站失效'),
+    ('server_error', '网站失效'),
+])
+def test_decide_status_after_confirm(outcome, expected):
+    assert check_links.decide_status('ok', {'outcome': outcome, 'failures': 1}, confirm=1) == expected
+
+
+def test_decide_status_restores_and_respects_unmanaged():
+    assert check_links.decide_status('网站失效', {'outcome': 'not_modified', 'failures': 0}, confirm=2) == 'ok'
+    assert check_links.decide_status('github已归档', {'outcome': 'gone', 'failures': 5}, confirm=2) == 'github已归档'
@@ -0,0 +1,75 @@
+"""fetch_icons_via_api.py：批量接口探测、流式结果，以及后台不支持批量时回退到逐个请求"""
+
+import json
+
+import fetch_icons_via_api as fetcher
+
+
+def fetched_icons(path):
+    return [r['icon'] for r in json.loads(path.read_text(encoding='utf-8'))['resources']]
+
+
+def test_probe_reports_batch_limit(smart_parse_stub):
+    stub = smart_parse_stub(max_batch=50)
+    assert fetcher.probe_batch_support(stub.base_url) == 50
+
+
+def test_probe_without_batch_endpoint(smart_parse_stub):
+    stub = smart_parse_stub(batch=False)
+    assert fetcher.probe_batch_support(stub.base_url) == 0
+
+
+def test_batch_mode_fetches_all_targets(smart_parse_stub, group_file):
+    stub = smart_parse_stub()
+    path = group_file('group', [f'https://site{i}.example/' for i in range(12)])
+    batch = fetcher.AdaptiveBatchSize(initial=5, maximum=20)
+
+    stats = fetcher.process_all_files([path], stub.base_url, batch=batch)
+
+    assert stats['success'] == 12
+    assert stats['batches'] >= 1
+    assert stats['batch_fallback'] == 0
+    assert all(icon.startswith('/images/logos/') for icon in fetched_icons(path))
+
+
+def test_unsupported_batch_endpoint_falls_back_to_single_requests(smart_parse_stub, group_file):
+    """探测之后后台不再支持批量（POST 返回 404）：剩余目标全部改为逐个请求，结果不丢失"""
+    stub = smart_parse_stub(batch=False)
+    urls = [f'https://site{i}.example/' for i in range(12)]
+    path = group_file('group', urls)
+    batch = fetcher.AdaptiveBatchSize(initial=5, maximum=20)
+
+    stats = fetcher.process_all_files([path], stub.base_url, batch=batch)
+
+    assert stats['success'] == 12
+    assert stats['failed'] == 0
+    assert stats['batch_fallback'] == 12
+    # 第一批失败后不再提交批量请求
+    assert stats['batches'] <= fetcher.CONFIG['batch_concurrency']
+    assert stub.urls_parsed == 12
+    assert all(icon.startswith('/images/logos/') for icon in fetched_icons(path))
+
+
+def test_batch_item_errors_are_retried_individually(smart_parse_stub, group_file, monkeypatch):
+    """批量响应中单条 5xx 不算最终结果，回退到逐个请求（带重试）"""
+    monkeypatch.setitem(fetcher.CONFIG, 'retry_delay', 0)
+    monkeypatch.setitem(fetcher.CONFIG, 'backend_failure_threshold', 0)
+    stub = smart_parse_stub(fail_hosts=['bad.example'])
+    path = group_file('group', ['https://bad.example/'] + [f'https://site{i}.example/' for i in range(5)])
+    batch = fetcher.AdaptiveBatchSize(initial=10, maximum=20)
+
+    stats = fetcher.process_all_files([path], stub.base_url, batch=batch)
+
+    assert stats['success'] == 5
+    assert stats['failed'] == 1
+    assert stats['batch_fallback'] == 1
+    # 批量一次 + 逐个请求重试 retry_count 次
+    assert stub.urls_parsed == 6 + fetcher.CONFIG['retry_count']
+
+
+def test_batch_size_halves_on_failure():
+    batch = fetcher.AdaptiveBatchSize(initial=40, minimum=5, maximum=100, target=5.0)
+    batch.record(0, 0.1, ok=False)
+    assert batch.size == 20
+    batch.record(20, 1.0, ok=True)
+    assert batch.size == 40  # 最多翻倍
@@ -0,0 +1,176 @@
+"""fetch_icons_via_api.py：按主机熔断（熔断、半开试探、恢复）和获取结果缓存的有效期"""
+
+import json
+import time
+
+import pytest
+
+import fetch_icons_via_api as fetcher
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # 5xx 重试不等待
+    monkeypatch.setitem(fetcher.CONFIG, 'retry_delay', 0)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(fetcher.time, 'monotonic', fake)
+    return fake
+
+
+# ==================== CircuitBreaker ====================
+
+def test_breaker_trips_after_consecutive_failures(clock):
+    breaker = fetcher.CircuitBreaker(threshold=3, cooldown=60)
+    for _ in range(2):
+        breaker.record('bad.example', False)
+    assert breaker.allow('bad.example')
+    breaker.record('bad.example', False)
+    assert not breaker.allow('bad.example')
+    assert breaker.trips == 1
+    # 其他主机不受影响
+    assert breaker.allow('good.example')
+
+
+def test_breaker_success_resets_failure_count(clock):
+    breaker = fetcher.CircuitBreaker(threshold=2, cooldown=60)
+    breaker.record('flaky.example', False)
+    breaker.record('flaky.example', True)
+    breaker.record('flaky.example', False)
+    assert breaker.allow('flaky.example')
+    assert breaker.trips == 0
+
+
+def test_breaker_half_open_allows_single_probe_and_recovers(clock):
+    breaker = fetcher.CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record('bad.example', False)
+    assert not breaker.allow('bad.example')
+
+    clock.now += 61
+    assert breaker.allow('bad.example')
+    # 试探请求返回之前，其余请求仍直接判定失败
+    assert not breaker.allow('bad.example')
+
+    breaker.record('bad.example', True)
+    assert breaker.allow('bad.example')
+    assert breaker.allow('bad.example')
+    assert breaker.trips == 1
+
+
+def test_breaker_failed_probe_reopens(clock):
+    breaker = fetcher.CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record('bad.example', False)
+    clock.now += 61
+    assert breaker.allow('bad.example')
+    breaker.record('bad.example', False)
+    assert breaker.trips == 2
+    assert not breaker.allow('bad.example')
+    clock.now += 61
+    assert breaker.allow('bad.example')
+
+
+def test_breaker_disabled_with_zero_threshold():
+    breaker = fetcher.CircuitBreaker(threshold=0)
+    for _ in range(10):
+        breaker.record('bad.example', False)
+    assert breaker.allow('bad.example')
+
+
+def test_failing_host_is_short_circuited_against_stub(smart_parse_stub, group_file):
+    """一个上游主机固定返回 5xx：该主机熔断，其余主机正常获取，后台不判定为故障"""
+    stub = smart_parse_stub(fail_hosts=['bad.example'])
+    urls = [f'https://bad.example/{i}' for i in range(8)] + [f'https://site{i}.example/' for i in range(4)]
+    path = group_file('group', urls)
+    breaker = fetcher.CircuitBreaker(threshold=2, cooldown=60)
+
+    stats = fetcher.process_all_files([path], stub.base_url, workers=1, breaker=breaker)
+
+    assert stats['success'] == 4
+    assert stats['failed'] == 8
+    assert stats['circuit_open'] > 0
+    assert stats['backend_down'] == 0
+    assert not breaker.allow('bad.example')
+    resources = json.loads(path.read_text(encoding='utf-8'))['resources']
+    assert all(r['icon'].startswith('/images/logos/') for r in resources if 'site' in r['url'])
+    assert all(not r['icon'] for r in resources if 'bad.example' in r['url'])
+
+
+def test_not_found_answers_do_not_trip_breaker(smart_parse_stub, group_file, monkeypatch):
+    """后台确定答复"没有图标"不算主机失败（共享主机上连续几个站点没有图标不应熔断）"""
+    stub = smart_parse_stub()
+    monkeypatch.setattr(fetcher, 'classify_api_response', lambda status, data, verbose=False: (None, 'not_found'))
+    path = group_file('group', [f'https://shared.example/repo{i}' for i in range(6)])
+    breaker = fetcher.CircuitBreaker(threshold=2, cooldown=60)
+
+    stats = fetcher.process_all_files([path], stub.base_url, workers=1, breaker=breaker)
+
+    assert stats['circuit_open'] == 0
+    assert breaker.trips == 0
+    assert stub.urls_parsed == 6
+
+
+# ==================== FetchCache ====================
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = fetcher.FetchCache(tmp_path / 'cache.sqlite3', success_ttl=100, failure_ttl=10)
+    yield cache
+    cache.close()
+
+
+def test_cache_returns_success_within_ttl(cache, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(fetcher.time, 'time', lambda: now)
+    assert cache.put('https://a.example/', '/images/logos/a.webp')
+    monkeypatch.setattr(fetcher.time, 'time', lambda: now + 99)
+    assert cache.get('https://a.example/') == ('ok', '/images/logos/a.webp')
+    monkeypatch.setattr(fetcher.time, 'time', lambda: now + 101)
+    assert cache.get('https://a.example/') is None
+
+
+def test_cache_negative_answers_use_failure_ttl(cache, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(fetcher.time, 'time', lambda: now)
+    assert cache.put('https://none.example/', None, 'not_found')
+    assert cache.put('https://remote.example/', None, 'not_local')
+    monkeypatch.setattr(fetcher.time, 'time', lambda: now + 9)
+    assert cache.get('https://none.example/') == ('not_found', None)
+    assert cache.get('https://remote.example/') == ('not_local', None)
+    monkeypatch.setattr(fetcher.time, 'time', lambda: now + 11)
+    assert cache.get('https://none.example/') is None
+
+
+@pytest.mark.parametrize('outcome', ['http_error', 'timeout', 'error', 'missing_file'])
+def test_cache_skips_transient_failures(cache, outcome):
+    assert not cache.put('https://flaky.example/', None, outcome)
+    assert cache.get('https://flaky.example/') is None
+
+
+def test_cache_ignores_legacy_failed_rows(cache):
+    with cache.conn:
+        cache.conn.execute('INSERT INTO fetch_results (url, status, icon, fetched_at) VALUES (?, ?, ?, ?)',
+                           ('https://old.example/', 'failed', None, time.time()))
+    assert cache.get('https://old.example/') is None
+
+
+def test_cache_refresh_bypasses_reads(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    cache = fetcher.FetchCache(path, success_ttl=100, failure_ttl=10)
+    cache.put('https://a.example/', '/images/logos/a.webp')
+    cache.close()
+    refreshed = fetcher.FetchCache(path, success_ttl=100, failure_ttl=10, refresh=True)
+    try:
+        assert refreshed.get('https://a.example/') is None
+    finally:
+        refreshed.close()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+图标工具的运行指标（dedupe_icons_final.py 与 fetch_icons_via_api.py 共用）
+===========================
+
+功能：
+1. 阶段计时：METRICS.phase('analyze') 结束上一阶段并开始新阶段，按编号步骤顺序调用即可
+2. 计数器：METRICS.inc('bytes_read_total', n, stage='partial')，按标签累加
+3. 直方图：METRICS.observe('smart_parse_request_seconds', 0.12, status='200', attempt='1')
+4. 输出：
+   - --metrics-json PATH          JSON（阶段耗时、计数器、直方图）
+   - --metrics-prom PATH          Prometheus textfile（node_exporter textfile collector 格式）
+   - --metrics-openmetrics PATH   OpenMetrics 文本格式
+   - --profile [N]                用 cProfile 包裹整个运行，输出累计耗时最高的 N 个函数（默认 25），
+                                  完整结果保存到 .icon_cache/<工具名>.prof
+指标文件都先写临时文件再替换，采集端不会读到半个文件。
+
+线程安全：fetch_icons_via_api.py 的工作线程会并发记录。
+"""
+
+import io
+import json
+import time
+import pstats
+import cProfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import datetime
+
+from file_utils import write_atomic
+
+# ==================== 配置 ====================
+CACHE_DIR = Path('./.icon_cache')
+METRIC_PREFIX = 'icon_tools_'
+
+# 延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# ==================== 指标 ====================
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+class Metrics:
+    """进程内指标：阶段耗时、计数器和直方图"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {}
+        self.counters = {}
+        self.histograms = {}
+        self._current = None
+        self._started = None
+        self.start_time = time.time()
+
+    def phase(self, name: str):
+        """结束当前阶段并开始新阶段；同名阶段重复出现时耗时累加"""
+        now = time.perf_counter()
+        with self._lock:
+            self._close_phase(now)
+            self._current, self._started = name, now
+
+    def end_phase(self):
+        with self._lock:
+            self._close_phase(time.perf_counter())
+
+    def _close_phase(self, now: float):
+        if self._current is not None:
+            self.phases[self._current] = self.phases.get(self._current, 0.0) + now - self._started
+            self._current = None
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets),
+                                                    'count': 0, 'sum': 0.0}
+            for i, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+
+    def snapshot(self, tool: str) -> dict:
+        """JSON 可序列化的指标快照"""
+        with self._lock:
+            return {
+                'tool': tool,
+                'started_at': datetime.fromtimestamp(self.start_time).isoformat(),
+                'phases': {name: round(seconds, 6) for name, seconds in self.phases.items()},
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                'histograms': [
+                    {'name': name, 'labels': dict(labels), **histogram}
+                    for (name, labels), histogram in sorted(self.histograms.items())
+                ],
+            }
+
+    def render_text(self, tool: str, openmetrics: bool = False) -> str:
+        """Prometheus 文本格式（openmetrics=True 时输出 OpenMetrics，计数器带 _total 后缀并以 # EOF 结尾）"""
+        snapshot = self.snapshot(tool)
+        lines = []
+
+        def labels_text(labels: dict) -> str:
+            if not labels:
+                return ''
+            items = ','.join(f'{key}="{str(value)}"' for key, value in labels.items())
+            return '{' + items + '}'
+
+        phase_name = f'{METRIC_PREFIX}phase_seconds'
+        lines.append(f'# HELP {phase_name} Wall time spent in each phase')
+        lines.append(f'# TYPE {phase_name} gauge')
+        for name, seconds in snapshot['phases'].items():
+            lines.append(f'{phase_name}{labels_text({"tool": tool, "phase": name})} {seconds}')
+
+        declared = set()
+        for counter in snapshot['counters']:
+            base = METRIC_PREFIX + counter['name'].removesuffix('_total')
+            if base not in declared:
+                declared.add(base)
+                lines.append(f'# TYPE {base if openmetrics else base + "_total"} counter')
+            lines.append(f'{base}_total{labels_text({"tool": tool, **counter["labels"]})} {counter["value"]}')
+
+        for histogram in snapshot['histograms']:
+            base = METRIC_PREFIX + histogram['name']
+            if base not in declared:
+                declared.add(base)
+                lines.append(f'# TYPE {base} histogram')
+            labels = {'tool': tool, **histogram['labels']}
+            for bound, count in zip(histogram['buckets'], histogram['counts']):
+                lines.append(f'{base}_bucket{labels_text({**labels, "le": bound})} {count}')
+            lines.append(f'{base}_bucket{labels_text({**labels, "le": "+Inf"})} {histogram["count"]}')
+            lines.append(f'{base}_count{labels_text(labels)} {histogram["count"]}')
+            lines.append(f'{base}_sum{labels_text(labels)} {round(histogram["sum"], 6)}')
+
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+# 默认指标实例，各脚本的函数直接记录到这里
+METRICS = Metrics()
+
+# ==================== 输出 ====================
+
+def add_metrics_arguments(parser):
+    """为脚本添加 --metrics-json / --metrics-prom / --metrics-openmetrics / --profile 参数"""
+    parser.add_argument('--metrics-json', type=str, default=None, help='把运行指标写入 JSON 文件')
+    parser.add_argument('--metrics-prom', type=str, default=None, help='把运行指标写入 Prometheus textfile')
+    parser.add_argument('--metrics-openmetrics', type=str, default=None, help='把运行指标写入 OpenMetrics 文本文件')
+    parser.add_argument('--profile', type=int, nargs='?', const=25, default=None, metavar='N',
+                        help='用 cProfile 包裹运行，输出最耗时的 N 个函数（默认 25）')
+
+def write_metrics(args, tool: str, metrics: Metrics = METRICS):
+    if args.metrics_json:
+        write_atomic(args.metrics_json, json.dumps(metrics.snapshot(tool), ensure_ascii=False, indent=2) + '\n')
+    if args.metrics_prom:
+        write_atomic(args.metrics_prom, metrics.render_text(tool))
+    if args.metrics_openmetrics:
+        write_atomic(args.metrics_openmetrics, metrics.render_text(tool, openmetrics=True))
+
+@contextmanager
+def instrumented(args, tool: str, metrics: Metrics = METRICS):
+    """包裹脚本主流程：按参数开启 cProfile，结束时（包括 sys.exit 和异常）写出指标"""
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        metrics.end_phase()
+        write_metrics(args, tool, metrics)
+        if profiler is not None:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            profile_path = CACHE_DIR / f'{tool}.prof'
+            profiler.dump_stats(profile_path)
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(args.profile)
+            print("\n" + "=" * 70)
+            print(f"性能分析（累计耗时前 {args.profile}，完整结果: {profile_path}）")
+            print("=" * 70)
+            print(output.getvalue().strip())